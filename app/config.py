@@ -3,6 +3,9 @@ from dotenv import load_dotenv
 
 load_dotenv()
 
+def _env_bool(name, default):
+    return os.getenv(name, str(default)).strip().lower() in ('1', 'true', 'yes', 'on')
+
 class Config:
     SPOTIFY_CLIENT_ID = os.getenv('SPOTIFY_CLIENT_ID')
     SPOTIFY_CLIENT_SECRET = os.getenv('SPOTIFY_CLIENT_SECRET')
@@ -12,4 +15,130 @@ class Config:
     PERMANENT_SESSION_LIFETIME = 3600
     CACHE_EXPIRY_DAYS = 7
     FAMILIAR_PROPORTION = 0.6
-    SIMILARITY_THRESHOLD = 0.7
\ No newline at end of file
+    SIMILARITY_THRESHOLD = 0.7
+
+    # Modello emozioni e backend di inferenza ('transformers' o 'onnx')
+    EMOTION_MODEL = os.getenv('EMOTION_MODEL', 'cardiffnlp/twitter-roberta-base-emotion')
+    EMOTION_BACKEND = os.getenv('EMOTION_BACKEND', 'transformers')
+    EMOTION_ONNX_DIR = os.getenv('EMOTION_ONNX_DIR', '.onnx_models')
+    EMOTION_ONNX_QUANTIZE = _env_bool('EMOTION_ONNX_QUANTIZE', True)
+
+    # Redis opzionale per condividere cache e stato tra i worker (vuoto = solo memoria)
+    REDIS_URL = os.getenv('REDIS_URL')
+
+    # Caricamento del modello: 'background' (default), 'lazy' (al primo uso) o 'eager'
+    MODEL_LOADING = os.getenv('MODEL_LOADING', 'background')
+
+    # Micro-batching dell'inferenza emozioni (1 disabilita il batching)
+    EMOTION_BATCH_SIZE = int(os.getenv('EMOTION_BATCH_SIZE', 16))
+    EMOTION_BATCH_WINDOW_MS = float(os.getenv('EMOTION_BATCH_WINDOW_MS', 10))
+
+
+    # Cache dei risultati dell'analisi emozioni
+    EMOTION_CACHE_SIZE = int(os.getenv('EMOTION_CACHE_SIZE', 2048))
+    EMOTION_CACHE_TTL = int(os.getenv('EMOTION_CACHE_TTL', 86400))
+
+    # Traduzione: 'google' (rete), 'marian' (modello offline) o 'none'
+    TRANSLATION_BACKEND = os.getenv('TRANSLATION_BACKEND', 'google')
+    TRANSLATION_MODEL = os.getenv('TRANSLATION_MODEL', 'Helsinki-NLP/opus-mt-mul-en')
+    TRANSLATION_CACHE_PATH = os.getenv('TRANSLATION_CACHE_PATH', '.translation_cache.sqlite3')
+
+    # Letture Spotify concorrenti: pool condiviso e limite per utente
+    SPOTIFY_FETCH_WORKERS = int(os.getenv('SPOTIFY_FETCH_WORKERS', 16))
+    SPOTIFY_PER_USER_CONCURRENCY = int(os.getenv('SPOTIFY_PER_USER_CONCURRENCY', 4))
+
+    # Pool di connessioni HTTP e cache dei client Spotify per token
+    SPOTIFY_POOL_CONNECTIONS = int(os.getenv('SPOTIFY_POOL_CONNECTIONS', 4))
+    SPOTIFY_POOL_MAXSIZE = int(os.getenv('SPOTIFY_POOL_MAXSIZE', 32))
+    SPOTIFY_REQUEST_TIMEOUT = float(os.getenv('SPOTIFY_REQUEST_TIMEOUT', 10))
+    SPOTIFY_CLIENT_CACHE_SIZE = int(os.getenv('SPOTIFY_CLIENT_CACHE_SIZE', 256))
+    SPOTIFY_CLIENT_TTL = int(os.getenv('SPOTIFY_CLIENT_TTL', 300))
+    SPOTIFY_API_PREFIX = os.getenv('SPOTIFY_API_PREFIX')
+
+    # Scheduler delle chiamate Spotify (token bucket, condiviso via Redis se configurato)
+    SPOTIFY_RATE_LIMIT = float(os.getenv('SPOTIFY_RATE_LIMIT', 25))
+    SPOTIFY_RATE_BURST = float(os.getenv('SPOTIFY_RATE_BURST', 50))
+    SPOTIFY_BACKGROUND_RESERVE = float(os.getenv('SPOTIFY_BACKGROUND_RESERVE', 0.5))
+    SPOTIFY_MAX_RETRIES = int(os.getenv('SPOTIFY_MAX_RETRIES', 3))
+    SPOTIFY_MAX_WAIT = float(os.getenv('SPOTIFY_MAX_WAIT', 10))
+    SPOTIFY_SHARED_RATE_LIMIT = _env_bool('SPOTIFY_SHARED_RATE_LIMIT', True)
+
+    # Cache del profilo di ascolto: TTL per sorgente (secondi) e finestra stale-while-revalidate
+    PROFILE_TTL_TOP_TRACKS = int(os.getenv('PROFILE_TTL_TOP_TRACKS', 6 * 3600))
+    PROFILE_TTL_TOP_ARTISTS = int(os.getenv('PROFILE_TTL_TOP_ARTISTS', 6 * 3600))
+    PROFILE_TTL_RECENTLY_PLAYED = int(os.getenv('PROFILE_TTL_RECENTLY_PLAYED', 900))
+    PROFILE_TTL_SAVED_TRACKS = int(os.getenv('PROFILE_TTL_SAVED_TRACKS', 3600))
+    # TTL del profilo utente (current_user), da cui dipende la chiave delle altre sorgenti
+    PROFILE_TTL = int(os.getenv('PROFILE_TTL', 3600))
+    PROFILE_STALE_SECONDS = int(os.getenv('PROFILE_STALE_SECONDS', 86400))
+    PROFILE_CACHE_MAX_USERS = int(os.getenv('PROFILE_CACHE_MAX_USERS', 1000))
+
+    # Archivio persistente delle caratteristiche audio per traccia
+    FEATURE_STORE_PATH = os.getenv('FEATURE_STORE_PATH', '.track_features.sqlite3')
+
+    # Generazione locale dei candidati (indice approssimato sui vettori audio)
+    LOCAL_CANDIDATES_ENABLED = _env_bool('LOCAL_CANDIDATES_ENABLED', True)
+    LOCAL_CANDIDATES_MIN_TRACKS = int(os.getenv('LOCAL_CANDIDATES_MIN_TRACKS', 500))
+    LOCAL_INDEX_REFRESH_SECONDS = int(os.getenv('LOCAL_INDEX_REFRESH_SECONDS', 3600))
+    LOCAL_INDEX_PROBES = int(os.getenv('LOCAL_INDEX_PROBES', 16))
+
+    # Catalogo di tracce colonnare (vedi app/utils/ingest_catalog.py); vuoto = non usato
+    TRACK_STORE_PATH = os.getenv('TRACK_STORE_PATH')
+
+    # Storico delle tracce consigliate: filtri di Bloom a rotazione su CACHE_EXPIRY_DAYS
+    HISTORY_BUCKETS = int(os.getenv('HISTORY_BUCKETS', 7))
+    HISTORY_TRACKS_PER_BUCKET = int(os.getenv('HISTORY_TRACKS_PER_BUCKET', 500))
+    HISTORY_FALSE_POSITIVE_RATE = float(os.getenv('HISTORY_FALSE_POSITIVE_RATE', 0.01))
+    HISTORY_MAX_USERS = int(os.getenv('HISTORY_MAX_USERS', 10000))
+    HISTORY_USE_REDIS = _env_bool('HISTORY_USE_REDIS', True)
+
+    # Creazione delle playlist in background (/playlist_status/<job>)
+    PLAYLIST_JOB_WORKERS = int(os.getenv('PLAYLIST_JOB_WORKERS', 4))
+    PLAYLIST_JOB_TTL = int(os.getenv('PLAYLIST_JOB_TTL', 86400))
+
+    # /recommend invia subito la pagina e la riempie con i risultati progressivi (SSE)
+    RECOMMEND_STREAMING = _env_bool('RECOMMEND_STREAMING', True)
+
+    # Dati di riferimento (generi seed, playlist editoriali) aggiornati in background
+    REFERENCE_GENRES_REFRESH_SECONDS = int(os.getenv('REFERENCE_GENRES_REFRESH_SECONDS', 86400))
+    REFERENCE_PLAYLISTS_REFRESH_SECONDS = int(os.getenv('REFERENCE_PLAYLISTS_REFRESH_SECONDS', 3600))
+    REFERENCE_RETRY_SECONDS = int(os.getenv('REFERENCE_RETRY_SECONDS', 60))
+
+    # Ricerca di playlist pubbliche come ultimo fallback
+    FALLBACK_CONCURRENCY = int(os.getenv('FALLBACK_CONCURRENCY', 6))
+    FALLBACK_TIME_BUDGET = float(os.getenv('FALLBACK_TIME_BUDGET', 5))
+
+    # Server di produzione (gunicorn.conf.py): worker prefork che condividono il modello
+    WEB_BIND = os.getenv('WEB_BIND', '0.0.0.0:5001')
+    WEB_WORKERS = int(os.getenv('WEB_WORKERS', 2))
+    WEB_THREADS = int(os.getenv('WEB_THREADS', 8))
+    WEB_TIMEOUT = int(os.getenv('WEB_TIMEOUT', 120))
+    WEB_GRACEFUL_TIMEOUT = int(os.getenv('WEB_GRACEFUL_TIMEOUT', 30))
+    WEB_MAX_REQUESTS = int(os.getenv('WEB_MAX_REQUESTS', 0))
+
+    # Model server dedicato (python -m app.services.model_server), usato con EMOTION_BACKEND=remote
+    MODEL_SERVER_SOCKET = os.getenv('MODEL_SERVER_SOCKET', '/tmp/emotion-model.sock')
+    MODEL_SERVER_PROCESSES = int(os.getenv('MODEL_SERVER_PROCESSES', 1))
+    MODEL_SERVER_BACKEND = os.getenv('MODEL_SERVER_BACKEND', 'transformers')
+    MODEL_SERVER_THREADS = int(os.getenv('MODEL_SERVER_THREADS', 0))
+    MODEL_SERVER_CPUS = os.getenv('MODEL_SERVER_CPUS', '')
+    MODEL_SERVER_TIMEOUT = float(os.getenv('MODEL_SERVER_TIMEOUT', 10))
+
+    # Token OAuth per sessione: in memoria (e su Redis se REDIS_URL è impostato), rinnovati in background
+    TOKEN_REFRESH_MARGIN = int(os.getenv('TOKEN_REFRESH_MARGIN', 300))
+    TOKEN_REFRESH_TICK = int(os.getenv('TOKEN_REFRESH_TICK', 30))
+    TOKEN_IDLE_SECONDS = int(os.getenv('TOKEN_IDLE_SECONDS', 86400))
+    TOKEN_MAX_SESSIONS = int(os.getenv('TOKEN_MAX_SESSIONS', 10000))
+
+    # Metriche in formato Prometheus su /metrics (per processo)
+    METRICS_ENABLED = _env_bool('METRICS_ENABLED', True)
+
+    # Profilazione a campionamento su richiesta (disattivata senza PROFILER_TOKEN)
+    PROFILER_TOKEN = os.getenv('PROFILER_TOKEN', '')
+    PROFILER_SAMPLE_RATE = float(os.getenv('PROFILER_SAMPLE_RATE', 0))
+    PROFILER_INTERVAL_MS = float(os.getenv('PROFILER_INTERVAL_MS', 5))
+    PROFILER_BUFFER_SIZE = int(os.getenv('PROFILER_BUFFER_SIZE', 50))
+    # Cartella condivisa dai worker per i profili e il sample rate; vuota = buffer in memoria per processo
+    PROFILER_DIR = os.getenv('PROFILER_DIR', '.profiles')
+    # Stato condiviso dai worker dello stesso host (token, job delle playlist) quando Redis manca; vuoto = solo memoria
+    HOST_STORE_PATH = os.getenv('HOST_STORE_PATH', '.shared_state.sqlite3')
@@ -1,9 +1,15 @@
 from flask import session
 from app.services.spotify_services import get_spotify_client, get_auth_url as get_spotify_auth_url, process_callback as process_spotify_callback
 
+# Il cookie di sessione contiene solo la chiave: i token restano nel TokenStore
+SESSION_TOKEN_KEY = 'token_key'
+
+def current_spotify_client():
+    return get_spotify_client(session.get(SESSION_TOKEN_KEY))
+
 def get_auth_url(force=False):
-    sp_client = get_spotify_client()
-    if 'token_info' in session and not force:
+    sp_client = current_spotify_client()
+    if sp_client is not None and not force:
         user_profile = sp_client.current_user()
         return True, {'user_name': user_profile['display_name']}
     else:
@@ -14,7 +20,7 @@ def process_callback(code):
     try:
         result = process_spotify_callback(code)
         if result['success']:
-            session['token_info'] = result['token_info']
+            session[SESSION_TOKEN_KEY] = result['session_key']
             return {'success': True}
         else:
             return {'success': False, 'error': result.get('error', 'Unknown error')}
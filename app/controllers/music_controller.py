@@ -1,16 +1,43 @@
-
-from app.services.spotify_services import get_spotify_client, SpotifyService
+from app.config import Config
+from app.controllers.auth_controller import current_spotify_client
+from app.services.spotify_services import SpotifyService
 from app.services.mood_analysis import MoodAnalysisService
 from app.services.recommendation import RecommendationService
+from app.services.playlist_jobs import get_playlist_jobs
+from app.utils.prefork import is_preloading, start_background
 
 spotify_service = SpotifyService()
 mood_analysis_service = MoodAnalysisService()
 rec_service = RecommendationService(spotify_service, mood_analysis_service)
+playlist_jobs = get_playlist_jobs(rec_service.create_mood_playlist)
+# Generi seed e playlist editoriali aggiornati in background, fuori dal percorso delle richieste
+start_background(rec_service.reference_data.start)
+
+# Nel master di un server prefork il modello va caricato prima del fork (vedi wsgi.py)
+if Config.MODEL_LOADING == 'eager' or is_preloading():
+    mood_analysis_service.warm_up(background=False)
+elif Config.MODEL_LOADING == 'background':
+    mood_analysis_service.warm_up(background=True)
+
+def get_readiness():
+    # In modalità lazy è la prima sonda di readiness ad avviare il caricamento in background
+    if Config.MODEL_LOADING == 'lazy' and mood_analysis_service.state == 'cold':
+        mood_analysis_service.warm_up(background=True)
+    status = mood_analysis_service.status()
+    return mood_analysis_service.is_ready, status
+
+def get_reference_data_metrics():
+    return rec_service.reference_data.metrics()
 
-def get_user_recap_data():
-    sp_client = get_spotify_client()
+def get_user_recap_data(refresh=False):
+    sp_client = current_spotify_client()
     if not sp_client:
         return None
+    if refresh:
+        # Basta l'ID (profilo dalla cache o una sola chiamata): i dati vengono letti una volta sola
+        user_id = spotify_service.get_user_id(sp_client)
+        if user_id:
+            spotify_service.invalidate_user_data(user_id)
     user = spotify_service.get_user_data(sp_client)
     # Top tracks
     top_tracks = []
@@ -50,28 +77,74 @@ def get_user_recap_data():
         'recently_played': recently_played
     }
 
+def _submit_playlist(sp_client, recommendations):
+    # La playlist su Spotify viene creata in background: la pagina non la attende
+    track_ids = [t.id for t in recommendations]
+    if not track_ids:
+        return None
+    user_id = spotify_service.get_user_id(sp_client)
+    if not user_id:
+        # Senza proprietario il job non si potrebbe proteggere: la playlist non viene creata
+        print("Utente non identificato: playlist non creata")
+        return None
+    return playlist_jobs.submit(sp_client, "Playlist Mood", track_ids, user_id=user_id)
+
 def process_recommendation_request(user_input):
-    sp_client = get_spotify_client()
+    sp_client = current_spotify_client()
     if not sp_client:
         return {'success': False, 'error': 'Utente non autenticato'}
     try:
         # Analisi emozioni
         emotions_dict = mood_analysis_service.analyze_text(user_input)
-        # Raccomandazioni
-        recommendations = rec_service.get_mood_recommendations(sp_client, user_input)
-        # Crea la playlist su Spotify e ottieni il link reale
-        track_ids = [t['id'] for t in recommendations if 'id' in t]
-        playlist_url = None
-        if track_ids:
-            playlist_url = rec_service.create_mood_playlist(sp_client, "Playlist Mood", track_ids)
+        # Raccomandazioni (riusa l'analisi appena calcolata)
+        recommendations = rec_service.get_mood_recommendations(sp_client, user_input, emotion=emotions_dict)
+        playlist_job = _submit_playlist(sp_client, recommendations)
         return {
             'success': True,
             'data': {
                 'analysis': emotions_dict,
                 'tracks': recommendations,
                 'user_input': user_input,
-                'playlist_url': playlist_url
+                'playlist_job': playlist_job
             }
         }
     except Exception as e:
         return {'success': False, 'error': str(e)}
+
+def stream_recommendation_events(user_input):
+    """
+    Versione progressiva di process_recommendation_request: produce (evento, dati)
+    man mano che analisi, tracce familiari e batch di raccomandazioni sono pronti.
+    """
+    sp_client = current_spotify_client()
+    if not sp_client:
+        yield 'error', {'error': 'Utente non autenticato'}
+        return
+    try:
+        emotions_dict = mood_analysis_service.analyze_text(user_input)
+        events = rec_service.iter_mood_recommendations(sp_client, user_input, emotion=emotions_dict)
+        for event, payload in events:
+            if event == 'analysis':
+                yield event, payload
+            elif event == 'familiar':
+                yield event, {'tracks': [t.to_dict() for t in payload]}
+            elif event == 'batch':
+                yield event, {'strategy': payload['strategy'], 'tracks': [t.to_dict() for t in payload['tracks']]}
+            elif event == 'final':
+                yield event, {
+                    'tracks': [t.to_dict() for t in payload],
+                    'playlist_job': _submit_playlist(sp_client, payload)
+                }
+    except Exception as e:
+        yield 'error', {'error': str(e)}
+
+
+def get_playlist_status(job_id):
+    job = playlist_jobs.status(job_id)
+    if job is None:
+        return None
+    # Un job è visibile solo all'utente che l'ha avviato
+    sp_client = current_spotify_client()
+    if not job.get('user_id') or sp_client is None or spotify_service.get_user_id(sp_client) != job['user_id']:
+        return None
+    return {k: job[k] for k in ('id', 'status', 'added', 'total', 'playlist_url', 'error')}
@@ -1,9 +1,46 @@
-from flask import Blueprint, render_template, redirect, url_for, request
+import hmac
+import os
+import json
+import time
+
+from flask import Blueprint, Response, g, render_template, redirect, url_for, request, jsonify, stream_with_context
+from app.config import Config
 from app.controllers.auth_controller import get_auth_url, process_callback
-from app.controllers.music_controller import get_user_recap_data, process_recommendation_request
+from app.controllers.music_controller import (
+    get_user_recap_data, process_recommendation_request, get_readiness, get_playlist_status, stream_recommendation_events,
+    get_reference_data_metrics
+)
+from app.utils.metrics import HTTP_REQUEST_SECONDS, REGISTRY
+from app.utils.profiler import get_profiler
 
 main_bp = Blueprint('main', __name__)
 
+def _profiler_authorized():
+    token = request.headers.get('X-Profiler-Token', '')
+    return bool(Config.PROFILER_TOKEN) and hmac.compare_digest(token, Config.PROFILER_TOKEN)
+
+@main_bp.before_app_request
+def _start_timer():
+    g.request_start = time.perf_counter()
+    if Config.PROFILER_TOKEN and not request.path.startswith('/_profiler'):
+        requested = request.headers.get('X-Profile') == '1' and _profiler_authorized()
+        if get_profiler().should_profile(requested):
+            g.profile = get_profiler().start(f"{request.method} {request.path}")
+
+@main_bp.after_app_request
+def _record_request(response):
+    # Per le risposte in streaming si misura il tempo fino all'invio degli header
+    start = g.pop('request_start', None)
+    if start is not None and Config.METRICS_ENABLED:
+        HTTP_REQUEST_SECONDS.observe(time.perf_counter() - start, request.endpoint or 'unknown',
+                                     request.method, str(response.status_code))
+    profile = g.pop('profile', None)
+    if profile is not None:
+        # Il profilo si chiude a risposta inviata, anche per gli stream SSE
+        response.call_on_close(lambda: get_profiler().finish(profile))
+        response.headers['X-Profile-Id'] = profile.id
+    return response
+
 @main_bp.route('/')
 def home():
     authenticated, data = get_auth_url()
@@ -25,9 +62,52 @@ def callback():
     else:
         return f"Errore durante l'autenticazione: {result['error']}. Per favore, <a href='/'>riprova</a>."
 
+@main_bp.route('/healthz')
+def healthz():
+    return jsonify({'status': 'ok'})
+
+@main_bp.route('/metrics')
+def metrics():
+    if not Config.METRICS_ENABLED:
+        return "Not found", 404
+    return Response(REGISTRY.render(), mimetype='text/plain; version=0.0.4')
+
+@main_bp.route('/_profiler')
+def profiler_index():
+    if not _profiler_authorized():
+        return "Not found", 404
+    return jsonify({'pid': os.getpid(), 'sample_rate': get_profiler().sample_rate, 'profiles': get_profiler().list()})
+
+@main_bp.route('/_profiler/sample_rate', methods=['POST'])
+def profiler_sample_rate():
+    if not _profiler_authorized():
+        return "Not found", 404
+    try:
+        rate = float(request.form.get('rate', request.args.get('rate', '')))
+    except ValueError:
+        return jsonify({'error': 'rate deve essere un numero tra 0 e 1'}), 400
+    get_profiler().sample_rate = min(1.0, max(0.0, rate))
+    return jsonify({'pid': os.getpid(), 'sample_rate': get_profiler().sample_rate})
+
+@main_bp.route('/_profiler/<profile_id>.folded')
+def profiler_download(profile_id):
+    if not _profiler_authorized():
+        return "Not found", 404
+    if profile_id == 'all':
+        return Response(get_profiler().merged(), mimetype='text/plain')
+    collapsed = get_profiler().collapsed(profile_id)
+    if collapsed is None:
+        return "Not found", 404
+    return Response(collapsed, mimetype='text/plain')
+
+@main_bp.route('/readyz')
+def readyz():
+    ready, status = get_readiness()
+    return jsonify({'ready': ready, 'model': status, 'reference_data': get_reference_data_metrics()}), 200 if ready else 503
+
 @main_bp.route('/user_recap')
 def user_recap():
-    user_data = get_user_recap_data()
+    user_data = get_user_recap_data(refresh=request.args.get('refresh') == '1')
     if user_data is None:
         return redirect(url_for('main.login'))
     return render_template('user_recap.html', **user_data)
@@ -36,11 +116,36 @@ def user_recap():
 def recommend():
     try:
         user_input = request.form['user_input']
+        if Config.RECOMMEND_STREAMING:
+            # La pagina viene inviata subito e si riempie con /recommend/stream
+            return render_template('recommendations.html', user_input=user_input, tracks=[], stream=True)
         result = process_recommendation_request(user_input)
         if result['success']:
             # Passa sempre analysis, tracks, user_input, playlist_url
             return render_template('recommendations.html', **result['data'])
         else:
-            return render_template('error.html', error=result['error'])
+            # Stato 500: la pagina di errore non deve risultare un successo (monitoraggio, bench_load)
+            return render_template('error.html', error=result['error']), 500
     except Exception as e:
-        return render_template('error.html', error=str(e))
\ No newline at end of file
+        return render_template('error.html', error=str(e)), 500
+
+@main_bp.route('/playlist_status/<job_id>')
+def playlist_status(job_id):
+    status = get_playlist_status(job_id)
+    if status is None:
+        return jsonify({'error': 'Job non trovato'}), 404
+    return jsonify(status)
+
+@main_bp.route('/recommend/stream', methods=['POST'])
+def recommend_stream():
+    user_input = request.form['user_input']
+
+    def events():
+        for event, data in stream_recommendation_events(user_input):
+            yield f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+    return Response(
+        stream_with_context(events()),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
@@ -0,0 +1,57 @@
+class Track:
+    """
+    Traccia compatta: solo i campi usati da raccomandazioni e template.
+    Costruita una volta dal JSON della Web API (che include available_markets,
+    tutte le immagini dell'album, gli artisti annidati, ...).
+    """
+    __slots__ = ('id', 'name', 'uri', 'artist_ids', 'artist_names', 'album_name', 'image_url', 'url', 'popularity')
+
+    def __init__(self, id, name=None, uri=None, artist_ids=(), artist_names=(), album_name=None,
+                 image_url=None, url=None, popularity=None):
+        self.id = id
+        self.name = name
+        self.uri = uri
+        self.artist_ids = tuple(artist_ids)
+        self.artist_names = tuple(artist_names)
+        self.album_name = album_name
+        self.image_url = image_url
+        self.url = url
+        self.popularity = popularity
+
+    @classmethod
+    def from_spotify(cls, data):
+        artists = [a for a in data.get('artists') or () if a]
+        album = data.get('album') or {}
+        images = album.get('images') or [{}]
+        return cls(
+            id=data.get('id'),
+            name=data.get('name'),
+            uri=data.get('uri'),
+            artist_ids=[a.get('id') for a in artists if a.get('id')],
+            artist_names=[a.get('name') for a in artists],
+            album_name=album.get('name'),
+            image_url=images[0].get('url'),
+            url=(data.get('external_urls') or {}).get('spotify'),
+            popularity=data.get('popularity')
+        )
+
+    @property
+    def artist(self):
+        return self.artist_names[0] if self.artist_names else None
+
+    def __eq__(self, other):
+        return isinstance(other, Track) and self.id == other.id
+
+    def __hash__(self):
+        return hash(self.id)
+
+    def __repr__(self):
+        return f"Track({self.id!r}, {self.name!r})"
+
+    def to_dict(self):
+        return {slot: getattr(self, slot) for slot in self.__slots__}
+
+
+def tracks_from_spotify(items):
+    """Converte una lista di tracce della Web API, scartando quelle nulle o senza ID."""
+    return [Track.from_spotify(t) for t in items if t and t.get('id')]
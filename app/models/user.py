@@ -4,6 +4,7 @@ class User:
         self.top_tracks = {}
         self.top_artists = {}
         self.recently_played = {}
+        self.saved_tracks = {}
         self.top_genres = {}
     
     @property
@@ -20,6 +21,7 @@ class User:
             'top_tracks': self.top_tracks,
             'top_artists': self.top_artists,
             'recently_played': self.recently_played,
+            'saved_tracks': self.saved_tracks,
             'top_genres': self.top_genres
         }
     
@@ -29,5 +31,6 @@ class User:
         user.top_tracks = data.get('top_tracks', {})
         user.top_artists = data.get('top_artists', {})
         user.recently_played = data.get('recently_played', {})
+        user.saved_tracks = data.get('saved_tracks', {})
         user.top_genres = data.get('top_genres', {})
         return user
\ No newline at end of file
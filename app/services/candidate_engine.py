@@ -0,0 +1,318 @@
+import json
+import math
+import os
+import threading
+import time
+
+import numpy as np
+from app.config import Config
+
+# Dimensioni dello spazio di ricerca, allineate ai parametri target_* di _calculate_audio_features
+ANN_FEATURES = ('valence', 'energy', 'danceability', 'acousticness', 'tempo', 'instrumentalness', 'liveness')
+_TEMPO_INDEX = ANN_FEATURES.index('tempo')
+_TEMPO_SCALE = 250.0
+_ASSIGN_CHUNK = 65536
+_TRAIN_SAMPLE = 50000
+# File dell'indice persistito accanto all'archivio tracce (vedi build_store_index)
+_INDEX_META = 'ann_index.json'
+_INDEX_FILES = ('ann_vectors', 'ann_centroids', 'ann_order', 'ann_offsets')
+
+
+def normalize_vectors(matrix):
+    """Porta tutte le dimensioni in [0, 1] (il tempo è in BPM) e sostituisce i NaN con 0.5."""
+    vectors = np.array(matrix, dtype=np.float32, copy=True)
+    vectors[:, _TEMPO_INDEX] = np.clip(vectors[:, _TEMPO_INDEX] / _TEMPO_SCALE, 0.0, 1.0)
+    vectors[np.isnan(vectors)] = 0.5
+    return vectors
+
+
+def normalize_columns(features, columns, out=None):
+    """normalize_vectors a blocchi sulle colonne scelte (anche di una matrice memory-mapped): una sola copia."""
+    if out is None:
+        out = np.empty((len(features), len(columns)), dtype=np.float32)
+    for start in range(0, len(features), _ASSIGN_CHUNK):
+        block = features[start:start + _ASSIGN_CHUNK]
+        out[start:start + len(block)] = normalize_vectors(block[:, columns])
+    return out
+
+
+def query_vector(audio_features):
+    """Vettore obiettivo e pesi (solo le dimensioni presenti tra i target_*)."""
+    target = np.zeros(len(ANN_FEATURES), dtype=np.float32)
+    weights = np.zeros(len(ANN_FEATURES), dtype=np.float32)
+    for i, col in enumerate(ANN_FEATURES):
+        value = audio_features.get(f'target_{col}')
+        if value is not None:
+            target[i] = min(1.0, value / _TEMPO_SCALE) if i == _TEMPO_INDEX else value
+            weights[i] = 1.0
+    return target, weights
+
+
+class ListMetadata:
+    """Artisti e generi per riga, per filtrare i candidati sui seed."""
+    def __init__(self, artist_ids, genres=None):
+        self.artist_ids = [set(a or ()) for a in artist_ids]
+        self.genres = [set(g or ()) for g in genres] if genres is not None else None
+
+    def matches(self, rows, seed_artists, seed_genres):
+        seed_artists = set(seed_artists or ())
+        seed_genres = set(seed_genres or ())
+        return np.array([
+            bool(self.artist_ids[r] & seed_artists) or
+            bool(self.genres is not None and self.genres[r] & seed_genres)
+            for r in rows
+        ], dtype=bool)
+
+
+class NearestNeighbourIndex:
+    """
+    Indice IVF approssimato: un k-means grossolano partiziona i vettori in liste,
+    la query visita solo le `n_probe` liste più vicine e calcola le distanze esatte lì.
+    """
+    def __init__(self, ids, matrix, metadata=None, n_lists=None, n_iter=8, seed=0, normalized=False):
+        # Gli ID possono essere un array memory-mapped (bytes) dell'archivio tracce
+        self.ids = ids if isinstance(ids, np.ndarray) else list(ids)
+        self.metadata = metadata
+        self.vectors = matrix if normalized else normalize_vectors(matrix)
+        n = len(self.ids)
+        self.n_lists = max(1, min(n, n_lists or int(math.sqrt(n))))
+        rng = np.random.default_rng(seed)
+        self.centroids = self.vectors[rng.choice(n, self.n_lists, replace=False)].copy()
+        # I centroidi vengono addestrati su un campione: l'assegnazione finale copre tutti i vettori
+        sample = self.vectors
+        if n > _TRAIN_SAMPLE:
+            sample = self.vectors[rng.choice(n, _TRAIN_SAMPLE, replace=False)]
+        for _ in range(n_iter):
+            assign = self._assign(sample)
+            counts = np.bincount(assign, minlength=self.n_lists)
+            non_empty = counts > 0
+            for d in range(sample.shape[1]):
+                sums = np.bincount(assign, weights=sample[:, d], minlength=self.n_lists)
+                self.centroids[non_empty, d] = sums[non_empty] / counts[non_empty]
+        assign = self._assign(self.vectors)
+        self.order = np.argsort(assign, kind='stable')
+        self.offsets = np.searchsorted(assign[self.order], np.arange(self.n_lists + 1))
+
+    def save(self, path):
+        """Scrive vettori normalizzati, centroidi e liste IVF come file binari grezzi in `path`."""
+        arrays = (self.vectors, self.centroids, self.order, self.offsets)
+        for name, array in zip(_INDEX_FILES, arrays):
+            target = os.path.join(path, f'{name}.bin')
+            # I vettori possono essere già il memmap di destinazione
+            if not (isinstance(array, np.memmap) and os.path.abspath(array.filename) == os.path.abspath(target)):
+                np.ascontiguousarray(array).tofile(target)
+        with open(os.path.join(path, _INDEX_META), 'w') as f:
+            json.dump({'rows': len(self.ids), 'n_lists': self.n_lists, 'features': list(ANN_FEATURES)}, f)
+
+    @classmethod
+    def load(cls, path, ids, metadata=None):
+        """
+        Apre un indice salvato con save() tramite np.memmap, senza copie né addestramento;
+        None se manca o non corrisponde agli ID.
+        """
+        meta_path = os.path.join(path, _INDEX_META)
+        if not os.path.exists(meta_path):
+            return None
+        with open(meta_path) as f:
+            meta = json.load(f)
+        rows, n_lists = meta['rows'], meta['n_lists']
+        if rows != len(ids) or tuple(meta['features']) != ANN_FEATURES:
+            return None
+
+        def mapped(name, dtype, shape):
+            return np.memmap(os.path.join(path, f'{name}.bin'), dtype=dtype, mode='r', shape=shape)
+
+        index = cls.__new__(cls)
+        index.ids = ids
+        index.metadata = metadata
+        index.n_lists = n_lists
+        index.vectors = mapped('ann_vectors', np.float32, (rows, len(ANN_FEATURES)))
+        index.centroids = np.array(mapped('ann_centroids', np.float32, (n_lists, len(ANN_FEATURES))))
+        index.order = mapped('ann_order', np.int64, (rows,))
+        index.offsets = np.array(mapped('ann_offsets', np.int64, (n_lists + 1,)))
+        return index
+
+    def __len__(self):
+        return len(self.ids)
+
+    def _id(self, row):
+        track_id = self.ids[row]
+        return track_id.decode('ascii') if isinstance(track_id, bytes) else track_id
+
+    def _assign(self, vectors):
+        assign = np.empty(len(vectors), dtype=np.int64)
+        c_norm = (self.centroids ** 2).sum(axis=1)
+        for start in range(0, len(vectors), _ASSIGN_CHUNK):
+            block = vectors[start:start + _ASSIGN_CHUNK]
+            dist = c_norm[None, :] - 2.0 * block @ self.centroids.T
+            assign[start:start + len(block)] = dist.argmin(axis=1)
+        return assign
+
+    def search(self, target, weights, k, n_probe=8, seed_artists=None, seed_genres=None, exclude=None):
+        centroid_dist = (((self.centroids - target) ** 2) * weights).sum(axis=1)
+        probe = np.argsort(centroid_dist)[:max(1, n_probe)]
+        rows = np.concatenate([self.order[self.offsets[l]:self.offsets[l + 1]] for l in probe])
+        if exclude:
+            rows = rows[np.array([self._id(r) not in exclude for r in rows], dtype=bool)]
+        if len(rows) == 0:
+            return []
+        dist = (((self.vectors[rows] - target) ** 2) * weights).sum(axis=1)
+
+        # I candidati che condividono artisti o generi con i seed hanno la precedenza
+        if self.metadata is not None and (seed_artists or seed_genres):
+            preferred = self.metadata.matches(rows, seed_artists, seed_genres)
+            dist = dist + np.where(preferred, 0.0, weights.sum() + 1.0)
+
+        k = min(k, len(rows))
+        best = np.argpartition(dist, k - 1)[:k]
+        best = best[np.argsort(dist[best], kind='stable')]
+        return [self._id(r) for r in rows[best]]
+
+
+class FeatureStoreSource:
+    """
+    Vettori dalle tracce già presenti nell'archivio delle caratteristiche audio.
+    L'archivio cresce con le richieste (vedi RecommendationService._record_audio_features).
+    """
+    static = False
+
+    def __init__(self, feature_store):
+        self.feature_store = feature_store
+
+    def count(self):
+        return self.feature_store.count()
+
+    def build_index(self, min_tracks):
+        ids, matrix = self.feature_store.load_all(ANN_FEATURES)
+        if len(ids) < min_tracks:
+            return None
+        return NearestNeighbourIndex(ids, matrix)
+
+
+class TrackStoreSource:
+    """
+    Vettori e metadati (artisti, generi) dall'archivio colonnare memory-mapped.
+    L'archivio non cambia a runtime: l'indice viene aperto una volta sola.
+    """
+    static = True
+
+    def __init__(self, track_store):
+        self.track_store = track_store
+
+    def count(self):
+        return len(self.track_store)
+
+    def build_index(self, min_tracks):
+        store = self.track_store
+        if len(store) < min_tracks:
+            return None
+        # Indice persistito da ingest_catalog: mappato, le pagine restano condivise tra i worker
+        index = NearestNeighbourIndex.load(store.path, store.ids, metadata=store)
+        if index is not None:
+            return index
+        print(f"Indice dei candidati non trovato in {store.path}: costruzione in memoria "
+              f"(python -m app.utils.ingest_catalog --index-only {store.path} per salvarlo)")
+        vectors = normalize_columns(store.features, store.feature_columns(ANN_FEATURES))
+        return NearestNeighbourIndex(store.ids, vectors, metadata=store, normalized=True)
+
+
+def build_store_index(path):
+    """Normalizza i vettori dell'archivio tracce in `path` e vi salva l'indice IVF."""
+    from app.utils.track_store import TrackStore
+    store = TrackStore.open(path)
+    if len(store) == 0:
+        return None
+    vectors = np.memmap(os.path.join(path, 'ann_vectors.bin'), dtype=np.float32, mode='w+',
+                        shape=(len(store), len(ANN_FEATURES)))
+    normalize_columns(store.features, store.feature_columns(ANN_FEATURES), out=vectors)
+    vectors.flush()
+    index = NearestNeighbourIndex(store.ids, vectors, normalized=True)
+    index.save(path)
+    return index
+
+
+class CandidateEngine:
+    """
+    Generazione locale di candidati: mantiene un NearestNeighbourIndex costruito
+    in background dalla sorgente. Ogni `refresh_seconds` controlla il numero di tracce
+    e ricostruisce l'indice solo se la sorgente è cresciuta dall'ultima costruzione.
+    """
+    def __init__(self, source, refresh_seconds=3600, min_tracks=500, n_probe=8):
+        self.source = source
+        self.refresh_seconds = refresh_seconds
+        self.min_tracks = min_tracks
+        self.n_probe = n_probe
+        self.index = None
+        self.built_at = None
+        self.built_rows = None
+        self._building = False
+        self._lock = threading.Lock()
+
+    def _schedule_build(self):
+        with self._lock:
+            if self._building:
+                return
+            if self.built_at is not None and (self.source.static or time.time() - self.built_at < self.refresh_seconds):
+                return
+            self._building = True
+        threading.Thread(target=self._build, name='candidate-index-build', daemon=True).start()
+
+    def warm_up(self):
+        """Costruisce l'indice subito, nel thread chiamante (es. nel master prima del fork)."""
+        with self._lock:
+            if self._building:
+                return
+            self._building = True
+        self._build()
+
+    def _build(self):
+        try:
+            # Un COUNT costa poco: caricamento e k-means solo se ci sono tracce nuove
+            rows = self.source.count()
+            if rows < self.min_tracks or rows == self.built_rows:
+                return
+            start = time.perf_counter()
+            index = self.source.build_index(self.min_tracks)
+            if index is not None:
+                self.index = index
+                self.built_rows = rows
+                print(f"Indice dei candidati locali pronto: {len(index)} tracce in {time.perf_counter() - start:.2f}s")
+        except Exception as e:
+            print(f"Errore nella costruzione dell'indice dei candidati locali: {e}")
+        finally:
+            with self._lock:
+                self.built_at = time.time()
+                self._building = False
+
+    def recommend(self, audio_features, k=30, seed_artists=None, seed_genres=None, exclude=None):
+        self._schedule_build()
+        index = self.index
+        if index is None:
+            return []
+        target, weights = query_vector(audio_features)
+        return index.search(target, weights, k, n_probe=self.n_probe,
+                            seed_artists=seed_artists, seed_genres=seed_genres, exclude=exclude)
+
+
+_engine_instance = None
+_engine_lock = threading.Lock()
+
+def get_candidate_engine():
+    global _engine_instance
+    if _engine_instance is None:
+        with _engine_lock:
+            if _engine_instance is None:
+                from app.utils.feature_store import get_feature_store
+                from app.utils.track_store import get_track_store
+                track_store = get_track_store()
+                if track_store is not None:
+                    source = TrackStoreSource(track_store)
+                else:
+                    source = FeatureStoreSource(get_feature_store())
+                _engine_instance = CandidateEngine(
+                    source,
+                    refresh_seconds=Config.LOCAL_INDEX_REFRESH_SECONDS,
+                    min_tracks=Config.LOCAL_CANDIDATES_MIN_TRACKS,
+                    n_probe=Config.LOCAL_INDEX_PROBES
+                )
+    return _engine_instance
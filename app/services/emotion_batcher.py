@@ -0,0 +1,91 @@
+import queue
+import threading
+import time
+
+
+class _PendingRequest:
+    __slots__ = ('text', 'done', 'result', 'error')
+
+    def __init__(self, text):
+        self.text = text
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class EmotionBatcher:
+    """
+    Raggruppa le richieste concorrenti di analisi in un unico batch per il modello.
+    Il worker attende al massimo `max_wait_ms` (o `max_batch_size` testi) prima di
+    eseguire un forward pass e restituisce a ciascun chiamante il proprio risultato.
+    """
+    def __init__(self, classify_batch, max_batch_size=16, max_wait_ms=10):
+        self.classify_batch = classify_batch
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait = max(0.0, float(max_wait_ms)) / 1000.0
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._worker = None
+
+    def _ensure_worker(self):
+        if self._worker is not None and self._worker.is_alive():
+            return
+        with self._lock:
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(target=self._run, name='emotion-batcher', daemon=True)
+                self._worker.start()
+
+    def submit(self, text, timeout=None):
+        self._ensure_worker()
+        request = _PendingRequest(text)
+        self._queue.put(request)
+        if not request.done.wait(timeout):
+            raise TimeoutError("Timeout nell'attesa dell'analisi delle emozioni")
+        if request.error is not None:
+            raise request.error
+        return request.result
+
+    def submit_many(self, texts, timeout=None):
+        """Accoda più testi insieme: finiscono nello stesso batch o in batch consecutivi."""
+        self._ensure_worker()
+        requests = [_PendingRequest(text) for text in texts]
+        for request in requests:
+            self._queue.put(request)
+        deadline = time.monotonic() + timeout if timeout is not None else None
+        results = []
+        for request in requests:
+            remaining = max(0.0, deadline - time.monotonic()) if deadline is not None else None
+            if not request.done.wait(remaining):
+                raise TimeoutError("Timeout nell'attesa dell'analisi delle emozioni")
+            if request.error is not None:
+                raise request.error
+            results.append(request.result)
+        return results
+
+    def _collect_batch(self):
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect_batch()
+            try:
+                results = self.classify_batch([req.text for req in batch])
+                for req, result in zip(batch, results):
+                    req.result = result
+            except Exception as e:
+                print(f"Errore nell'analisi del batch di emozioni: {e}")
+                for req in batch:
+                    req.error = e
+            finally:
+                for req in batch:
+                    req.done.set()
@@ -0,0 +1,226 @@
+import itertools
+import os
+import socket
+import threading
+
+from app.config import Config
+from app.utils.prefork import is_preloading
+from app.utils.ipc import recv_message, send_message
+
+
+def _normalize_scores(results):
+    if isinstance(results, list) and results and isinstance(results[0], list):
+        results = results[0]
+    total = sum(res['score'] for res in results)
+    return {
+        str(res['label']).lower(): res['score'] / total
+        for res in results
+    }
+
+
+class TransformersBackend:
+    """Pipeline PyTorch di transformers (comportamento storico)."""
+    name = 'transformers'
+
+    def __init__(self, model_name):
+        from transformers import pipeline
+        self.model_name = model_name
+        self.emotion_analyzer = pipeline(
+            "text-classification",
+            model=model_name,
+            top_k=None
+        )
+
+    def classify(self, texts):
+        results = self.emotion_analyzer(texts, batch_size=len(texts), truncation=True)
+        return [_normalize_scores(res) for res in results]
+
+
+class OnnxBackend:
+    """
+    Modello esportato in ONNX ed eseguito con ONNX Runtime su CPU,
+    con quantizzazione dinamica int8 opzionale dei pesi.
+    """
+    name = 'onnx'
+
+    def __init__(self, model_name, export_dir, quantize=True, intra_op_threads=0):
+        try:
+            import onnxruntime
+        except ImportError as e:
+            raise ImportError("Il backend 'onnx' richiede il pacchetto onnxruntime") from e
+        from transformers import AutoConfig, AutoTokenizer
+
+        self.model_name = model_name
+        self.quantize = quantize
+        self.intra_op_threads = intra_op_threads
+        self.tokenizer = AutoTokenizer.from_pretrained(model_name)
+        id2label = AutoConfig.from_pretrained(model_name).id2label
+        self.labels = [str(id2label[i]).lower() for i in range(len(id2label))]
+
+        self.model_path = self._ensure_model(export_dir)
+        # La sessione di ONNX Runtime non è condivisibile tra processi: nel master di un
+        # server prefork non viene creata, ogni worker costruisce la propria al primo uso
+        self.session = None
+        self._session_pid = None
+        if not is_preloading():
+            self._create_session()
+
+    def _create_session(self):
+        import onnxruntime
+
+        options = onnxruntime.SessionOptions()
+        options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if self.intra_op_threads:
+            options.intra_op_num_threads = self.intra_op_threads
+        self.session = onnxruntime.InferenceSession(
+            self.model_path, sess_options=options, providers=['CPUExecutionProvider']
+        )
+        self.input_names = {inp.name for inp in self.session.get_inputs()}
+        self._session_pid = os.getpid()
+
+    def _ensure_model(self, export_dir):
+        model_dir = os.path.join(export_dir, self.model_name.replace('/', '__'))
+        os.makedirs(model_dir, exist_ok=True)
+        fp32_path = os.path.join(model_dir, 'model.onnx')
+        int8_path = os.path.join(model_dir, 'model.int8.onnx')
+
+        if not os.path.exists(fp32_path):
+            print(f"Esportazione di {self.model_name} in ONNX ({fp32_path})")
+            self._export(fp32_path)
+        if not self.quantize:
+            return fp32_path
+        if not os.path.exists(int8_path):
+            from onnxruntime.quantization import QuantType, quantize_dynamic
+            print(f"Quantizzazione dinamica int8 ({int8_path})")
+            quantize_dynamic(fp32_path, int8_path, weight_type=QuantType.QInt8)
+        return int8_path
+
+    def _export(self, onnx_path):
+        import torch
+        from transformers import AutoModelForSequenceClassification
+
+        model = AutoModelForSequenceClassification.from_pretrained(self.model_name)
+        model.eval()
+        dummy = self.tokenizer(["export"], return_tensors='pt')
+        with torch.no_grad():
+            torch.onnx.export(
+                model,
+                (dummy['input_ids'], dummy['attention_mask']),
+                onnx_path,
+                input_names=['input_ids', 'attention_mask'],
+                output_names=['logits'],
+                dynamic_axes={
+                    'input_ids': {0: 'batch', 1: 'sequence'},
+                    'attention_mask': {0: 'batch', 1: 'sequence'},
+                    'logits': {0: 'batch'}
+                },
+                opset_version=17
+            )
+
+    def classify(self, texts):
+        import numpy as np
+
+        if self._session_pid != os.getpid():
+            self._create_session()
+        encoded = self.tokenizer(texts, padding=True, truncation=True, return_tensors='np')
+        feeds = {name: encoded[name].astype(np.int64) for name in self.input_names}
+        logits = self.session.run(['logits'], feeds)[0]
+        # Stessa normalizzazione (softmax) applicata dalla pipeline
+        logits = logits - logits.max(axis=1, keepdims=True)
+        probs = np.exp(logits)
+        probs /= probs.sum(axis=1, keepdims=True)
+        return [
+            {label: float(score) for label, score in zip(self.labels, row)}
+            for row in probs
+        ]
+
+
+def server_socket_paths(socket_path, processes=1):
+    """Un socket per processo del model server: `path` oppure `path.0`, `path.1`, ..."""
+    if processes <= 1:
+        return [socket_path]
+    return [f"{socket_path}.{i}" for i in range(processes)]
+
+
+class RemoteBackend:
+    """
+    Client del model server (app/services/model_server.py) su socket Unix: il modello
+    gira in processi dedicati e i worker web non caricano torch.
+    Ogni thread tiene una connessione propria; i server sono assegnati a rotazione.
+    """
+    name = 'remote'
+
+    def __init__(self, socket_path, processes=1, timeout=10.0):
+        self.socket_paths = server_socket_paths(socket_path, processes)
+        self.timeout = timeout
+        self._local = threading.local()
+        self._next_server = itertools.count()
+        info = self._request({'op': 'ping'})
+        self.model_name = info.get('model')
+
+    def _connect(self):
+        # Il pid sfasa la rotazione: worker diversi partono da server diversi
+        path = self.socket_paths[(os.getpid() + next(self._next_server)) % len(self.socket_paths)]
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(self.timeout)
+        sock.connect(path)
+        # La connessione appartiene al processo che l'ha aperta: dopo un fork va riaperta
+        self._local.conn = (os.getpid(), sock)
+        return sock
+
+    def _close(self):
+        conn = getattr(self._local, 'conn', None)
+        self._local.conn = None
+        if conn is not None and conn[0] == os.getpid():
+            try:
+                conn[1].close()
+            except OSError:
+                pass
+
+    def _request(self, payload):
+        for attempt in range(2):
+            conn = getattr(self._local, 'conn', None)
+            try:
+                sock = conn[1] if conn is not None and conn[0] == os.getpid() else self._connect()
+                send_message(sock, payload)
+            except (ConnectionError, FileNotFoundError):
+                # Richiesta mai arrivata al server (connessione persa o server in riavvio): si può ripetere
+                self._close()
+                if attempt == 1:
+                    raise
+                continue
+            except OSError:
+                self._close()
+                raise
+            # Dopo l'invio il server può già lavorare sul batch: niente ripetizioni (né sui timeout)
+            try:
+                response = recv_message(sock)
+            except OSError:
+                self._close()
+                raise
+            if response is None:
+                self._close()
+                raise ConnectionError("Connessione chiusa dal model server")
+            return response
+
+    def classify(self, texts):
+        response = self._request({'texts': list(texts)})
+        if response.get('error'):
+            raise RuntimeError(f"Errore del model server: {response['error']}")
+        return response['results']
+
+
+def create_backend(name=None, intra_op_threads=0):
+    name = (name or Config.EMOTION_BACKEND).lower()
+    if name == 'transformers':
+        if intra_op_threads:
+            import torch
+            torch.set_num_threads(intra_op_threads)
+        return TransformersBackend(Config.EMOTION_MODEL)
+    if name == 'onnx':
+        return OnnxBackend(Config.EMOTION_MODEL, Config.EMOTION_ONNX_DIR, quantize=Config.EMOTION_ONNX_QUANTIZE,
+                           intra_op_threads=intra_op_threads)
+    if name == 'remote':
+        return RemoteBackend(Config.MODEL_SERVER_SOCKET, processes=Config.MODEL_SERVER_PROCESSES,
+                             timeout=Config.MODEL_SERVER_TIMEOUT)
+    raise ValueError(f"Backend di inferenza sconosciuto: {name}")
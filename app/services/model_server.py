@@ -0,0 +1,138 @@
+"""
+Model server per l'analisi delle emozioni: il modello viene caricato in uno o più
+processi dedicati (con affinità CPU e thread intra-op configurabili) e i worker web
+lo interrogano su socket Unix tramite RemoteBackend (EMOTION_BACKEND=remote).
+
+Uso:
+    python -m app.services.model_server
+"""
+import argparse
+import os
+import signal
+import socketserver
+import subprocess
+import sys
+
+from app.config import Config
+from app.services.emotion_batcher import EmotionBatcher
+from app.services.inference_backends import create_backend, server_socket_paths
+from app.utils.ipc import recv_message, send_message
+
+
+def parse_cpus(spec):
+    """'0-3,6' -> [0, 1, 2, 3, 6]; stringa vuota -> nessun vincolo."""
+    cpus = []
+    for part in filter(None, (p.strip() for p in spec.split(','))):
+        if '-' in part:
+            start, end = part.split('-')
+            cpus.extend(range(int(start), int(end) + 1))
+        else:
+            cpus.append(int(part))
+    return cpus
+
+
+def split_cpus(cpus, processes):
+    """Divide le CPU in gruppi contigui, uno per processo."""
+    if not cpus:
+        return [[] for _ in range(processes)]
+    size = max(1, len(cpus) // processes)
+    return [cpus[i * size:(i + 1) * size] or cpus for i in range(processes)]
+
+
+class _RequestHandler(socketserver.BaseRequestHandler):
+    def handle(self):
+        server = self.server
+        while True:
+            try:
+                message = recv_message(self.request)
+            except (OSError, ValueError):
+                return
+            if message is None:
+                return
+            if message.get('op') == 'ping':
+                response = {'ok': True, 'pid': os.getpid(), 'model': getattr(server.backend, 'model_name', None)}
+            else:
+                try:
+                    response = {'results': server.batcher.submit_many(message.get('texts', []))}
+                except Exception as e:
+                    response = {'error': str(e)}
+            try:
+                send_message(self.request, response)
+            except OSError:
+                return
+
+
+class ModelServer(socketserver.ThreadingUnixStreamServer):
+    """Un thread per connessione; i testi di tutte le connessioni confluiscono nello stesso batcher."""
+    daemon_threads = True
+
+    def __init__(self, socket_path, backend, max_batch_size=16, max_wait_ms=10):
+        self.backend = backend
+        self.batcher = EmotionBatcher(backend.classify, max_batch_size=max_batch_size, max_wait_ms=max_wait_ms)
+        if os.path.exists(socket_path):
+            os.unlink(socket_path)
+        super().__init__(socket_path, _RequestHandler)
+
+
+def run_server(socket_path, backend_name, threads=0, cpus=None):
+    if cpus:
+        allowed = [cpu for cpu in cpus if cpu in os.sched_getaffinity(0)]
+        if allowed:
+            os.sched_setaffinity(0, allowed)
+        else:
+            print(f"CPU {cpus} non disponibili, il model server non viene vincolato")
+        cpus = allowed
+    backend = create_backend(backend_name, intra_op_threads=threads)
+    server = ModelServer(socket_path, backend,
+                         max_batch_size=Config.EMOTION_BATCH_SIZE, max_wait_ms=Config.EMOTION_BATCH_WINDOW_MS)
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+    print(f"Model server {backend.name} in ascolto su {socket_path} (pid {os.getpid()}, cpu {cpus or 'tutte'})")
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+        if os.path.exists(socket_path):
+            os.unlink(socket_path)
+
+
+def run_pool(socket_path, processes, backend_name, threads=0, cpus=None):
+    """Avvia un processo per socket e li termina tutti quando il supervisore riceve SIGTERM/SIGINT."""
+    children = []
+    for index, (path, group) in enumerate(zip(server_socket_paths(socket_path, processes),
+                                              split_cpus(cpus or [], processes))):
+        command = [sys.executable, '-m', 'app.services.model_server', '--socket', path, '--processes', '1',
+                   '--backend', backend_name, '--threads', str(threads),
+                   '--cpus', ','.join(str(cpu) for cpu in group)]
+        children.append(subprocess.Popen(command))
+
+    def _terminate(*_):
+        for child in children:
+            if child.poll() is None:
+                child.terminate()
+
+    signal.signal(signal.SIGTERM, _terminate)
+    signal.signal(signal.SIGINT, _terminate)
+    for child in children:
+        child.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--socket', default=Config.MODEL_SERVER_SOCKET)
+    parser.add_argument('--processes', type=int, default=Config.MODEL_SERVER_PROCESSES)
+    parser.add_argument('--backend', default=Config.MODEL_SERVER_BACKEND)
+    parser.add_argument('--threads', type=int, default=Config.MODEL_SERVER_THREADS,
+                        help='thread intra-op per processo (0 = default della libreria)')
+    parser.add_argument('--cpus', default=Config.MODEL_SERVER_CPUS,
+                        help='CPU da dividere tra i processi, es. "0-7"')
+    args = parser.parse_args()
+
+    cpus = parse_cpus(args.cpus)
+    if args.processes > 1:
+        run_pool(args.socket, args.processes, args.backend, args.threads, cpus)
+    else:
+        run_server(args.socket, args.backend, args.threads, cpus)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,14 +1,22 @@
-from transformers import pipeline
+import threading
+import time
+from app.config import Config
 from app.models.emotion import Emotion
+from app.services.emotion_batcher import EmotionBatcher
+from app.services.inference_backends import create_backend
+from app.utils.cache_manager import EmotionCache
+from app.utils.metrics import record_cache, stage_timer
 from app.utils.translator import translate_to_english
 
 class MoodAnalysisService:
     def __init__(self):
-        self.emotion_analyzer = pipeline(
-            "text-classification",
-            model="cardiffnlp/twitter-roberta-base-emotion",
-            top_k=None
-        )
+        # Il modello viene caricato in background o al primo utilizzo (vedi warm_up)
+        self.backend = None
+        self.state = 'cold'
+        self.load_error = None
+        self.load_seconds = None
+        self._backend_lock = threading.Lock()
+        self._loader = None
         
         self.emotion_mapping = {
             'joy': {'target_valence': 0.85, 'target_energy': 0.75, 'target_danceability': 0.8},
@@ -19,22 +27,86 @@ class MoodAnalysisService:
             'love': {'target_valence': 0.9, 'target_energy': 0.6, 'target_acousticness': 0.7},
             'optimism': {'target_valence': 0.8, 'target_energy': 0.7, 'target_danceability': 0.75}
         }
+
+        self.cache = EmotionCache(
+            max_size=Config.EMOTION_CACHE_SIZE,
+            ttl_seconds=Config.EMOTION_CACHE_TTL,
+            redis_url=Config.REDIS_URL
+        )
+
+        # Richieste concorrenti condividono un unico forward pass
+        self.batcher = None
+        if Config.EMOTION_BATCH_SIZE > 1:
+            self.batcher = EmotionBatcher(
+                self._classify_batch,
+                max_batch_size=Config.EMOTION_BATCH_SIZE,
+                max_wait_ms=Config.EMOTION_BATCH_WINDOW_MS
+            )
     
+    def warm_up(self, background=True):
+        if background:
+            if self._loader is None:
+                self._loader = threading.Thread(target=self._load_quietly, name='emotion-model-loader', daemon=True)
+                self._loader.start()
+        else:
+            self._get_backend()
+
+    def _load_quietly(self):
+        try:
+            self._get_backend()
+        except Exception as e:
+            print(f"Errore nel caricamento del modello delle emozioni: {e}")
+
+    def _get_backend(self):
+        if self.backend is None:
+            with self._backend_lock:
+                if self.backend is None:
+                    self.state = 'loading'
+                    start = time.perf_counter()
+                    try:
+                        self.backend = create_backend()
+                    except Exception as e:
+                        self.state = 'failed'
+                        self.load_error = str(e)
+                        raise
+                    self.load_seconds = time.perf_counter() - start
+                    self.load_error = None
+                    self.state = 'ready'
+        return self.backend
+
+    @property
+    def is_ready(self):
+        return self.state == 'ready'
+
+    def status(self):
+        return {
+            'state': self.state,
+            'backend': Config.EMOTION_BACKEND,
+            'load_seconds': self.load_seconds,
+            'error': self.load_error
+        }
+
+    def _classify_batch(self, texts):
+        return self._get_backend().classify(texts)
+
     def analyze_text(self, text):
         if not isinstance(text, str):
             text = str(text)
+        cached = self.cache.get(text)
+        record_cache('emotion', cached is not None)
+        if cached is not None:
+            return Emotion(cached)
         # Traduzione in inglese per migliori risultati
-        translated_text = translate_to_english(text)
-        results = self.emotion_analyzer(translated_text)
-        if isinstance(results, list) and results and isinstance(results[0], list):
-            results = results[0]
-        total = sum(res['score'] for res in results)
-        emotions_dict = {
-            str(res['label']).lower(): res['score'] / total
-            for res in results
-        }
+        with stage_timer('translation'):
+            translated_text = translate_to_english(text)
+        with stage_timer('inference'):
+            if self.batcher is not None:
+                emotions_dict = self.batcher.submit(translated_text)
+            else:
+                emotions_dict = self._classify_batch([translated_text])[0]
+        self.cache.set(text, emotions_dict)
         
         return Emotion(emotions_dict)
     
     def get_emotion_mapping(self):
-        return self.emotion_mapping
\ No newline at end of file
+        return self.emotion_mapping
@@ -0,0 +1,115 @@
+import json
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from app.config import Config
+from app.utils.host_store import get_host_store
+from app.utils.redis_client import get_redis
+
+QUEUED = 'queued'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+
+
+class PlaylistJobQueue:
+    """
+    Creazione delle playlist in background: la pagina delle raccomandazioni viene
+    restituita subito e lo stato del job si legge da /playlist_status/<job>.
+    Lo stato è condiviso tra i worker tramite Redis oppure, senza Redis, tramite
+    `host_store` (vedi HostStore): il polling può arrivare a un worker qualsiasi.
+    """
+    def __init__(self, create_playlist, max_workers=4, max_jobs=10000, ttl_seconds=86400,
+                 redis_url=None, namespace='playlist-job', host_store=None):
+        self.create_playlist = create_playlist
+        self.max_jobs = max_jobs
+        self.ttl_seconds = ttl_seconds
+        self.namespace = namespace
+        self.shared = get_redis(redis_url)
+        if self.shared is None:
+            self.shared = host_store
+        self._jobs = OrderedDict()
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='playlist-job')
+
+    def submit(self, sp_client, playlist_name, track_ids, user_id):
+        # Il proprietario serve al controllo di accesso su /playlist_status: niente job anonimi
+        if not user_id:
+            raise ValueError("Job di creazione playlist senza utente")
+        job_id = uuid.uuid4().hex
+        self._save(job_id, {
+            'id': job_id,
+            'user_id': user_id,
+            'status': QUEUED,
+            'added': 0,
+            'total': len(track_ids),
+            'playlist_url': None,
+            'error': None,
+            'created_at': time.time()
+        })
+        self._executor.submit(self._run, job_id, sp_client, playlist_name, list(track_ids), user_id)
+        return job_id
+
+    def status(self, job_id):
+        if self.shared is not None:
+            try:
+                raw = self.shared.get(f"{self.namespace}:{job_id}")
+                if raw is not None:
+                    return json.loads(raw)
+            except Exception as e:
+                print(f"Errore nella lettura del job {job_id} dallo stato condiviso: {e}")
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return dict(job) if job is not None else None
+
+    def _run(self, job_id, sp_client, playlist_name, track_ids, user_id):
+        self._update(job_id, status=RUNNING)
+        try:
+            url = self.create_playlist(
+                sp_client, playlist_name, track_ids, user_id=user_id,
+                progress=lambda added: self._update(job_id, added=added)
+            )
+            self._update(job_id, status=DONE, added=len(track_ids), playlist_url=url)
+        except Exception as e:
+            print(f"Errore nella creazione della playlist (job {job_id}): {e}")
+            self._update(job_id, status=FAILED, error=str(e))
+
+    def _update(self, job_id, **changes):
+        job = self.status(job_id)
+        if job is None:
+            return
+        job.update(changes)
+        self._save(job_id, job)
+
+    def _save(self, job_id, job):
+        with self._lock:
+            self._jobs[job_id] = job
+            self._jobs.move_to_end(job_id)
+            while len(self._jobs) > self.max_jobs:
+                self._jobs.popitem(last=False)
+        if self.shared is not None:
+            try:
+                self.shared.set(f"{self.namespace}:{job_id}", json.dumps(job), ex=self.ttl_seconds)
+            except Exception as e:
+                print(f"Errore nel salvataggio del job {job_id} nello stato condiviso: {e}")
+
+
+_job_queue_instance = None
+_job_queue_lock = threading.Lock()
+
+def get_playlist_jobs(create_playlist):
+    global _job_queue_instance
+    if _job_queue_instance is None:
+        with _job_queue_lock:
+            if _job_queue_instance is None:
+                _job_queue_instance = PlaylistJobQueue(
+                    create_playlist,
+                    max_workers=Config.PLAYLIST_JOB_WORKERS,
+                    ttl_seconds=Config.PLAYLIST_JOB_TTL,
+                    redis_url=Config.REDIS_URL,
+                    host_store=get_host_store()
+                )
+    return _job_queue_instance
@@ -0,0 +1,177 @@
+import threading
+import time
+from collections import Counter, OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from app.config import Config
+from app.models.user import User
+from app.services.rate_limiter import BACKGROUND, priority
+from app.utils.concurrency import client_key, get_fan_out
+from app.utils.metrics import record_cache
+
+TIME_RANGES = ['short_term', 'medium_term', 'long_term']
+
+
+def _source_calls(sp_client, source):
+    if source == 'top_tracks':
+        return {r: (sp_client.current_user_top_tracks, {'time_range': r, 'limit': 50}) for r in TIME_RANGES}
+    if source == 'top_artists':
+        return {r: (sp_client.current_user_top_artists, {'time_range': r, 'limit': 50}) for r in TIME_RANGES}
+    if source == 'recently_played':
+        return {'items': (sp_client.current_user_recently_played, {'limit': 50})}
+    if source == 'saved_tracks':
+        return {'items': (sp_client.current_user_saved_tracks, {'limit': 50})}
+    raise ValueError(f"Sorgente del profilo sconosciuta: {source}")
+
+
+class ProfileCache:
+    """
+    Cache per utente dei dati di ascolto, con TTL per sorgente.
+    I dati scaduti vengono serviti subito mentre un refresh in background li aggiorna
+    (stale-while-revalidate); oltre `stale_seconds` vengono ricaricati in modo sincrono.
+    """
+    SOURCES = ('top_tracks', 'top_artists', 'recently_played', 'saved_tracks')
+
+    def __init__(self, ttls, profile_ttl=3600, stale_seconds=86400, max_users=1000):
+        self.ttls = ttls
+        self.profile_ttl = profile_ttl
+        self.stale_seconds = stale_seconds
+        self.max_users = max_users
+        self._entries = OrderedDict()
+        self._profiles = OrderedDict()
+        self._refreshing = set()
+        self._lock = threading.Lock()
+        self._refresher = ThreadPoolExecutor(max_workers=2, thread_name_prefix='profile-refresh')
+
+    def get_profile(self, sp_client):
+        key = client_key(sp_client)
+        now = time.time()
+        with self._lock:
+            entry = self._profiles.get(key)
+            if entry is not None and now - entry[0] < self.profile_ttl:
+                record_cache('profile', True)
+                return entry[1]
+        record_cache('profile', False)
+        profile = sp_client.current_user()
+        with self._lock:
+            self._profiles[key] = (now, profile)
+            self._profiles.move_to_end(key)
+            while len(self._profiles) > self.max_users:
+                self._profiles.popitem(last=False)
+        return profile
+
+    def get_user(self, sp_client, sources=SOURCES):
+        profile = self.get_profile(sp_client)
+        user_id = profile.get('id')
+        now = time.time()
+        data, missing, stale = {}, [], []
+        with self._lock:
+            entries = self._entries.get(user_id, {})
+            if user_id in self._entries:
+                self._entries.move_to_end(user_id)
+            for source in sources:
+                entry = entries.get(source)
+                age = now - entry[0] if entry is not None else None
+                if age is None or age > self.ttls[source] + self.stale_seconds:
+                    missing.append(source)
+                    record_cache(f'profile_{source}', False)
+                    continue
+                record_cache(f'profile_{source}', True)
+                data[source] = entry[1]
+                if age > self.ttls[source]:
+                    stale.append(source)
+
+        if missing:
+            data.update(self._fetch(sp_client, user_id, missing))
+        if stale:
+            self._schedule_refresh(sp_client, user_id, stale)
+        return self._build_user(profile, data)
+
+    def _fetch(self, sp_client, user_id, sources):
+        calls = {}
+        for source in sources:
+            for part, call in _source_calls(sp_client, source).items():
+                calls[(source, part)] = call
+        results, errors = get_fan_out().run(calls, user_key=client_key(sp_client))
+
+        fetched = {}
+        for source in sources:
+            parts = {part: results.get((source, part)) or {} for part in _source_calls(sp_client, source)}
+            failed = [part for part in parts if (source, part) in errors]
+            for part in failed:
+                print(f"Errore nel recupero dei dati utente ({source}, {part}): {errors[(source, part)]}")
+            value = parts['items'] if list(parts) == ['items'] else parts
+            fetched[source] = value
+            if not failed:
+                self._store(user_id, source, value)
+        return fetched
+
+    def _store(self, user_id, source, value):
+        with self._lock:
+            entries = self._entries.setdefault(user_id, {})
+            entries[source] = (time.time(), value)
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self.max_users:
+                self._entries.popitem(last=False)
+
+    def _schedule_refresh(self, sp_client, user_id, sources):
+        with self._lock:
+            sources = [s for s in sources if (user_id, s) not in self._refreshing]
+            self._refreshing.update((user_id, s) for s in sources)
+        if sources:
+            self._refresher.submit(self._refresh, sp_client, user_id, sources)
+
+    def _refresh(self, sp_client, user_id, sources):
+        try:
+            with priority(BACKGROUND):
+                self._fetch(sp_client, user_id, sources)
+        except Exception as e:
+            print(f"Errore nell'aggiornamento in background del profilo {user_id}: {e}")
+        finally:
+            with self._lock:
+                self._refreshing.difference_update((user_id, s) for s in sources)
+
+    def invalidate(self, user_id, sources=None):
+        with self._lock:
+            if sources is None:
+                self._entries.pop(user_id, None)
+                for key in [k for k, (_, p) in self._profiles.items() if p.get('id') == user_id]:
+                    del self._profiles[key]
+                return
+            entries = self._entries.get(user_id, {})
+            for source in sources:
+                entries.pop(source, None)
+
+    def _build_user(self, profile, data):
+        user = User(profile)
+        user.top_tracks = data.get('top_tracks', {})
+        user.top_artists = data.get('top_artists', {})
+        user.recently_played = data.get('recently_played', {})
+        user.saved_tracks = data.get('saved_tracks', {})
+        genres = Counter()
+        for artist in user.top_artists.get('medium_term', {}).get('items', []):
+            genres.update(artist.get('genres', []))
+        user.top_genres = dict(genres.most_common())
+        return user
+
+
+_profile_cache_instance = None
+_profile_cache_lock = threading.Lock()
+
+def get_profile_cache():
+    global _profile_cache_instance
+    if _profile_cache_instance is None:
+        with _profile_cache_lock:
+            if _profile_cache_instance is None:
+                _profile_cache_instance = ProfileCache(
+                    ttls={
+                        'top_tracks': Config.PROFILE_TTL_TOP_TRACKS,
+                        'top_artists': Config.PROFILE_TTL_TOP_ARTISTS,
+                        'recently_played': Config.PROFILE_TTL_RECENTLY_PLAYED,
+                        'saved_tracks': Config.PROFILE_TTL_SAVED_TRACKS
+                    },
+                    profile_ttl=Config.PROFILE_TTL,
+                    stale_seconds=Config.PROFILE_STALE_SECONDS,
+                    max_users=Config.PROFILE_CACHE_MAX_USERS
+                )
+    return _profile_cache_instance
@@ -0,0 +1,223 @@
+import contextlib
+import contextvars
+import random
+import threading
+import time
+
+from spotipy.exceptions import SpotifyException
+from app.config import Config
+from app.utils.metrics import SPOTIFY_REQUEST_SECONDS, SPOTIFY_REQUESTS
+from app.utils.redis_client import get_redis
+
+# Classi di priorità: il traffico interattivo può consumare tutto il budget,
+# quello in background solo la parte eccedente la riserva
+INTERACTIVE = 'interactive'
+BACKGROUND = 'background'
+
+_current_priority = contextvars.ContextVar('spotify_priority', default=INTERACTIVE)
+
+
+@contextlib.contextmanager
+def priority(level):
+    token = _current_priority.set(level)
+    try:
+        yield
+    finally:
+        _current_priority.reset(token)
+
+
+class RateLimitExceeded(Exception):
+    pass
+
+
+class TokenBucket:
+    def __init__(self, rate, capacity):
+        self.rate = float(rate)
+        self.capacity = float(capacity)
+        self._tokens = float(capacity)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def try_acquire(self, reserve=0.0):
+        """Consuma un token se disponibile, altrimenti restituisce i secondi di attesa."""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            if self._tokens - reserve >= 1:
+                self._tokens -= 1
+                return 0.0
+            return (1 + reserve - self._tokens) / self.rate
+
+
+class RedisTokenBucket:
+    """Stesso algoritmo di TokenBucket, con lo stato condiviso in Redis tra i processi."""
+    _SCRIPT = """
+    local rate = tonumber(ARGV[1])
+    local capacity = tonumber(ARGV[2])
+    local reserve = tonumber(ARGV[3])
+    local t = redis.call('TIME')
+    local now = tonumber(t[1]) + tonumber(t[2]) / 1000000
+    local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+    local tokens = tonumber(state[1]) or capacity
+    local ts = tonumber(state[2]) or now
+    tokens = math.min(capacity, tokens + math.max(0, now - ts) * rate)
+    local wait = 0
+    if tokens - reserve >= 1 then
+        tokens = tokens - 1
+    else
+        wait = (1 + reserve - tokens) / rate
+    end
+    redis.call('HSET', KEYS[1], 'tokens', tokens, 'ts', now)
+    redis.call('EXPIRE', KEYS[1], math.ceil(capacity / rate) + 60)
+    return tostring(wait)
+    """
+
+    def __init__(self, redis_client, key, rate, capacity):
+        self.redis = redis_client
+        self.key = key
+        self.rate = float(rate)
+        self.capacity = float(capacity)
+        self._script = redis_client.register_script(self._SCRIPT)
+
+    def try_acquire(self, reserve=0.0):
+        return float(self._script(keys=[self.key], args=[self.rate, self.capacity, reserve]))
+
+
+class SpotifyScheduler:
+    """
+    Tutte le chiamate alla Web API passano da qui: token bucket condiviso,
+    rispetto di Retry-After dopo un 429 e backoff con jitter sugli errori 5xx.
+    """
+    def __init__(self, rate, capacity, background_reserve=0.5, max_retries=3, max_wait=10.0,
+                 redis_client=None, namespace='spotify'):
+        self.capacity = capacity
+        self.background_reserve = background_reserve
+        self.max_retries = max_retries
+        self.max_wait = max_wait
+        self.redis = redis_client
+        self.blocked_key = f"{namespace}:blocked"
+        if redis_client is not None:
+            self.bucket = RedisTokenBucket(redis_client, f"{namespace}:bucket", rate, capacity)
+        else:
+            self.bucket = TokenBucket(rate, capacity)
+        self._blocked_until = 0.0
+
+    def _blocked_for(self):
+        wait = self._blocked_until - time.monotonic()
+        if self.redis is not None:
+            try:
+                pttl = self.redis.pttl(self.blocked_key)
+                if pttl and pttl > 0:
+                    wait = max(wait, pttl / 1000.0)
+            except Exception as e:
+                print(f"Errore nella lettura del blocco rate limit da Redis: {e}")
+        return max(0.0, wait)
+
+    def _block(self, seconds):
+        self._blocked_until = max(self._blocked_until, time.monotonic() + seconds)
+        if self.redis is not None:
+            try:
+                self.redis.set(self.blocked_key, 1, px=int(seconds * 1000))
+            except Exception as e:
+                print(f"Errore nella scrittura del blocco rate limit su Redis: {e}")
+
+    def _acquire(self, level):
+        reserve = self.capacity * self.background_reserve if level == BACKGROUND else 0.0
+        deadline = time.monotonic() + self.max_wait
+        while True:
+            wait = self._blocked_for()
+            if wait <= 0:
+                try:
+                    wait = self.bucket.try_acquire(reserve)
+                except Exception as e:
+                    # Redis non raggiungibile: meglio procedere che bloccare la richiesta
+                    print(f"Errore nel token bucket, procedo senza limite: {e}")
+                    return
+                if wait <= 0:
+                    return
+            if time.monotonic() + wait > deadline:
+                raise RateLimitExceeded(f"Budget di richieste Spotify esaurito (priorità {level})")
+            time.sleep(wait)
+
+    @staticmethod
+    def _retry_after(error):
+        headers = getattr(error, 'headers', None) or {}
+        try:
+            return float(headers.get('Retry-After', 1))
+        except (TypeError, ValueError):
+            return 1.0
+
+    def _backoff(self, attempt):
+        return random.uniform(0, min(8.0, 0.5 * (2 ** attempt)))
+
+    def call(self, fn, *args, **kwargs):
+        level = _current_priority.get()
+        endpoint = getattr(fn, '__name__', 'unknown')
+        for attempt in range(self.max_retries + 1):
+            self._acquire(level)
+            start = time.perf_counter()
+            try:
+                result = fn(*args, **kwargs)
+            except SpotifyException as e:
+                SPOTIFY_REQUEST_SECONDS.observe(time.perf_counter() - start, endpoint)
+                SPOTIFY_REQUESTS.inc(endpoint, str(e.http_status or 'error'))
+                if attempt == self.max_retries:
+                    raise
+                if e.http_status == 429:
+                    retry_after = self._retry_after(e)
+                    print(f"Rate limit Spotify raggiunto, nuovo tentativo tra {retry_after:.1f}s")
+                    self._block(retry_after + random.uniform(0, 0.5))
+                elif e.http_status and e.http_status >= 500:
+                    time.sleep(self._backoff(attempt))
+                else:
+                    raise
+            except Exception:
+                SPOTIFY_REQUEST_SECONDS.observe(time.perf_counter() - start, endpoint)
+                SPOTIFY_REQUESTS.inc(endpoint, 'error')
+                raise
+            else:
+                SPOTIFY_REQUEST_SECONDS.observe(time.perf_counter() - start, endpoint)
+                SPOTIFY_REQUESTS.inc(endpoint, 'ok')
+                return result
+
+
+class ScheduledSpotify:
+    """Proxy di spotipy.Spotify che instrada ogni metodo pubblico attraverso lo scheduler."""
+    def __init__(self, client, scheduler):
+        self._client = client
+        self._scheduler = scheduler
+
+    @property
+    def _auth(self):
+        return self._client._auth
+
+    def __getattr__(self, name):
+        attr = getattr(self._client, name)
+        if name.startswith('_') or not callable(attr):
+            return attr
+
+        def scheduled(*args, **kwargs):
+            return self._scheduler.call(attr, *args, **kwargs)
+        scheduled.__name__ = name
+        return scheduled
+
+
+_scheduler_instance = None
+_scheduler_lock = threading.Lock()
+
+def get_scheduler():
+    global _scheduler_instance
+    if _scheduler_instance is None:
+        with _scheduler_lock:
+            if _scheduler_instance is None:
+                redis_client = get_redis(Config.REDIS_URL) if Config.SPOTIFY_SHARED_RATE_LIMIT else None
+                _scheduler_instance = SpotifyScheduler(
+                    rate=Config.SPOTIFY_RATE_LIMIT,
+                    capacity=Config.SPOTIFY_RATE_BURST,
+                    background_reserve=Config.SPOTIFY_BACKGROUND_RESERVE,
+                    max_retries=Config.SPOTIFY_MAX_RETRIES,
+                    max_wait=Config.SPOTIFY_MAX_WAIT,
+                    redis_client=redis_client
+                )
+    return _scheduler_instance
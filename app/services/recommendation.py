@@ -1,29 +1,59 @@
 import random
 import datetime
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from app.config import Config
 from app.models.emotion import Emotion
-from app.utils.cache_manager import RecommendationCache
+from app.models.track import tracks_from_spotify
+from app.services.candidate_engine import get_candidate_engine
+from app.services.rate_limiter import BACKGROUND, priority
+from app.services.reference_data import get_reference_data
+from app.services.similarity import features_matrix, score_matrix, top_k_indices
+from app.utils.cache_manager import RecommendationHistory
+from app.utils.concurrency import client_key, get_fan_out
+from app.utils.feature_store import get_feature_store
+from app.utils.metrics import stage_timer, timed
+from app.utils.track_store import get_track_store
+
+# Playlist editoriali usate quando mancano tracce nuove, in ordine di preferenza
+EDITORIAL_PLAYLISTS = [
+    "37i9dQZEVXbMDoHDwVN2tF",  # Top 50 Global
+    "37i9dQZF1DXcBWIGoYBM5M",  # Today's Top Hits
+    "37i9dQZF1DX0XUsuxWHRQd",  # Hot Hits Italia
+    "37i9dQZF1DX4dyzvuaRJ0n",  # Top 50 Italia
+]
+_PLAYLIST_TRACK_FIELDS = 'items(track(id,name,uri,popularity,external_urls,artists(id,name),album(name,images)))'
 
 class RecommendationService:
-    def get_available_genres(self, sp_client):
+    def get_available_genres(self, sp_client=None):
         """
-        Restituisce la lista dei generi disponibili per le raccomandazioni da Spotify.
+        Restituisce la lista dei generi disponibili per le raccomandazioni,
+        letta dai dati di riferimento aggiornati in background.
         """
-        try:
-            genres = sp_client.recommendation_genre_seeds()
-            if isinstance(genres, dict) and 'genres' in genres:
-                return genres['genres']
-            return genres
-        except Exception as e:
-            print(f"Errore nel recupero dei generi disponibili: {e}")
-            return ['pop']
+        return self.reference_data.get('genre_seeds', ['pop'])
+
     def __init__(self, spotify_service, mood_analysis_service):
         self.spotify_service = spotify_service
         self.mood_analysis_service = mood_analysis_service
-        self.cache = RecommendationCache()
+        self.feature_store = get_feature_store()
+        # Catalogo memory-mapped condiviso tra i worker (None se non configurato)
+        self.track_store = get_track_store()
+        self.candidate_engine = get_candidate_engine() if Config.LOCAL_CANDIDATES_ENABLED else None
+        # Senza catalogo locale l'indice si alimenta con le caratteristiche delle tracce viste
+        self._feature_writer = None
+        if self.candidate_engine is not None and not self.candidate_engine.source.static:
+            self._feature_writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix='feature-store')
         self.familiar_proportion = 0.2
-        self.last_cache_reset = datetime.datetime.now()
-        self.cache_expiry_days = 7
-        self.recommended_tracks_cache = set()
+        # Storico per utente delle tracce già consigliate, a memoria fissa per utente
+        self.history = RecommendationHistory(
+            expiry_days=Config.CACHE_EXPIRY_DAYS,
+            buckets=Config.HISTORY_BUCKETS,
+            tracks_per_bucket=Config.HISTORY_TRACKS_PER_BUCKET,
+            false_positive_rate=Config.HISTORY_FALSE_POSITIVE_RATE,
+            max_users=Config.HISTORY_MAX_USERS,
+            redis_url=Config.REDIS_URL if Config.HISTORY_USE_REDIS else None
+        )
         self.mood_to_genres = {
             'joy': ['pop', 'dance', 'happy', 'disco', 'tropical', 'edm', 'funk', 'party'],
             'sadness': ['sad', 'acoustic', 'piano', 'indie', 'folk', 'ambient', 'chill', 'indie-pop'],
@@ -33,7 +63,40 @@ class RecommendationService:
             'surprise': ['electronic', 'experimental', 'alternative', 'new-age', 'jazz', 'fusion', 'world-music'],
             'love': ['pop', 'r-n-b', 'soul', 'jazz', 'acoustic', 'singer-songwriter', 'indie', 'ballad']
         }
-    
+        # Generi seed, intersezione mood→generi e playlist editoriali, tenuti in memoria
+        self.reference_data = get_reference_data()
+        self._register_reference_data()
+
+    def _load_genre_seeds(self):
+        genres = self.spotify_service.sp.recommendation_genre_seeds()
+        if isinstance(genres, dict) and 'genres' in genres:
+            return genres['genres']
+        return genres
+
+    def _load_mood_genres(self):
+        available = self.reference_data.get('genre_seeds')
+        if available is None:
+            raise Exception("Generi seed non ancora disponibili")
+        available = set(available)
+        return {mood: [g for g in genres if g in available] for mood, genres in self.mood_to_genres.items()}
+
+    def _load_editorial_tracks(self):
+        pools = {}
+        for playlist_id in EDITORIAL_PLAYLISTS:
+            try:
+                items = self.spotify_service.sp.playlist_items(playlist_id, fields=_PLAYLIST_TRACK_FIELDS, limit=100)
+                pools[playlist_id] = tracks_from_spotify(item.get('track') for item in items.get('items', []) if item)
+            except Exception as e:
+                print(f"Errore nel recupero della playlist editoriale {playlist_id}: {e}")
+        if not pools:
+            raise Exception("Nessuna playlist editoriale disponibile")
+        return pools
+
+    def _register_reference_data(self):
+        self.reference_data.register('genre_seeds', self._load_genre_seeds, Config.REFERENCE_GENRES_REFRESH_SECONDS)
+        self.reference_data.register('mood_genres', self._load_mood_genres, Config.REFERENCE_GENRES_REFRESH_SECONDS)
+        self.reference_data.register('editorial_tracks', self._load_editorial_tracks, Config.REFERENCE_PLAYLISTS_REFRESH_SECONDS)
+
     def _calculate_audio_features(self, emotion):
         # emotion può essere un oggetto Emotion o un dict
         emotions_dict = emotion.emotions if hasattr(emotion, 'emotions') else emotion
@@ -64,69 +127,38 @@ class RecommendationService:
         features.update(additional_params)
         return features
     
-    def _get_contextual_seeds(self, sp_client, dominant_emotion):
-        if sp_client is None:
-            raise Exception("Client Spotify non autenticato. Completa il flusso OAuth.")
-        
-        #Recent and top tracks combined
-        top_tracks = sp_client.current_user_top_tracks(limit=50)['items']
-        recent_tracks = sp_client.current_user_recently_played(limit=30)
-        recent_track_items = [item['track'] for item in recent_tracks['items']] if 'items' in recent_tracks else []
-        
-        combined_tracks = top_tracks + recent_track_items
-        if not combined_tracks:
-            print("Nessuna traccia trovata per l'utente.")
+    @timed('audio_features')
+    def _get_familiar_features(self, sp_client, familiar_tracks):
+        """Caratteristiche audio delle tracce familiari: dall'archivio locale, scaricando (e salvando) solo le mancanti."""
+        try:
+            return self.feature_store.fetch_audio_features(sp_client, [t.id for t in familiar_tracks])
+        except Exception as e:
+            print(f"Errore nel recupero delle caratteristiche audio: {e}")
+            return {}
+
+    def _rank_by_mood(self, tracks, features, target_features):
+        """Tracce ordinate per similarità al target (punteggio vettoriale); quelle senza caratteristiche in coda."""
+        scored = [t for t in tracks if t.id in features]
+        if not scored:
+            return list(tracks)
+        scores = score_matrix(features_matrix([features[t.id] for t in scored]), target_features)
+        ranked = [scored[i] for i in top_k_indices(scores, len(scored))]
+        return ranked + [t for t in tracks if t.id not in features]
+
+    def _get_contextual_seeds(self, familiar_tracks, familiar_features, dominant_emotion):
+        """Fino a 10 tracce seed scelte tra le 30 familiari più vicine al mood dominante."""
+        valid_tracks = [track for track in familiar_tracks if track.id in familiar_features]
+        if not valid_tracks:
             return []
         
-        unique_tracks = {}
-        for track in combined_tracks:
-            if track.get('id') and track.get('id') not in unique_tracks:
-                unique_tracks[track.get('id')] = track
-        
-        combined_tracks = list(unique_tracks.values())
-        
-        track_ids = [track['id'] for track in combined_tracks if track.get('id')]
-        
-        def batch(lst, n=50):
-            for i in range(0, len(lst), n):
-                yield lst[i:i+n]
-                
-        features_list = []
-        for batch_ids in batch(track_ids, 50):
-            try:
-                batch_features = sp_client.audio_features(batch_ids)
-                if batch_features is not None:
-                    features_list.extend([f for f in batch_features if f])
-            except Exception as e:
-                print(f"Errore nel recupero delle caratteristiche audio per il batch: {e}")
-                for tid in batch_ids:
-                    try:
-                        single_feature = sp_client.audio_features([tid])[0]
-                        if single_feature:
-                            features_list.append(single_feature)
-                    except Exception as e2:
-                        print(f"Errore nel recupero delle caratteristiche audio per il track {tid}: {e2}")
-        
-        id_to_features = {feat['id']: feat for feat in features_list if feat and feat.get('id')}
-        
-        for track in combined_tracks:
-            tid = track.get('id')
-            if tid in id_to_features:
-                track['audio_features'] = id_to_features[tid]
-        
-        valid_tracks = [track for track in combined_tracks if track.get('audio_features') is not None]
-        
         target_features = self.mood_analysis_service.emotion_mapping.get(
             dominant_emotion,
             self.mood_analysis_service.emotion_mapping['joy']  # fallback
         )
         
         #More similar track (30)
-        top_similar = sorted(
-            valid_tracks,
-            key=lambda x: self._track_similarity(x, target_features),
-            reverse=True
-        )[:30]
+        scores = score_matrix(features_matrix([familiar_features[t.id] for t in valid_tracks]), target_features)
+        top_similar = [valid_tracks[i] for i in top_k_indices(scores, 30)]
         
         if len(top_similar) > 10:
             seeds = random.sample(top_similar, 10)
@@ -157,28 +189,8 @@ class RecommendationService:
             
         return similarity
         
-    def _check_cache_expiry(self):
-        now = datetime.datetime.now()
-        days_passed = (now - self.last_cache_reset).days
-        
-        if days_passed >= self.cache_expiry_days:
-            print(f"Reset della cache dopo {days_passed} giorni")
-            self.recommended_tracks_cache = set()
-            self.last_cache_reset = now
-            return True
-        return False
-
-    def _filter_already_recommended(self, tracks):
-        # Reset cache?
-        self._check_cache_expiry()
-        
-        new_tracks = []
-        for track in tracks:
-            track_id = track.get('id')
-            if track_id and track_id not in self.recommended_tracks_cache:
-                new_tracks.append(track)
-                # Add to cache
-                self.recommended_tracks_cache.add(track_id)
+    def _filter_already_recommended(self, tracks, user_id=None):
+        new_tracks = self.history.filter_new(user_id, tracks)
         
         # Non aggiungere tracce già consigliate, restituisci solo nuove se disponibili
         if new_tracks:
@@ -188,87 +200,72 @@ class RecommendationService:
             return self._get_global_popular_tracks()
 
     def _get_global_popular_tracks(self, limit=30):
-        # Prova a prendere la Top 50 globale o playlist famose
-        tracks = []
-        try:
-            # Top 50 Global playlist ufficiale Spotify
-            top50 = self.spotify_service.sp.playlist("37i9dQZEVXbMDoHDwVN2tF")
-            if 'tracks' in top50 and 'items' in top50['tracks']:
-                for item in top50['tracks']['items']:
-                    if item and 'track' in item and item['track']:
-                        tracks.append(item['track'])
-            # Se non bastano, aggiungi da altre playlist famose
-            if len(tracks) < limit:
-                playlist_ids = [
-                    "37i9dQZF1DXcBWIGoYBM5M",  # Today's Top Hits
-                    "37i9dQZF1DX0XUsuxWHRQd",  # Hot Hits Italia
-                    "37i9dQZF1DX4dyzvuaRJ0n",  # Top 50 Italia
-                ]
-                for pid in playlist_ids:
-                    pl = self.spotify_service.sp.playlist(pid)
-                    if 'tracks' in pl and 'items' in pl['tracks']:
-                        for item in pl['tracks']['items']:
-                            if item and 'track' in item and item['track']:
-                                tracks.append(item['track'])
-                            if len(tracks) >= limit:
-                                break
-                    if len(tracks) >= limit:
-                        break
-        except Exception as e:
-            print(f"Errore nel recupero delle playlist globali: {e}")
-        # Rimuovi duplicati
+        # Top 50 globale e playlist famose, dai dati di riferimento in memoria
+        pools = self.reference_data.get('editorial_tracks', {})
         unique = {}
-        for t in tracks:
-            if t.get('id') and t.get('id') not in unique:
-                unique[t['id']] = t
+        for playlist_id in EDITORIAL_PLAYLISTS:
+            for track in pools.get(playlist_id, []):
+                unique.setdefault(track.id, track)
+            if len(unique) >= limit:
+                break
         return list(unique.values())[:limit]
 
+    @timed('familiar_tracks')
     def _get_familiar_tracks(self, sp_client, limit=50):
+        # Stessi dati del recap utente, letti dalla cache del profilo
+        try:
+            user = self.spotify_service.get_user_data(sp_client)
+        except Exception as e:
+            print(f"Errore nel recupero del profilo utente: {e}")
+            return []
+
         familiar_tracks = []
         for time_range in ['short_term', 'medium_term', 'long_term']:
-            try:
-                top = sp_client.current_user_top_tracks(time_range=time_range, limit=30)
-                if top and 'items' in top:
-                    familiar_tracks.extend(top['items'])
-            except Exception as e:
-                print(f"Errore nel recupero delle top tracks ({time_range}): {e}")
+            familiar_tracks.extend(user.top_tracks.get(time_range, {}).get('items', [])[:30])
         
         #recent tracks
-        try:
-            recent = sp_client.current_user_recently_played(limit=30)
-            if recent and 'items' in recent:
-                familiar_tracks.extend([item['track'] for item in recent['items']])
-        except Exception as e:
-            print(f"Errore nel recupero delle tracce recenti: {e}")
+        familiar_tracks.extend([item['track'] for item in user.recently_played.get('items', [])[:30]])
         
         #saved tracks
-        try:
-            saved = sp_client.current_user_saved_tracks(limit=30)
-            if saved and 'items' in saved:
-                familiar_tracks.extend([item['track'] for item in saved['items']])
-        except Exception as e:
-            print(f"Errore nel recupero delle tracce salvate: {e}")
+        familiar_tracks.extend([item['track'] for item in user.saved_tracks.get('items', [])[:30]])
             
         unique_tracks = {}
-        for track in familiar_tracks:
-            if track.get('id') and track.get('id') not in unique_tracks:
-                unique_tracks[track.get('id')] = track
+        for track in tracks_from_spotify(familiar_tracks):
+            unique_tracks.setdefault(track.id, track)
                 
         result = list(unique_tracks.values())
         if len(result) > limit:
             return random.sample(result, limit)
         return result
 
+    @timed('local_candidates')
+    def _get_local_candidates(self, sp_client, audio_features, familiar_tracks, familiar_artist_ids, seed_genres, limit=30):
+        try:
+            exclude = {t.id for t in familiar_tracks}
+            track_ids = self.candidate_engine.recommend(
+                audio_features, k=limit, seed_artists=familiar_artist_ids,
+                seed_genres=seed_genres, exclude=exclude
+            )
+            if not track_ids:
+                return []
+            print(f"Candidati locali trovati: {len(track_ids)}")
+            tracks = []
+            for i in range(0, len(track_ids), 50):
+                result = sp_client.tracks(track_ids[i:i+50])
+                tracks.extend(tracks_from_spotify(result.get('tracks', [])))
+            return tracks
+        except Exception as e:
+            print(f"Errore usando i candidati locali: {e}")
+            return []
+
     def _get_artists_from_tracks(self, tracks):
         artist_ids = set()
         for track in tracks:
-            if 'artists' in track:
-                for artist in track['artists']:
-                    if 'id' in artist:
-                        artist_ids.add(artist['id'])
+            artist_ids.update(track.artist_ids)
         return list(artist_ids)
 
     def _balance_recommendations(self, familiar_tracks, new_tracks, target_count=30):
+        """`familiar_tracks` è ordinata per vicinanza al mood (vedi _rank_by_mood)."""
         familiar_count = int(target_count * self.familiar_proportion)
         new_count = target_count - familiar_count
         
@@ -276,10 +273,10 @@ class RecommendationService:
         
         result = []
         
-        #Adding familiar tracks
+        #Adding familiar tracks, a caso tra le più vicine al mood
         if familiar_tracks:
             if len(familiar_tracks) > familiar_count:
-                result.extend(random.sample(familiar_tracks, familiar_count))
+                result.extend(random.sample(familiar_tracks[:familiar_count * 2], familiar_count))
             else:
                 result.extend(familiar_tracks)
                 
@@ -295,12 +292,13 @@ class RecommendationService:
             extra_familiar = []
             extra_new = []
             
+            used_ids = {t.id for t in result}
             if len(familiar_tracks) > len(result):
-                remaining_familiar = [t for t in familiar_tracks if t not in result]
+                remaining_familiar = [t for t in familiar_tracks if t.id not in used_ids]
                 extra_familiar = random.sample(remaining_familiar, min(remaining, len(remaining_familiar)))
                 
             if len(extra_familiar) < remaining and len(new_tracks) > 0:
-                remaining_new = [t for t in new_tracks if t not in result]
+                remaining_new = [t for t in new_tracks if t.id not in used_ids]
                 extra_new = random.sample(remaining_new, min(remaining - len(extra_familiar), len(remaining_new)))
                 
             result.extend(extra_familiar + extra_new)
@@ -308,35 +306,43 @@ class RecommendationService:
         random.shuffle(result)
         return result[:target_count]
 
-    def get_mood_recommendations(self, sp_client, user_input):
+    def get_mood_recommendations(self, sp_client, user_input, emotion=None):
+        for event, payload in self.iter_mood_recommendations(sp_client, user_input, emotion):
+            if event == 'final':
+                return payload
+
+    def iter_mood_recommendations(self, sp_client, user_input, emotion=None):
+        """
+        Come get_mood_recommendations, ma produce i risultati intermedi appena pronti:
+        ('analysis', emozioni), ('familiar', tracce), ('batch', {'strategy', 'tracks'}), ('final', tracce).
+        """
         if sp_client is None:
             raise Exception("Client Spotify non autenticato. Completa il flusso OAuth.")
             
-        emotions_dict = self.mood_analysis_service.analyze_text(user_input)
-        print(f"Emozioni rilevate: {emotions_dict}")
-        emotion = Emotion(emotions_dict)
+        # L'analisi può essere già stata eseguita dal chiamante
+        if emotion is None:
+            emotion = self.mood_analysis_service.analyze_text(user_input)
+        if not isinstance(emotion, Emotion):
+            emotion = Emotion(emotion)
+        print(f"Emozioni rilevate: {emotion.emotions}")
+        yield 'analysis', emotion.emotions
         audio_features = self._calculate_audio_features(emotion.emotions)
         dominant_emotion = emotion.dominant_emotion
-        mood_to_genres = {
-            'joy': ['pop', 'dance', 'happy', 'disco', 'tropical', 'edm', 'funk', 'party'],
-            'sadness': ['sad', 'acoustic', 'piano', 'indie', 'folk', 'ambient', 'chill', 'indie-pop'],
-            'anger': ['rock', 'metal', 'intense', 'punk', 'hardcore', 'grunge', 'alt-rock', 'industrial'],
-            'fear': ['ambient', 'instrumental', 'classical', 'cinematic', 'soundtracks', 'atmospheric'],
-            'optimism': ['pop', 'indie', 'piano','upbeat', 'folk', 'gospel', 'soul', 'indie-pop', 'alt-rock'],
-            'surprise': ['electronic', 'experimental', 'alternative', 'new-age', 'jazz', 'fusion', 'world-music'],
-            'love': ['pop', 'r-n-b', 'soul', 'jazz', 'acoustic', 'singer-songwriter', 'indie', 'ballad']
-        }
         
         familiar_tracks = self._get_familiar_tracks(sp_client)
+        yield 'familiar', familiar_tracks
         familiar_artist_ids = self._get_artists_from_tracks(familiar_tracks)
+        familiar_features = self._get_familiar_features(sp_client, familiar_tracks)
         
         target_new_tracks = int(30 * (1.0 - self.familiar_proportion))
         
-        available_genres = self.get_available_genres(sp_client)
-        
-        # dominant_emotion è una stringa, mood_to_genres è un dict
-        preferred_genres = mood_to_genres.get(str(dominant_emotion).lower(), ['pop'])
-        seed_genres = [genre for genre in preferred_genres if genre in available_genres]
+        # Intersezione precalcolata con i generi seed; finché non è pronta si usano i generi preferiti
+        mood = str(dominant_emotion).lower()
+        mood_genres = self.reference_data.get('mood_genres')
+        if mood_genres is not None:
+            seed_genres = list(mood_genres.get(mood, []))
+        else:
+            seed_genres = list(self.mood_to_genres.get(mood, ['pop']))
 
         if len(seed_genres) > 1:
             seed_count = random.randint(1, min(2, len(seed_genres)))
@@ -345,40 +351,56 @@ class RecommendationService:
         print(f"Usando i generi seed: {seed_genres}")
         new_recommendations = []
         
-        if familiar_artist_ids:
+        # Candidati dall'indice locale, prima delle chiamate remote
+        if self.candidate_engine is not None:
+            batch = self._get_local_candidates(
+                sp_client, audio_features, familiar_tracks, familiar_artist_ids, seed_genres
+            )
+            new_recommendations.extend(batch)
+            if batch:
+                yield 'batch', {'strategy': 'local', 'tracks': batch}
+        
+        if len(new_recommendations) < target_new_tracks and familiar_artist_ids:
             try:
                 seed_artists = random.sample(familiar_artist_ids, min(3, len(familiar_artist_ids)))
                 print(f"Usando artisti familiari come seed: {seed_artists}")
                 
-                recs = sp_client.recommendations(
-                    seed_artists=seed_artists,
-                    seed_genres=seed_genres[:1] if seed_genres else [],
-                    limit=30,
-                    **audio_features
-                )
+                with stage_timer('strategy_seed_artists'):
+                    recs = sp_client.recommendations(
+                        seed_artists=seed_artists,
+                        seed_genres=seed_genres[:1] if seed_genres else [],
+                        limit=30,
+                        **audio_features
+                    )
                 
                 if recs and 'tracks' in recs:
-                    new_recommendations.extend(recs['tracks'])
+                    batch = tracks_from_spotify(recs['tracks'])
+                    new_recommendations.extend(batch)
+                    yield 'batch', {'strategy': 'seed_artists', 'tracks': batch}
             except Exception as e:
                 print(f"Errore usando seed_artists: {e}")
         
         #Second strategy
         if len(new_recommendations) < target_new_tracks and familiar_tracks:
             try:
-                seed_tracks = random.sample([t['id'] for t in familiar_tracks if 'id' in t], 
-                                           min(2, len(familiar_tracks)))
+                # Le tracce familiari più vicine al mood, a caso se mancano le caratteristiche audio
+                candidates = self._get_contextual_seeds(familiar_tracks, familiar_features, mood) or familiar_tracks
+                seed_tracks = random.sample([t.id for t in candidates], min(2, len(candidates)))
                 
                 print(f"Usando tracce familiari come seed: {seed_tracks}")
                 
-                recs = sp_client.recommendations(
-                    seed_tracks=seed_tracks,
-                    seed_genres=seed_genres[:1] if seed_genres else [],
-                    limit=30,
-                    **audio_features
-                )
+                with stage_timer('strategy_seed_tracks'):
+                    recs = sp_client.recommendations(
+                        seed_tracks=seed_tracks,
+                        seed_genres=seed_genres[:1] if seed_genres else [],
+                        limit=30,
+                        **audio_features
+                    )
                 
                 if recs and 'tracks' in recs:
-                    new_recommendations.extend(recs['tracks'])
+                    batch = tracks_from_spotify(recs['tracks'])
+                    new_recommendations.extend(batch)
+                    yield 'batch', {'strategy': 'seed_tracks', 'tracks': batch}
             except Exception as e:
                 print(f"Errore usando seed_tracks: {e}")
         
@@ -387,44 +409,69 @@ class RecommendationService:
             try:
                 print(f"Usando solo generi come seed: {seed_genres}")
                 
-                recs = sp_client.recommendations(
-                    seed_genres=seed_genres[:3],
-                    limit=30,
-                    **audio_features
-                )
+                with stage_timer('strategy_seed_genres'):
+                    recs = sp_client.recommendations(
+                        seed_genres=seed_genres[:3],
+                        limit=30,
+                        **audio_features
+                    )
                 
                 if recs and 'tracks' in recs:
-                    new_recommendations.extend(recs['tracks'])
+                    batch = tracks_from_spotify(recs['tracks'])
+                    new_recommendations.extend(batch)
+                    yield 'batch', {'strategy': 'seed_genres', 'tracks': batch}
             except Exception as e:
                 print(f"Errore usando seed_genres: {e}")
         
         unique_new_tracks = {}
         for track in new_recommendations:
-            if track.get('id') and track.get('id') not in unique_new_tracks:
-                unique_new_tracks[track.get('id')] = track
+            unique_new_tracks.setdefault(track.id, track)
         
         new_recommendations = list(unique_new_tracks.values())
         
-        filtered_new = self._filter_already_recommended(new_recommendations)
-        final_recommendations = self._balance_recommendations(familiar_tracks, filtered_new)
+        user_id = self.spotify_service.get_user_id(sp_client)
+        filtered_new = self._filter_already_recommended(new_recommendations, user_id)
+        with stage_timer('rank_familiar'):
+            ranked_familiar = self._rank_by_mood(familiar_tracks, familiar_features, audio_features)
+        final_recommendations = self._balance_recommendations(ranked_familiar, filtered_new)
+        # Quelle delle tracce familiari sono già state lette (e salvate) da _get_familiar_features
+        self._record_audio_features(sp_client, new_recommendations)
         
         if final_recommendations:
-            return final_recommendations
+            yield 'final', final_recommendations
+            return
         
 
         if familiar_tracks:
             print("Usando solo tracce familiari come fallback")
-            return familiar_tracks[:min(30, len(familiar_tracks))]
+            yield 'final', familiar_tracks[:min(30, len(familiar_tracks))]
+            return
         elif new_recommendations:
             print("Usando solo nuove raccomandazioni come fallback")
-            return new_recommendations[:min(30, len(new_recommendations))]
+            yield 'final', new_recommendations[:min(30, len(new_recommendations))]
+            return
         else:
             print("Usando il metodo fallback per ottenere tracce da playlist pubbliche")
             fallback_tracks = self.get_fallback_tracks(sp_client, dominant_emotion)
             if fallback_tracks:
-                return fallback_tracks
+                yield 'final', fallback_tracks
+                return
         raise Exception("Impossibile ottenere raccomandazioni dopo molteplici tentativi")
     
+    def _record_audio_features(self, sp_client, tracks):
+        """Salva in background le caratteristiche audio mancanti, per l'indice dei candidati locali."""
+        if self._feature_writer is None or not tracks:
+            return
+        track_ids = [t.id for t in tracks]
+        self._feature_writer.submit(self._fetch_audio_features_quietly, sp_client, track_ids)
+
+    def _fetch_audio_features_quietly(self, sp_client, track_ids):
+        try:
+            with priority(BACKGROUND):
+                self.feature_store.fetch_audio_features(sp_client, track_ids)
+        except Exception as e:
+            print(f"Errore nel salvataggio delle caratteristiche audio: {e}")
+
     def _get_audio_features_with_retry(self, sp_client, track_ids, max_retries=3):
         for attempt in range(max_retries):
             try:
@@ -435,11 +482,14 @@ class RecommendationService:
                     return []
                 datetime.time.sleep(1)
     
-    def create_mood_playlist(self, sp_client, playlist_name, track_ids):
+    @timed('create_playlist')
+    def create_mood_playlist(self, sp_client, playlist_name, track_ids, user_id=None, progress=None):
         if sp_client is None:
             raise Exception("Client Spotify non autenticato. Completa il flusso OAuth.")
             
-        user_id = sp_client.current_user()['id']
+        # L'ID utente arriva dalla cache del profilo: niente current_user() aggiuntivo
+        if user_id is None:
+            user_id = self.spotify_service.get_user_id(sp_client) or sp_client.current_user()['id']
         
         timestamp = datetime.datetime.now().strftime("%d-%m %H:%M")
         playlist_name = f"{playlist_name} [{timestamp}]"
@@ -453,10 +503,84 @@ class RecommendationService:
         
         if track_ids:
             chunks = [track_ids[i:i+100] for i in range(0, len(track_ids), 100)]
+            added = 0
             for chunk in chunks:
                 sp_client.playlist_add_items(playlist['id'], chunk)
+                added += len(chunk)
+                if progress is not None:
+                    progress(added)
         return playlist['external_urls']['spotify']
     
+    def _crawl_playlists(self, sp_client, search_terms, target=20):
+        """
+        Cerca playlist per i termini dati e ne legge una porzione, con al massimo
+        FALLBACK_CONCURRENCY chiamate in volo (e non più del limite per utente del fan-out).
+        Si ferma appena raccolte `target` tracce uniche o allo scadere di FALLBACK_TIME_BUDGET secondi.
+        """
+        fan_out = get_fan_out()
+        user_key = client_key(sp_client)
+        deadline = time.monotonic() + Config.FALLBACK_TIME_BUDGET
+        # Oltre il limite per utente, submit() bloccherebbe questo thread in attesa di un posto
+        max_in_flight = min(Config.FALLBACK_CONCURRENCY, fan_out.per_user_limit)
+        queue = deque(('search', term) for term in search_terms)
+        running = {}
+        collected = {}
+
+        def launch(task):
+            kind, arg = task
+            if kind == 'search':
+                print(f"Ricerca playlist con termine: {arg}")
+                fn, kwargs = sp_client.search, {'q': arg, 'type': 'playlist', 'limit': 20}
+            else:
+                playlist_id, offset = arg
+                fn = sp_client.playlist_items
+                kwargs = {'playlist_id': playlist_id, 'fields': _PLAYLIST_TRACK_FIELDS, 'limit': 15, 'offset': offset}
+            # Altre chiamate dello stesso utente possono occupare i posti: l'attesa non supera la scadenza
+            return fan_out.submit(fn, kwargs, user_key, timeout=max(0.0, deadline - time.monotonic()))
+
+        try:
+            while (queue or running) and len(collected) < target:
+                while queue and len(running) < max_in_flight:
+                    task = queue.popleft()
+                    try:
+                        running[launch(task)] = task
+                    except TimeoutError:
+                        # Scadenza raggiunta in attesa di un posto: il controllo sotto chiude il ciclo
+                        break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    print(f"Tempo esaurito per il fallback: {len(collected)} tracce raccolte")
+                    break
+                done, _ = wait(running, timeout=remaining, return_when=FIRST_COMPLETED)
+                for future in done:
+                    kind, arg = running.pop(future)
+                    try:
+                        result = future.result()
+                    except Exception as e:
+                        print(f"Errore durante il fallback ({kind} {arg}): {e}")
+                        continue
+                    if kind == 'search':
+                        playlists = [p for p in (result or {}).get('playlists', {}).get('items', []) if p]
+                        if not playlists:
+                            print(f"Nessuna playlist trovata per il termine: {arg}")
+                            continue
+                        #Less playlist to see
+                        for playlist in random.sample(playlists, min(10, len(playlists))):
+                            # Il totale è già nel risultato della ricerca: niente chiamata playlist()
+                            total_tracks = (playlist.get('tracks') or {}).get('total') or 0
+                            offset = random.randint(0, min(total_tracks - 15, 30)) if total_tracks > 30 else 0
+                            queue.append(('playlist', (playlist['id'], offset)))
+                    else:
+                        items = (result or {}).get('items', [])
+                        for track in tracks_from_spotify(item.get('track') for item in items if item):
+                            collected.setdefault(track.id, track)
+        finally:
+            # Le chiamate non ancora partite vengono annullate, quelle in corso ignorate
+            for future in running:
+                future.cancel()
+        return collected
+
+    @timed('fallback')
     def get_fallback_tracks(self, sp_client, mood):
         mood_to_search = {
             'joy': ['happy', 'joy', 'festa', 'felicità', 'upbeat', 'dance', 'celebration', 'energetic', 'cheerful', 'ecstatic'],
@@ -473,71 +597,16 @@ class RecommendationService:
         if len(search_terms) > 3:
             search_terms = random.sample(search_terms, random.randint(2, 3))
         
-        all_tracks = []
-        
-        
         familiar_tracks = self._get_familiar_tracks(sp_client, 15)
         
-        for term in search_terms:
-            try:
-                print(f"Ricerca playlist con termine: {term}")
-                playlist_results = sp_client.search(q=term, type='playlist', limit=20)  #50 --> 20
-                
-                if not playlist_results or 'playlists' not in playlist_results or 'items' not in playlist_results['playlists']:
-                    print(f"Nessuna playlist trovata per il termine: {term}")
-                    continue
-                
-                playlists = playlist_results['playlists']['items']
-                if not playlists:
-                    continue
-            
-                #Less playlist to see
-                selected_playlists = random.sample(playlists, min(10, len(playlists)))
-                
-                for random_playlist in selected_playlists:
-                    playlist_id = random_playlist['id']
-                    
-                    print(f"Usando playlist: {random_playlist['name']} (ID: {playlist_id})")
-                    
-                    playlist_info = sp_client.playlist(playlist_id)
-                    if 'tracks' in playlist_info and 'total' in playlist_info['tracks']:
-                        total_tracks = playlist_info['tracks']['total']
-                        if total_tracks > 30:
-                            offset = random.randint(0, min(total_tracks - 15, 30))
-                        else:
-                            offset = 0
-                    else:
-                        offset = 0
-                    
-                    playlist_tracks = sp_client.playlist_tracks(playlist_id, limit=15, offset=offset)
-                    
-                    if not playlist_tracks or 'items' not in playlist_tracks:
-                        continue
-                        
-                    for item in playlist_tracks['items']:
-                        if item and 'track' in item and item['track']:
-                            all_tracks.append(item['track'])
-                
-                if len(all_tracks) >= 20:
-                    break
-            except Exception as e:
-                print(f"Errore durante la ricerca con il termine '{term}': {e}")
+        unique_fallback = self._crawl_playlists(sp_client, search_terms, target=20)
         
-        if not all_tracks:
+        if not unique_fallback:
             print("Nessuna traccia trovata tramite il metodo fallback, utilizzando tracce familiari.")
             return familiar_tracks
         
-        unique_fallback = {}
-        for track in all_tracks:
-            if track.get('id') and track.get('id') not in unique_fallback:
-                unique_fallback[track.get('id')] = track
+        if len(unique_fallback) < 20:
+            for track in familiar_tracks:
+                unique_fallback.setdefault(track.id, track)
         fallback_list = list(unique_fallback.values())
-        
-        if len(fallback_list) < 20:
-            fallback_list.extend(familiar_tracks)
-            unique_fallback = {}
-            for track in fallback_list:
-                if track.get('id') and track.get('id') not in unique_fallback:
-                    unique_fallback[track.get('id')] = track
-            fallback_list = list(unique_fallback.values())
         return fallback_list[:30]
\ No newline at end of file
@@ -0,0 +1,133 @@
+import threading
+import time
+
+from app.config import Config
+from app.services.rate_limiter import BACKGROUND, priority
+from app.utils.metrics import REGISTRY
+
+
+class ReferenceDataCache:
+    """
+    Dati di riferimento quasi statici (generi seed, playlist editoriali, ...) tenuti
+    in memoria da un thread in background: le richieste leggono solo la memoria.
+    Un refresh fallito mantiene il valore precedente e viene ritentato dopo `retry_seconds`.
+    """
+    def __init__(self, tick_seconds=5, retry_seconds=60):
+        self.tick_seconds = tick_seconds
+        self.retry_seconds = retry_seconds
+        self._datasets = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def register(self, name, loader, interval, default=None):
+        """I dataset vengono aggiornati nell'ordine di registrazione: un loader può leggere i precedenti."""
+        with self._lock:
+            self._datasets[name] = {
+                'loader': loader,
+                'interval': interval,
+                'value': default,
+                'loaded_at': None,
+                'attempted_at': None,
+                'refreshes': 0,
+                'failures': 0,
+                'last_error': None
+            }
+
+    def get(self, name, default=None):
+        dataset = self._datasets.get(name)
+        if dataset is None or dataset['loaded_at'] is None:
+            return default
+        return dataset['value']
+
+    def refresh(self, name):
+        dataset = self._datasets[name]
+        dataset['attempted_at'] = time.time()
+        try:
+            with priority(BACKGROUND):
+                value = dataset['loader']()
+        except Exception as e:
+            dataset['failures'] += 1
+            dataset['last_error'] = str(e)
+            print(f"Errore nell'aggiornamento dei dati di riferimento '{name}': {e}")
+            return False
+        with self._lock:
+            dataset['value'] = value
+            dataset['loaded_at'] = time.time()
+            dataset['refreshes'] += 1
+            dataset['last_error'] = None
+        return True
+
+    def _due(self, dataset, now):
+        if dataset['attempted_at'] is None:
+            return True
+        if dataset['loaded_at'] is None or dataset['last_error'] is not None:
+            return now - dataset['attempted_at'] >= self.retry_seconds
+        return now - dataset['loaded_at'] >= dataset['interval']
+
+    def refresh_due(self):
+        now = time.time()
+        for name in list(self._datasets):
+            if self._due(self._datasets[name], now):
+                self.refresh(name)
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self.refresh_due()
+            except Exception as e:
+                print(f"Errore nello scheduler dei dati di riferimento: {e}")
+            self._stop.wait(self.tick_seconds)
+
+    def start(self):
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name='reference-data-refresh', daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def metrics(self):
+        """Età (secondi dall'ultimo refresh riuscito) e contatori per dataset."""
+        now = time.time()
+        with self._lock:
+            return {
+                name: {
+                    'age_seconds': round(now - d['loaded_at'], 1) if d['loaded_at'] is not None else None,
+                    'interval_seconds': d['interval'],
+                    'refreshes': d['refreshes'],
+                    'failures': d['failures'],
+                    'last_error': d['last_error']
+                }
+                for name, d in self._datasets.items()
+            }
+
+
+_reference_data_instance = None
+_reference_data_lock = threading.Lock()
+
+def get_reference_data():
+    global _reference_data_instance
+    if _reference_data_instance is None:
+        with _reference_data_lock:
+            if _reference_data_instance is None:
+                _reference_data_instance = ReferenceDataCache(retry_seconds=Config.REFERENCE_RETRY_SECONDS)
+    return _reference_data_instance
+
+
+def _collect_reference_data():
+    metrics = get_reference_data().metrics()
+    return [
+        ('moodmusic_reference_data_age_seconds', 'gauge', "Secondi dall'ultimo aggiornamento riuscito",
+         [({'dataset': name}, m['age_seconds']) for name, m in metrics.items() if m['age_seconds'] is not None]),
+        ('moodmusic_reference_data_refreshes_total', 'counter', 'Aggiornamenti riusciti',
+         [({'dataset': name}, m['refreshes']) for name, m in metrics.items()]),
+        ('moodmusic_reference_data_failures_total', 'counter', 'Aggiornamenti falliti',
+         [({'dataset': name}, m['failures']) for name, m in metrics.items()])
+    ]
+
+
+REGISTRY.register_collector(_collect_reference_data)
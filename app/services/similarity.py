@@ -0,0 +1,56 @@
+import numpy as np
+
+# Colonne usate dal punteggio di similarità, con i valori di default di _track_similarity
+SIMILARITY_FEATURES = ('valence', 'energy', 'danceability', 'acousticness', 'tempo')
+FEATURE_DEFAULTS = np.array([0.5, 0.5, 0.5, 0.5, 120.0], dtype=np.float32)
+TEMPO_INDEX = SIMILARITY_FEATURES.index('tempo')
+TEMPO_SCALE = 100.0
+
+
+def features_matrix(feature_dicts):
+    """Impacchetta una lista di dict di caratteristiche audio in una matrice float32 (NaN se mancante)."""
+    matrix = np.empty((len(feature_dicts), len(SIMILARITY_FEATURES)), dtype=np.float32)
+    # Riempimento per colonna: None e chiavi assenti diventano NaN nella conversione
+    for j, col in enumerate(SIMILARITY_FEATURES):
+        matrix[:, j] = np.array([feat.get(col) for feat in feature_dicts], dtype=np.float32)
+    return matrix
+
+
+def target_vector(target_features):
+    """Vettore obiettivo, pesi (1 per le caratteristiche presenti) e numero di parametri target."""
+    target = np.zeros(len(SIMILARITY_FEATURES), dtype=np.float32)
+    weights = np.zeros(len(SIMILARITY_FEATURES), dtype=np.float32)
+    for i, col in enumerate(SIMILARITY_FEATURES):
+        value = target_features.get(f'target_{col}')
+        if value is not None:
+            target[i] = value
+            weights[i] = 1.0
+    num_features = sum(1 for f in target_features if f.startswith('target_'))
+    return target, weights, num_features
+
+
+def score_matrix(matrix, target_features):
+    """
+    Similarità di ogni riga rispetto al target, equivalente vettoriale di
+    RecommendationService._track_similarity (tempo normalizzato su 100 BPM).
+    """
+    target, weights, num_features = target_vector(target_features)
+    values = np.where(np.isnan(matrix), FEATURE_DEFAULTS, matrix)
+    diff = np.abs(values - target)
+    diff[:, TEMPO_INDEX] = np.minimum(1.0, diff[:, TEMPO_INDEX] / TEMPO_SCALE)
+    scores = (1.0 - diff) @ weights
+    if num_features > 0:
+        scores /= num_features
+    return scores
+
+
+def top_k_indices(scores, k):
+    """Indici dei k punteggi migliori in ordine decrescente, senza ordinare l'intero array."""
+    n = len(scores)
+    if k <= 0 or n == 0:
+        return np.empty(0, dtype=np.int64)
+    if k < n:
+        candidates = np.argpartition(-scores, k - 1)[:k]
+    else:
+        candidates = np.arange(n)
+    return candidates[np.argsort(-scores[candidates], kind='stable')]
@@ -0,0 +1,92 @@
+import threading
+import time
+from collections import OrderedDict
+
+import requests
+import spotipy
+from urllib3.util.retry import Retry
+from app.config import Config
+from app.services.rate_limiter import ScheduledSpotify, get_scheduler
+
+
+class SpotifyClientPool:
+    """
+    Condivide un'unica requests.Session (connessioni keep-alive) tra tutti i
+    client Spotify e mantiene una piccola cache LRU di client per token.
+    """
+    def __init__(self, pool_connections=4, pool_maxsize=32, timeout=10, max_clients=256,
+                 client_ttl=300, api_prefix=None, retries=3, scheduler=None):
+        self.timeout = timeout
+        self.max_clients = max_clients
+        self.client_ttl = client_ttl
+        self.api_prefix = api_prefix
+        self.scheduler = scheduler
+        self.session = requests.Session()
+        # Solo errori di connessione: 429 e 5xx arrivano allo scheduler con i loro header
+        retry = Retry(
+            total=retries,
+            connect=None,
+            read=False,
+            allowed_methods=frozenset(['GET', 'POST', 'PUT', 'DELETE']),
+            status=0,
+            backoff_factor=0.3,
+            status_forcelist=()
+        )
+        adapter = requests.adapters.HTTPAdapter(
+            pool_connections=pool_connections,
+            pool_maxsize=pool_maxsize,
+            max_retries=retry
+        )
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self._clients = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _build(self, **kwargs):
+        client = spotipy.Spotify(requests_session=self.session, requests_timeout=self.timeout, **kwargs)
+        if self.api_prefix:
+            client.prefix = self.api_prefix
+        if self.scheduler is not None:
+            return ScheduledSpotify(client, self.scheduler)
+        return client
+
+    def client_for_token(self, access_token):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._clients.get(access_token)
+            if entry is not None and entry[0] > now:
+                self._clients.move_to_end(access_token)
+                return entry[1]
+            client = self._build(auth=access_token)
+            self._clients[access_token] = (now + self.client_ttl, client)
+            self._clients.move_to_end(access_token)
+            while len(self._clients) > self.max_clients:
+                self._clients.popitem(last=False)
+            return client
+
+    def client_credentials_client(self, client_credentials_manager):
+        return self._build(client_credentials_manager=client_credentials_manager)
+
+    def evict(self, access_token):
+        with self._lock:
+            self._clients.pop(access_token, None)
+
+
+_pool_instance = None
+_pool_lock = threading.Lock()
+
+def get_client_pool():
+    global _pool_instance
+    if _pool_instance is None:
+        with _pool_lock:
+            if _pool_instance is None:
+                _pool_instance = SpotifyClientPool(
+                    pool_connections=Config.SPOTIFY_POOL_CONNECTIONS,
+                    pool_maxsize=Config.SPOTIFY_POOL_MAXSIZE,
+                    timeout=Config.SPOTIFY_REQUEST_TIMEOUT,
+                    max_clients=Config.SPOTIFY_CLIENT_CACHE_SIZE,
+                    client_ttl=Config.SPOTIFY_CLIENT_TTL,
+                    api_prefix=Config.SPOTIFY_API_PREFIX,
+                    scheduler=get_scheduler()
+                )
+    return _pool_instance
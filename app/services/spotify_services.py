@@ -1,7 +1,11 @@
-import spotipy
+import uuid
+
+from spotipy.cache_handler import MemoryCacheHandler
 from spotipy.oauth2 import SpotifyClientCredentials, SpotifyOAuth
 from app.config import Config
-from app.models.user import User
+from app.services.profile_cache import get_profile_cache
+from app.services.spotify_client_pool import get_client_pool
+from app.services.token_store import SessionCacheHandler, get_token_store
 
 
 def get_auth_url():
@@ -12,40 +16,29 @@ def get_auth_url():
     return sp_oauth.get_authorize_url()
 
 def process_callback(code):
+    """Scambia il codice con un token salvato nel TokenStore; restituisce la chiave di sessione."""
     global _spotify_service_instance
     if _spotify_service_instance is None:
         _spotify_service_instance = SpotifyService()
-    sp_oauth = _spotify_service_instance.get_oauth_client()
+    session_key = uuid.uuid4().hex
+    sp_oauth = _spotify_service_instance.get_oauth_client(session_key)
     try:
-        token_info = sp_oauth.get_access_token(code)
+        token_info = sp_oauth.get_access_token(code, check_cache=False)
         if token_info:
-            return {'success': True, 'token_info': token_info}
+            return {'success': True, 'session_key': session_key}
         else:
             return {'success': False, 'error': 'Token non ottenuto'}
     except Exception as e:
         return {'success': False, 'error': str(e)}
 
 
-class SpotifyService:
-    def __init__(self):
-        self.client_id = Config.SPOTIFY_CLIENT_ID
-        self.client_secret = Config.SPOTIFY_CLIENT_SECRET
-        self.redirect_uri = Config.SPOTIFY_REDIRECT_URI
-        
-        self.sp = spotipy.Spotify(
-            client_credentials_manager=SpotifyClientCredentials(
-                client_id=self.client_id,
-                client_secret=self.client_secret
-            ),
-            requests_timeout=20
-        )
 _spotify_service_instance = None
 
-def get_spotify_client():
+def get_spotify_client(session_key):
     global _spotify_service_instance
     if _spotify_service_instance is None:
         _spotify_service_instance = SpotifyService()
-    return _spotify_service_instance.authenticate_user()
+    return _spotify_service_instance.authenticate_user(session_key)
 
 
 class SpotifyService:
@@ -53,15 +46,34 @@ class SpotifyService:
         self.client_id = Config.SPOTIFY_CLIENT_ID
         self.client_secret = Config.SPOTIFY_CLIENT_SECRET
         self.redirect_uri = Config.SPOTIFY_REDIRECT_URI
-        self.sp = spotipy.Spotify(
-            client_credentials_manager=SpotifyClientCredentials(
+        self.sp = get_client_pool().client_credentials_client(
+            SpotifyClientCredentials(
                 client_id=self.client_id,
-                client_secret=self.client_secret
-            ),
-            requests_timeout=20
+                client_secret=self.client_secret,
+                requests_session=get_client_pool().session,
+                cache_handler=MemoryCacheHandler()
+            )
         )
+        self._oauth_client = None
+        self.tokens = get_token_store(self._refresh_token)
+
+    def get_oauth_client(self, session_key=None):
+        """
+        Senza chiave restituisce il client condiviso (solo per l'URL di autorizzazione);
+        con una chiave, un client i cui token vengono letti e scritti nel TokenStore.
+        """
+        if session_key is not None:
+            return self._build_oauth_client(SessionCacheHandler(self.tokens, session_key))
+        # Il client OAuth è riutilizzato e condivide la sessione HTTP del pool
+        if self._oauth_client is None:
+            self._oauth_client = self._build_oauth_client(MemoryCacheHandler())
+        return self._oauth_client
 
-    def get_oauth_client(self):
+    def _refresh_token(self, token_info):
+        # Client usa e getta: il MemoryCacheHandler del client condiviso terrebbe il token dell'ultimo utente
+        return self._build_oauth_client(MemoryCacheHandler()).refresh_access_token(token_info['refresh_token'])
+
+    def _build_oauth_client(self, cache_handler):
         return SpotifyOAuth(
             client_id=self.client_id,
             client_secret=self.client_secret,
@@ -74,35 +86,32 @@ class SpotifyService:
                 'playlist-modify-private',
                 'playlist-modify-public'
             ]),
-            cache_path=".spotify_cache",
-            show_dialog=True
+            cache_handler=cache_handler,
+            show_dialog=True,
+            requests_session=get_client_pool().session
         )
 
-    def authenticate_user(self):
-        sp_oauth = self.get_oauth_client()
-        token_info = sp_oauth.get_cached_token()
-        if not token_info or sp_oauth.is_token_expired(token_info):
+    def authenticate_user(self, session_key):
+        token_info = self.tokens.get(session_key)
+        if not token_info:
             return None
-        else:
-            return spotipy.Spotify(auth=token_info['access_token'])
+        if SpotifyOAuth.is_token_expired(token_info):
+            # Di norma il refresh avviene in background; qui solo se il worker era fermo
+            token_info = self.tokens.refresh(session_key)
+            if not token_info or SpotifyOAuth.is_token_expired(token_info):
+                return None
+        return get_client_pool().client_for_token(token_info['access_token'])
 
     def get_user_data(self, sp_user):
-        user_profile = sp_user.current_user()
-        user = User(user_profile)
-        user.top_tracks = {
-            'short_term': sp_user.current_user_top_tracks(time_range='short_term', limit=20),
-            'medium_term': sp_user.current_user_top_tracks(time_range='medium_term', limit=30),
-            'long_term': sp_user.current_user_top_tracks(time_range='long_term', limit=40)
-        }
-        user.top_artists = {
-            'short_term': sp_user.current_user_top_artists(time_range='short_term', limit=20),
-            'medium_term': sp_user.current_user_top_artists(time_range='medium_term', limit=30),
-            'long_term': sp_user.current_user_top_artists(time_range='long_term', limit=40)
-        }
-        user.recently_played = sp_user.current_user_recently_played(limit=30)
-        import pandas as pd
-        genres = []
-        for artist in user.top_artists['medium_term']['items']:
-            genres.extend(artist['genres'])
-        user.top_genres = pd.Series(genres).value_counts().to_dict()
-        return user
\ No newline at end of file
+        # Dati condivisi con le raccomandazioni tramite la cache del profilo
+        return get_profile_cache().get_user(sp_user)
+
+    def get_user_id(self, sp_user):
+        try:
+            return get_profile_cache().get_profile(sp_user).get('id')
+        except Exception as e:
+            print(f"Errore nel recupero dell'ID utente: {e}")
+            return None
+
+    def invalidate_user_data(self, user_id, sources=None):
+        get_profile_cache().invalidate(user_id, sources)
@@ -0,0 +1,199 @@
+import json
+import threading
+import time
+from collections import OrderedDict
+
+from spotipy.cache_handler import CacheHandler
+
+from app.config import Config
+from app.utils.host_store import get_host_store
+from app.utils.prefork import start_background
+from app.utils.redis_client import get_redis
+
+
+class TokenStore:
+    """
+    Token OAuth degli utenti, indicizzati per chiave di sessione e tenuti in memoria,
+    condivisi tra i worker tramite Redis oppure, senza Redis, tramite `host_store` (vedi HostStore).
+    Un thread in background rinnova i token `refresh_margin` secondi prima della scadenza,
+    così nessuna richiesta attende il refresh.
+    Le sessioni inattive da più di `idle_seconds` non vengono più rinnovate.
+    """
+    def __init__(self, refresher, refresh_margin=300, tick_seconds=30, idle_seconds=86400,
+                 max_sessions=10000, redis_url=None, namespace='spotify-token', lock_wait=5.0, host_store=None):
+        self.refresher = refresher
+        self.lock_wait = lock_wait
+        self.refresh_margin = refresh_margin
+        self.tick_seconds = tick_seconds
+        self.idle_seconds = idle_seconds
+        self.max_sessions = max_sessions
+        self.namespace = namespace
+        self.shared = get_redis(redis_url)
+        if self.shared is None:
+            self.shared = host_store
+        self._tokens = OrderedDict()
+        self._last_used = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _expiring(self, token_info, now=None):
+        now = time.time() if now is None else now
+        return token_info.get('expires_at', 0) - now < self.refresh_margin
+
+    def get(self, key):
+        if not key:
+            return None
+        with self._lock:
+            token_info = self._tokens.get(key)
+            if token_info is not None:
+                self._tokens.move_to_end(key)
+                self._last_used[key] = time.time()
+        # Token assente o in scadenza: un altro worker potrebbe averlo salvato o già rinnovato
+        if (token_info is None or self._expiring(token_info)) and self.shared is not None:
+            stored = self._load(key)
+            if stored is not None:
+                self._remember(key, stored)
+                token_info = stored
+        return token_info
+
+    def save(self, key, token_info):
+        self._remember(key, token_info)
+        if self.shared is not None:
+            try:
+                self.shared.set(f"{self.namespace}:{key}", json.dumps(token_info), ex=self.idle_seconds)
+            except Exception as e:
+                print(f"Errore nel salvataggio del token nello stato condiviso: {e}")
+
+    def delete(self, key):
+        with self._lock:
+            self._tokens.pop(key, None)
+            self._last_used.pop(key, None)
+        if self.shared is not None:
+            try:
+                self.shared.delete(f"{self.namespace}:{key}")
+            except Exception as e:
+                print(f"Errore nella rimozione del token dallo stato condiviso: {e}")
+
+    def refresh(self, key, wait=True):
+        """
+        Rinnova il token; con lo stato condiviso un solo worker per volta lo fa, gli altri lo rileggono
+        (con `wait`, attendendo fino a `lock_wait` secondi il token nuovo).
+        """
+        token_info = self.get(key)
+        if token_info is None or not token_info.get('refresh_token'):
+            return None
+        if self.shared is not None:
+            try:
+                if not self.shared.set(f"{self.namespace}:lock:{key}", 1, nx=True, ex=self.tick_seconds):
+                    return self._wait_for_refresh(key, token_info) if wait else token_info
+            except Exception as e:
+                print(f"Errore nel lock di refresh nello stato condiviso: {e}")
+        try:
+            token_info = self.refresher(token_info)
+        except Exception as e:
+            print(f"Errore nel refresh del token Spotify: {e}")
+            return None
+        self.save(key, token_info)
+        return token_info
+
+    def refresh_due(self):
+        now = time.time()
+        with self._lock:
+            idle = [k for k, used in self._last_used.items() if now - used > self.idle_seconds]
+            for key in idle:
+                self._tokens.pop(key, None)
+                self._last_used.pop(key, None)
+            due = [k for k, token_info in self._tokens.items() if self._expiring(token_info, now)]
+        for key in due:
+            # Se un altro worker sta già rinnovando il token, il thread in background non lo aspetta
+            self.refresh(key, wait=False)
+
+    def _remember(self, key, token_info):
+        with self._lock:
+            self._tokens[key] = token_info
+            self._tokens.move_to_end(key)
+            self._last_used.setdefault(key, time.time())
+            while len(self._tokens) > self.max_sessions:
+                evicted, _ = self._tokens.popitem(last=False)
+                self._last_used.pop(evicted, None)
+
+    def _wait_for_refresh(self, key, token_info):
+        """Rilegge il token condiviso finché il worker che ha il lock non salva quello nuovo."""
+        deadline = time.monotonic() + self.lock_wait
+        while time.monotonic() < deadline:
+            stored = self._load(key)
+            if stored is not None and stored.get('access_token') != token_info.get('access_token'):
+                self._remember(key, stored)
+                return stored
+            time.sleep(0.1)
+        print(f"Token non rinnovato da un altro worker entro {self.lock_wait}s")
+        return token_info
+
+    def _load(self, key):
+        try:
+            raw = self.shared.get(f"{self.namespace}:{key}")
+            return json.loads(raw) if raw is not None else None
+        except Exception as e:
+            print(f"Errore nella lettura del token dallo stato condiviso: {e}")
+            return None
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self.refresh_due()
+            except Exception as e:
+                print(f"Errore nel refresh periodico dei token: {e}")
+            self._stop.wait(self.tick_seconds)
+
+    def start(self):
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name='token-refresh', daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def __len__(self):
+        return len(self._tokens)
+
+
+class SessionCacheHandler(CacheHandler):
+    """CacheHandler di spotipy legato a una sessione del TokenStore (sostituisce il file .spotify_cache)."""
+    def __init__(self, store, key):
+        self.store = store
+        self.key = key
+
+    def get_cached_token(self):
+        return self.store.get(self.key)
+
+    def save_token_to_cache(self, token_info):
+        self.store.save(self.key, token_info)
+
+
+_token_store_instance = None
+_token_store_lock = threading.Lock()
+
+def get_token_store(refresher):
+    global _token_store_instance
+    if _token_store_instance is None:
+        with _token_store_lock:
+            if _token_store_instance is None:
+                _token_store_instance = TokenStore(
+                    refresher,
+                    refresh_margin=Config.TOKEN_REFRESH_MARGIN,
+                    tick_seconds=Config.TOKEN_REFRESH_TICK,
+                    idle_seconds=Config.TOKEN_IDLE_SECONDS,
+                    max_sessions=Config.TOKEN_MAX_SESSIONS,
+                    redis_url=Config.REDIS_URL,
+                    host_store=get_host_store()
+                )
+                if _token_store_instance.shared is None and Config.WEB_WORKERS > 1:
+                    print(f"ATTENZIONE: né Redis né HOST_STORE_PATH configurati con WEB_WORKERS={Config.WEB_WORKERS}: "
+                          "i token restano nel worker che ha gestito il login e le richieste servite "
+                          "dagli altri worker vengono rimandate a /login")
+                start_background(_token_store_instance.start)
+    return _token_store_instance
@@ -1,42 +1,205 @@
-import datetime
-import random
-
-class RecommendationCache:
-    def __init__(self, expiry_days=7):
-        self.recommended_tracks = set()
-        self.expiry_days = expiry_days
-        self.last_reset = datetime.datetime.now()
-    
-    def check_expiry(self):
-        now = datetime.datetime.now()
-        days_passed = (now - self.last_reset).days
-        
-        if days_passed >= self.expiry_days:
-            self.recommended_tracks = set()
-            self.last_reset = now
-            return True
+import hashlib
+import json
+import math
+import threading
+import time
+from collections import OrderedDict
+from app.utils.redis_client import get_redis
+
+class RotatingBloomFilter:
+    """
+    Storico a memoria fissa: `buckets` filtri di Bloom, uno per finestra temporale.
+    Ogni finestra che scade azzera solo il filtro più vecchio (scadenza scorrevole).
+    """
+    def __init__(self, buckets, bucket_bits, hashes):
+        self.buckets = buckets
+        self.bucket_bits = bucket_bits
+        self.hashes = hashes
+        self._filters = [bytearray((bucket_bits + 7) // 8) for _ in range(buckets)]
+        self._epochs = [None] * buckets
+
+    @property
+    def nbytes(self):
+        return sum(len(f) for f in self._filters)
+
+    def _slot(self, epoch):
+        slot = epoch % self.buckets
+        if self._epochs[slot] != epoch:
+            self._filters[slot] = bytearray(len(self._filters[slot]))
+            self._epochs[slot] = epoch
+        return self._filters[slot]
+
+    def add(self, positions, epoch):
+        bits = self._slot(epoch)
+        for pos in positions:
+            bits[pos >> 3] |= 1 << (pos & 7)
+
+    def contains(self, positions, epoch):
+        for slot, bits in enumerate(self._filters):
+            slot_epoch = self._epochs[slot]
+            if slot_epoch is None or slot_epoch <= epoch - self.buckets:
+                continue
+            if all(bits[pos >> 3] & (1 << (pos & 7)) for pos in positions):
+                return True
         return False
-    
-    def add_track(self, track_id):
-        self.recommended_tracks.add(track_id)
-    
-    def is_recommended(self, track_id):
-        return track_id in self.recommended_tracks
-    
-    def filter_tracks(self, tracks, keep_ratio=0.2):
-        self.check_expiry()
-        
-        new_tracks = []
-        for track in tracks:
-            track_id = track.get('id')
-            if track_id and track_id not in self.recommended_tracks:
-                new_tracks.append(track)
-                self.add_track(track_id)
-        
-        if len(new_tracks) < len(tracks) * 0.5 and len(tracks) > 0:
-            already_recommended = [t for t in tracks if t.get('id') in self.recommended_tracks]
-            if already_recommended:
-                num_to_add = min(len(already_recommended), int(len(tracks) * keep_ratio))
-                new_tracks.extend(random.sample(already_recommended, num_to_add))
-        
-        return new_tracks or tracks
\ No newline at end of file
+
+
+class RecommendationHistory:
+    """
+    Tracce già consigliate, per utente, con ingombro fisso per utente e scadenza
+    scorrevole su `expiry_days`. Con Redis i filtri sono bitmap condivise tra i worker.
+    """
+    def __init__(self, expiry_days=7, buckets=7, tracks_per_bucket=500, false_positive_rate=0.01,
+                 max_users=10000, redis_url=None, namespace='rechist'):
+        self.buckets = buckets
+        self.bucket_seconds = expiry_days * 86400 / buckets
+        self.bucket_bits = max(64, int(math.ceil(-tracks_per_bucket * math.log(false_positive_rate) / (math.log(2) ** 2))))
+        self.hashes = max(1, int(round(self.bucket_bits / tracks_per_bucket * math.log(2))))
+        self.max_users = max_users
+        self.namespace = namespace
+        self.redis = get_redis(redis_url)
+        self._filters = OrderedDict()
+        self._lock = threading.Lock()
+
+    def memory_per_user(self):
+        """Byte occupati dai filtri di un utente (escluso l'overhead degli oggetti Python)."""
+        return self.buckets * ((self.bucket_bits + 7) // 8)
+
+    def _epoch(self):
+        return int(time.time() // self.bucket_seconds)
+
+    def _positions(self, track_id):
+        digest = hashlib.blake2b(track_id.encode('utf-8'), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        return [(h1 + i * h2) % self.bucket_bits for i in range(self.hashes)]
+
+    def _redis_key(self, user_id, epoch):
+        return f"{self.namespace}:{user_id}:{epoch}"
+
+    def filter_new(self, user_id, tracks):
+        """Restituisce le tracce mai consigliate all'utente e le registra nello storico."""
+        user_id = user_id or 'anonymous'
+        candidates = [(t, self._positions(t.id)) for t in tracks if t.id]
+        if not candidates:
+            return []
+        epoch = self._epoch()
+        if self.redis is not None:
+            try:
+                return self._filter_new_redis(user_id, candidates, epoch)
+            except Exception as e:
+                print(f"Errore nello storico Redis, uso lo storico locale: {e}")
+        return self._filter_new_local(user_id, candidates, epoch)
+
+    def _filter_new_local(self, user_id, candidates, epoch):
+        with self._lock:
+            bloom = self._filters.get(user_id)
+            if bloom is None:
+                bloom = RotatingBloomFilter(self.buckets, self.bucket_bits, self.hashes)
+                self._filters[user_id] = bloom
+            self._filters.move_to_end(user_id)
+            while len(self._filters) > self.max_users:
+                self._filters.popitem(last=False)
+
+            new_tracks, seen = [], set()
+            for track, positions in candidates:
+                if track.id in seen or bloom.contains(positions, epoch):
+                    continue
+                seen.add(track.id)
+                new_tracks.append((track, positions))
+            for _, positions in new_tracks:
+                bloom.add(positions, epoch)
+            return [track for track, _ in new_tracks]
+
+    def _filter_new_redis(self, user_id, candidates, epoch):
+        epochs = range(epoch - self.buckets + 1, epoch + 1)
+        pipe = self.redis.pipeline(transaction=False)
+        for e in epochs:
+            field = pipe.bitfield(self._redis_key(user_id, e))
+            for _, positions in candidates:
+                for pos in positions:
+                    field.get('u1', pos)
+            field.execute()
+        replies = pipe.execute()
+
+        new_tracks, seen = [], set()
+        for i, (track, _) in enumerate(candidates):
+            chunk = slice(i * self.hashes, (i + 1) * self.hashes)
+            recommended = any(all(reply[chunk]) for reply in replies)
+            if recommended or track.id in seen:
+                continue
+            seen.add(track.id)
+            new_tracks.append(track)
+
+        if new_tracks:
+            key = self._redis_key(user_id, epoch)
+            pipe = self.redis.pipeline(transaction=False)
+            field = pipe.bitfield(key)
+            for track in new_tracks:
+                for pos in self._positions(track.id):
+                    field.set('u1', pos, 1)
+            field.execute()
+            pipe.expire(key, int(self.bucket_seconds * (self.buckets + 1)))
+            pipe.execute()
+        return new_tracks
+
+
+class EmotionCache:
+    """
+    Cache LRU con scadenza dei risultati dell'analisi emozioni, indicizzata sul
+    testo normalizzato. Se è configurato Redis, i risultati sono condivisi tra i worker.
+    """
+    def __init__(self, max_size=2048, ttl_seconds=86400, redis_url=None, namespace='emotion'):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self.namespace = namespace
+        self.redis = get_redis(redis_url)
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def normalize(text):
+        return ' '.join(str(text).split()).casefold()
+
+    def _redis_key(self, key):
+        return f"{self.namespace}:{hashlib.sha1(key.encode('utf-8')).hexdigest()}"
+
+    def get(self, text):
+        key = self.normalize(text)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires_at, emotions_dict = entry
+                if expires_at > now:
+                    self._entries.move_to_end(key)
+                    return dict(emotions_dict)
+                del self._entries[key]
+
+        if self.redis is not None:
+            try:
+                raw = self.redis.get(self._redis_key(key))
+            except Exception as e:
+                print(f"Errore nella lettura della cache Redis: {e}")
+                raw = None
+            if raw:
+                emotions_dict = json.loads(raw)
+                self._store_local(key, emotions_dict)
+                return dict(emotions_dict)
+        return None
+
+    def set(self, text, emotions_dict):
+        key = self.normalize(text)
+        self._store_local(key, dict(emotions_dict))
+        if self.redis is not None:
+            try:
+                self.redis.set(self._redis_key(key), json.dumps(emotions_dict), ex=int(self.ttl_seconds))
+            except Exception as e:
+                print(f"Errore nella scrittura della cache Redis: {e}")
+
+    def _store_local(self, key, emotions_dict):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl_seconds, emotions_dict)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
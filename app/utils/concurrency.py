@@ -0,0 +1,79 @@
+import contextvars
+import threading
+import weakref
+from concurrent.futures import ThreadPoolExecutor, wait
+from app.config import Config
+
+
+class FanOut:
+    """
+    Esegue in parallelo letture indipendenti su un pool di thread condiviso,
+    limitando il numero di chiamate contemporanee per singolo utente.
+    """
+    def __init__(self, max_workers, per_user_limit):
+        self.max_workers = max_workers
+        self.per_user_limit = max(1, per_user_limit)
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='spotify-fetch')
+        self._lock = threading.Lock()
+        self._user_slots = weakref.WeakValueDictionary()
+
+    def _slots_for(self, user_key):
+        with self._lock:
+            slots = self._user_slots.get(user_key)
+            if slots is None:
+                slots = threading.BoundedSemaphore(self.per_user_limit)
+                self._user_slots[user_key] = slots
+            return slots
+
+    def submit(self, fn, kwargs=None, user_key=None, timeout=None):
+        """
+        Sottomette una singola chiamata, rispettando il limite per utente.
+        Con `timeout`, solleva TimeoutError se il posto dell'utente non si libera in tempo.
+        """
+        slots = self._slots_for(user_key) if user_key is not None else None
+        if slots is not None and not slots.acquire(timeout=timeout):
+            raise TimeoutError("Nessun posto libero per l'utente entro il tempo limite")
+        try:
+            # Il contesto (es. la priorità delle chiamate Spotify) segue il task
+            future = self._executor.submit(contextvars.copy_context().run, fn, **(kwargs or {}))
+        except Exception:
+            if slots is not None:
+                slots.release()
+            raise
+        if slots is not None:
+            future.add_done_callback(lambda _f: slots.release())
+        return future
+
+    def run(self, calls, user_key=None):
+        """
+        `calls` è un dict nome -> (funzione, kwargs). Restituisce due dict:
+        i risultati e le eccezioni, indicizzati per nome.
+        """
+        futures = {name: self.submit(fn, kwargs, user_key) for name, (fn, kwargs) in calls.items()}
+
+        wait(futures.values())
+        results, errors = {}, {}
+        for name, future in futures.items():
+            error = future.exception()
+            if error is not None:
+                errors[name] = error
+            else:
+                results[name] = future.result()
+        return results, errors
+
+
+def client_key(sp_client):
+    # Il token di accesso identifica l'utente a cui appartiene il client
+    return getattr(sp_client, '_auth', None) or id(sp_client)
+
+
+_fan_out_instance = None
+_fan_out_lock = threading.Lock()
+
+def get_fan_out():
+    global _fan_out_instance
+    if _fan_out_instance is None:
+        with _fan_out_lock:
+            if _fan_out_instance is None:
+                _fan_out_instance = FanOut(Config.SPOTIFY_FETCH_WORKERS, Config.SPOTIFY_PER_USER_CONCURRENCY)
+    return _fan_out_instance
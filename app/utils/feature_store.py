@@ -0,0 +1,126 @@
+import threading
+from app.config import Config
+from app.utils.sqlite_connection import ProcessLocalConnection
+
+FEATURE_COLUMNS = (
+    'danceability', 'energy', 'key', 'loudness', 'mode', 'speechiness', 'acousticness',
+    'instrumentalness', 'liveness', 'valence', 'tempo', 'duration_ms', 'time_signature'
+)
+
+# Limiti della Web API e di SQLite sul numero di parametri per query
+_API_BATCH_SIZE = 100
+_SQL_BATCH_SIZE = 500
+
+
+def _chunks(lst, n):
+    for i in range(0, len(lst), n):
+        yield lst[i:i+n]
+
+
+class TrackFeatureStore:
+    """
+    Archivio persistente (SQLite) delle caratteristiche audio per ID traccia.
+    Le caratteristiche audio non cambiano: una volta scaricate non vengono più richieste.
+    """
+    def __init__(self, path):
+        self._db = ProcessLocalConnection(path, setup=self._create_schema)
+
+    @staticmethod
+    def _create_schema(conn):
+        columns = ', '.join(f'{col} REAL' for col in FEATURE_COLUMNS)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(f"CREATE TABLE IF NOT EXISTS track_features (id TEXT PRIMARY KEY, {columns})")
+        conn.commit()
+
+    def get_many(self, track_ids):
+        found = {}
+        select = ', '.join(('id',) + FEATURE_COLUMNS)
+        with self._db as conn:
+            for chunk in _chunks(list(track_ids), _SQL_BATCH_SIZE):
+                placeholders = ', '.join('?' * len(chunk))
+                rows = conn.execute(
+                    f"SELECT {select} FROM track_features WHERE id IN ({placeholders})", chunk
+                ).fetchall()
+                for row in rows:
+                    features = dict(zip(FEATURE_COLUMNS, row[1:]))
+                    features['id'] = row[0]
+                    found[row[0]] = features
+        return found
+
+    def put_many(self, features_list):
+        rows = [
+            (feat['id'],) + tuple(feat.get(col) for col in FEATURE_COLUMNS)
+            for feat in features_list if feat and feat.get('id')
+        ]
+        if not rows:
+            return
+        placeholders = ', '.join('?' * (len(FEATURE_COLUMNS) + 1))
+        with self._db as conn:
+            conn.executemany(f"INSERT OR REPLACE INTO track_features VALUES ({placeholders})", rows)
+            conn.commit()
+
+    def count(self):
+        with self._db as conn:
+            return conn.execute("SELECT COUNT(*) FROM track_features").fetchone()[0]
+
+    def get_matrix(self, track_ids, columns=FEATURE_COLUMNS):
+        """Restituisce (id trovati, matrice float32 righe x colonne) nell'ordine richiesto."""
+        import numpy as np
+
+        found = self.get_many(track_ids)
+        ids = [tid for tid in track_ids if tid in found]
+        matrix = np.array(
+            [[found[tid][col] if found[tid][col] is not None else np.nan for col in columns] for tid in ids],
+            dtype=np.float32
+        ).reshape(len(ids), len(columns))
+        return ids, matrix
+
+    def load_all(self, columns=FEATURE_COLUMNS):
+        """Tutte le tracce in archivio come (id, matrice float32)."""
+        import numpy as np
+
+        with self._db as conn:
+            rows = conn.execute(f"SELECT id, {', '.join(columns)} FROM track_features").fetchall()
+        ids = [row[0] for row in rows]
+        matrix = np.array([row[1:] for row in rows], dtype=np.float32).reshape(len(rows), len(columns))
+        return ids, matrix
+
+    def fetch_audio_features(self, sp_client, track_ids):
+        """Legge dall'archivio e scarica da Spotify solo le tracce mancanti, in batch completi."""
+        track_ids = list(dict.fromkeys(tid for tid in track_ids if tid))
+        found = self.get_many(track_ids)
+        missing = [tid for tid in track_ids if tid not in found]
+
+        fetched = []
+        for batch_ids in _chunks(missing, _API_BATCH_SIZE):
+            try:
+                batch_features = sp_client.audio_features(batch_ids)
+                if batch_features is not None:
+                    fetched.extend([f for f in batch_features if f])
+            except Exception as e:
+                print(f"Errore nel recupero delle caratteristiche audio per il batch: {e}")
+                for tid in batch_ids:
+                    try:
+                        single_feature = sp_client.audio_features([tid])[0]
+                        if single_feature:
+                            fetched.append(single_feature)
+                    except Exception as e2:
+                        print(f"Errore nel recupero delle caratteristiche audio per il track {tid}: {e2}")
+
+        self.put_many(fetched)
+        for feat in fetched:
+            if feat.get('id'):
+                found[feat['id']] = feat
+        return found
+
+
+_feature_store_instance = None
+_feature_store_lock = threading.Lock()
+
+def get_feature_store():
+    global _feature_store_instance
+    if _feature_store_instance is None:
+        with _feature_store_lock:
+            if _feature_store_instance is None:
+                _feature_store_instance = TrackFeatureStore(Config.FEATURE_STORE_PATH)
+    return _feature_store_instance
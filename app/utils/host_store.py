@@ -0,0 +1,68 @@
+import random
+import threading
+import time
+
+from app.config import Config
+from app.utils.sqlite_connection import ProcessLocalConnection
+
+
+class HostStore:
+    """
+    Archivio chiave/valore con scadenza su SQLite, condiviso da tutti i processi dello
+    stesso host. Espone il sottoinsieme dell'API di Redis usato dall'app (get, set con
+    nx/ex, delete), così fa da ripiego quando REDIS_URL non è configurato.
+    """
+    def __init__(self, path):
+        self._db = ProcessLocalConnection(path, setup=self._create_schema)
+
+    @staticmethod
+    def _create_schema(conn):
+        # Più worker scrivono sullo stesso file: WAL e attesa sui lock invece di errori immediati
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA busy_timeout=5000")
+        conn.execute("CREATE TABLE IF NOT EXISTS kv (key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL)")
+        conn.commit()
+
+    def get(self, key):
+        with self._db as conn:
+            row = conn.execute(
+                "SELECT value FROM kv WHERE key = ? AND (expires_at IS NULL OR expires_at > ?)", (key, time.time())
+            ).fetchone()
+        return row[0] if row is not None else None
+
+    def set(self, key, value, nx=False, ex=None):
+        """Come SET di Redis: con `nx` restituisce None se la chiave esiste già (e non è scaduta)."""
+        now = time.time()
+        expires_at = now + ex if ex else None
+        value = value.decode('utf-8') if isinstance(value, bytes) else str(value)
+        with self._db as conn:
+            with conn:
+                if nx:
+                    conn.execute("DELETE FROM kv WHERE key = ? AND expires_at <= ?", (key, now))
+                    cursor = conn.execute("INSERT OR IGNORE INTO kv VALUES (?, ?, ?)", (key, value, expires_at))
+                    if cursor.rowcount == 0:
+                        return None
+                else:
+                    conn.execute("INSERT OR REPLACE INTO kv VALUES (?, ?, ?)", (key, value, expires_at))
+                # Pulizia occasionale delle chiavi scadute
+                if random.random() < 0.01:
+                    conn.execute("DELETE FROM kv WHERE expires_at <= ?", (now,))
+        return True
+
+    def delete(self, key):
+        with self._db as conn:
+            with conn:
+                conn.execute("DELETE FROM kv WHERE key = ?", (key,))
+
+
+_host_store_instance = None
+_host_store_lock = threading.Lock()
+
+def get_host_store():
+    """Archivio condiviso in HOST_STORE_PATH, oppure None se disattivato (percorso vuoto)."""
+    global _host_store_instance
+    if _host_store_instance is None and Config.HOST_STORE_PATH:
+        with _host_store_lock:
+            if _host_store_instance is None:
+                _host_store_instance = HostStore(Config.HOST_STORE_PATH)
+    return _host_store_instance
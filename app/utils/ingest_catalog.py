@@ -0,0 +1,125 @@
+"""
+Importa un catalogo pubblico di tracce (CSV o Parquet) nell'archivio colonnare TrackStore.
+
+Il file viene letto a blocchi di --chunk-size righe, quindi la memoria resta limitata
+anche con milioni di righe. Alla fine i vettori normalizzati e l'indice dei candidati
+vengono salvati nell'archivio, così i worker li aprono mappati senza ricostruirli. Esempio:
+
+    python -m app.utils.ingest_catalog tracks.csv --out data/track_store \\
+        --id-column id --artists-column id_artists --genres-column genres
+
+Per ricostruire solo l'indice di un archivio esistente:
+
+    python -m app.utils.ingest_catalog --index-only data/track_store
+"""
+import argparse
+import ast
+import csv
+import os
+import time
+
+import numpy as np
+
+from app.services.candidate_engine import build_store_index
+from app.utils.track_store import STORE_FEATURES, TrackStoreWriter
+
+
+def parse_list(value):
+    """Colonne lista: "['a', 'b']", "a;b" oppure "a,b"."""
+    if value is None:
+        return []
+    if isinstance(value, (list, tuple, np.ndarray)):
+        return [str(v) for v in value if v]
+    value = str(value).strip()
+    if not value:
+        return []
+    if value.startswith('['):
+        try:
+            return [str(v) for v in ast.literal_eval(value) if v]
+        except (ValueError, SyntaxError):
+            value = value.strip('[]')
+    separator = ';' if ';' in value else ','
+    return [v.strip().strip('\'"') for v in value.split(separator) if v.strip().strip('\'"')]
+
+
+def parse_float(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return np.nan
+
+
+def iter_csv(path, chunk_size):
+    with open(path, newline='', encoding='utf-8') as f:
+        chunk = []
+        for row in csv.DictReader(f):
+            chunk.append(row)
+            if len(chunk) >= chunk_size:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+
+
+def iter_parquet(path, chunk_size, columns):
+    try:
+        import pyarrow.parquet as pq
+    except ImportError as e:
+        raise SystemExit("La lettura dei file Parquet richiede il pacchetto pyarrow") from e
+    parquet = pq.ParquetFile(path)
+    available = [c for c in columns if c in parquet.schema_arrow.names]
+    for batch in parquet.iter_batches(batch_size=chunk_size, columns=available):
+        yield batch.to_pylist()
+
+
+def ingest(path, out, id_column, artists_column, genres_column, chunk_size, file_format=None):
+    file_format = file_format or ('parquet' if path.endswith(('.parquet', '.pq')) else 'csv')
+    columns = [id_column, artists_column, genres_column] + list(STORE_FEATURES)
+    chunks = iter_parquet(path, chunk_size, columns) if file_format == 'parquet' else iter_csv(path, chunk_size)
+
+    writer = TrackStoreWriter(out)
+    skipped = 0
+    start = time.perf_counter()
+    for chunk in chunks:
+        rows = [row for row in chunk if row.get(id_column)]
+        skipped += len(chunk) - len(rows)
+        writer.write_chunk(
+            ids=[str(row[id_column]) for row in rows],
+            features=[[parse_float(row.get(col)) for col in STORE_FEATURES] for row in rows],
+            artist_ids=[parse_list(row.get(artists_column)) for row in rows],
+            genres=[parse_list(row.get(genres_column)) for row in rows]
+        )
+        print(f"{writer.rows} tracce importate ({time.perf_counter() - start:.1f}s)")
+    writer.close()
+    print(f"Archivio scritto in {out}: {writer.rows} tracce, {len(writer.genre_vocab)} generi, {skipped} righe senza ID")
+    write_index(out)
+    return writer.rows
+
+
+def write_index(out):
+    start = time.perf_counter()
+    index = build_store_index(out)
+    if index is not None:
+        print(f"Indice dei candidati salvato in {out}: {index.n_lists} liste ({time.perf_counter() - start:.1f}s)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('input', help='file CSV o Parquet (con --index-only: cartella dell\'archivio)')
+    parser.add_argument('--out', default=os.getenv('TRACK_STORE_PATH') or 'data/track_store')
+    parser.add_argument('--format', choices=['csv', 'parquet'])
+    parser.add_argument('--id-column', default='id')
+    parser.add_argument('--artists-column', default='id_artists')
+    parser.add_argument('--genres-column', default='genres')
+    parser.add_argument('--chunk-size', type=int, default=100000)
+    parser.add_argument('--index-only', action='store_true', help='ricostruisce solo l\'indice dei candidati')
+    args = parser.parse_args()
+    if args.index_only:
+        write_index(args.input)
+        return
+    ingest(args.input, args.out, args.id_column, args.artists_column, args.genres_column,
+           args.chunk_size, file_format=args.format)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,32 @@
+import json
+import struct
+
+# Messaggi JSON con prefisso di lunghezza (4 byte, big-endian) su socket di tipo stream
+_HEADER = struct.Struct('>I')
+
+
+def send_message(sock, payload):
+    data = json.dumps(payload).encode('utf-8')
+    sock.sendall(_HEADER.pack(len(data)) + data)
+
+
+def _recv_exact(sock, size):
+    chunks = []
+    while size > 0:
+        chunk = sock.recv(size)
+        if not chunk:
+            return None
+        chunks.append(chunk)
+        size -= len(chunk)
+    return b''.join(chunks)
+
+
+def recv_message(sock):
+    """Legge un messaggio; None se il peer ha chiuso la connessione."""
+    header = _recv_exact(sock, _HEADER.size)
+    if header is None:
+        return None
+    data = _recv_exact(sock, _HEADER.unpack(header)[0])
+    if data is None:
+        return None
+    return json.loads(data.decode('utf-8'))
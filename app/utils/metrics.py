@@ -0,0 +1,192 @@
+import bisect
+import contextlib
+import functools
+import os
+import threading
+import time
+
+# Metriche di processo in formato Prometheus, senza dipendenze esterne.
+# Con gunicorn ogni worker ha il proprio registro: /metrics riporta quello del worker che risponde
+# e ogni serie porta l'etichetta `pid`, da aggregare in PromQL (es. sum without (pid) (...)).
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def _format_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ''
+    escaped = (str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, v in pairs)
+    return '{' + ','.join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + '}'
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    kind = 'counter'
+
+    def __init__(self, name, help_text, labelnames=()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def value(self, *labels):
+        return self._values.get(labels, 0)
+
+    def snapshot(self):
+        with self._lock:
+            return dict(self._values)
+
+    def samples(self, extra=()):
+        for labels, value in self.snapshot().items():
+            yield f"{self.name}{_format_labels(self.labelnames, labels, extra)} {_format_value(value)}"
+
+
+class Histogram:
+    kind = 'histogram'
+
+    def __init__(self, name, help_text, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, *labels):
+        # Un solo conteggio per bucket: i valori cumulativi si calcolano in lettura
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    @contextlib.contextmanager
+    def time(self, *labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, *labels)
+
+    def samples(self, extra=()):
+        with self._lock:
+            items = [(labels, (list(s[0]), s[1], s[2])) for labels, s in self._series.items()]
+        for labels, (counts, total, count) in items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += bucket_count
+                le = _format_labels(self.labelnames, labels, list(extra) + [('le', _format_value(bound))])
+                yield f"{self.name}_bucket{le} {cumulative}"
+            formatted = _format_labels(self.labelnames, labels, extra)
+            yield f"{self.name}_sum{formatted} {_format_value(total)}"
+            yield f"{self.name}_count{formatted} {count}"
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics = {}
+        self._collectors = []
+        self._lock = threading.Lock()
+
+    def _get_or_create(self, cls, name, help_text, labelnames, **kwargs):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(name, help_text, labelnames, **kwargs)
+            return metric
+
+    def counter(self, name, help_text, labelnames=()):
+        return self._get_or_create(Counter, name, help_text, labelnames)
+
+    def histogram(self, name, help_text, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self._get_or_create(Histogram, name, help_text, labelnames, buckets=buckets)
+
+    def register_collector(self, collect):
+        """`collect()` restituisce [(nome, tipo, help, [(labels dict, valore), ...])], letto a ogni scrape."""
+        with self._lock:
+            self._collectors.append(collect)
+
+    def render(self):
+        lines = []
+        # Letto a ogni scrape: dopo il fork ogni worker riporta il proprio pid
+        worker = [('pid', os.getpid())]
+        with self._lock:
+            metrics = list(self._metrics.values())
+            collectors = list(self._collectors)
+        for metric in metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.samples(worker))
+        for collect in collectors:
+            try:
+                families = collect()
+            except Exception as e:
+                print(f"Errore in un collector delle metriche: {e}")
+                continue
+            for name, kind, help_text, samples in families:
+                lines.append(f"# HELP {name} {help_text}")
+                lines.append(f"# TYPE {name} {kind}")
+                for labels, value in samples:
+                    formatted = _format_labels(list(labels), list(labels.values()), worker)
+                    lines.append(f"{name}{formatted} {_format_value(value)}")
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = MetricsRegistry()
+
+STAGE_SECONDS = REGISTRY.histogram(
+    'moodmusic_stage_seconds', 'Durata delle fasi di una raccomandazione', ('stage',))
+SPOTIFY_REQUEST_SECONDS = REGISTRY.histogram(
+    'moodmusic_spotify_request_seconds', 'Latenza delle chiamate alla Web API di Spotify', ('endpoint',))
+SPOTIFY_REQUESTS = REGISTRY.counter(
+    'moodmusic_spotify_requests_total', 'Chiamate alla Web API di Spotify per esito', ('endpoint', 'status'))
+CACHE_REQUESTS = REGISTRY.counter(
+    'moodmusic_cache_requests_total', 'Letture dalle cache per esito', ('cache', 'result'))
+HTTP_REQUEST_SECONDS = REGISTRY.histogram(
+    'moodmusic_http_request_seconds', 'Durata delle richieste HTTP per route', ('endpoint', 'method', 'status'))
+
+
+def timed(stage):
+    """Decoratore: registra la durata della funzione come fase `stage`."""
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with STAGE_SECONDS.time(stage):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def stage_timer(stage):
+    return STAGE_SECONDS.time(stage)
+
+
+def record_cache(cache, hit):
+    CACHE_REQUESTS.inc(cache, 'hit' if hit else 'miss')
+
+
+def _cache_hit_ratios():
+    totals = {}
+    for (cache, result), value in CACHE_REQUESTS.snapshot().items():
+        hits, count = totals.get(cache, (0, 0))
+        totals[cache] = (hits + (value if result == 'hit' else 0), count + value)
+    return [(
+        'moodmusic_cache_hit_ratio', 'gauge', 'Frazione di letture servite dalla cache',
+        [({'cache': cache}, hits / count) for cache, (hits, count) in totals.items() if count]
+    )]
+
+
+REGISTRY.register_collector(_cache_hit_ratios)
@@ -0,0 +1,69 @@
+import contextlib
+import gc
+import os
+import threading
+
+# Serving multi-processo: il master carica modello e archivi prima del fork, così
+# le pagine restano condivise copy-on-write. I thread non sopravvivono al fork:
+# quelli avviati durante il precaricamento vengono rimandati a ogni worker.
+_preloading = False
+_deferred = []
+_before_fork = []
+_lock = threading.Lock()
+
+
+def is_preloading():
+    return _preloading
+
+
+@contextlib.contextmanager
+def preloading():
+    global _preloading
+    _preloading = True
+    try:
+        yield
+    finally:
+        _preloading = False
+
+
+def start_background(fn):
+    """Avvia subito `fn`, oppure dopo il fork in ogni worker se il master sta precaricando."""
+    if _preloading:
+        with _lock:
+            _deferred.append(fn)
+    else:
+        fn()
+
+
+def close_before_fork(fn):
+    """Esegue `fn` nel processo padre prima di ogni fork (es. chiusura di connessioni SQLite)."""
+    with _lock:
+        _before_fork.append(fn)
+
+
+def freeze_shared_state():
+    """
+    Sposta gli oggetti del master nella generazione permanente del GC: le collezioni
+    nei worker non toccano più le loro intestazioni e le pagine non vengono copiate.
+    """
+    gc.collect()
+    gc.freeze()
+
+
+def _before_fork_in_parent():
+    for fn in list(_before_fork):
+        try:
+            fn()
+        except Exception as e:
+            print(f"Errore nella preparazione al fork: {e}")
+
+
+def _after_fork_in_child():
+    for fn in list(_deferred):
+        try:
+            fn()
+        except Exception as e:
+            print(f"Errore nell'avvio di un servizio in background dopo il fork: {e}")
+
+
+os.register_at_fork(before=_before_fork_in_parent, after_in_child=_after_fork_in_child)
@@ -0,0 +1,226 @@
+import json
+import os
+import random
+import sys
+import threading
+import time
+import uuid
+from collections import Counter, deque
+
+from app.config import Config
+
+# Thread condivisi che lavorano per conto delle richieste: vengono campionati insieme
+# al thread della richiesta (il loro stack può includere lavoro di richieste concorrenti)
+HELPER_THREAD_PREFIXES = ('emotion-batcher', 'spotify-fetch')
+
+
+def _frame_label(frame):
+    code = frame.f_code
+    return f"{os.path.basename(code.co_filename)}:{code.co_name}"
+
+
+def _collapse(frame, thread_name):
+    stack = []
+    while frame is not None:
+        stack.append(_frame_label(frame))
+        frame = frame.f_back
+    stack.append(thread_name)
+    return ';'.join(reversed(stack))
+
+
+def _format_collapsed(stacks):
+    return ''.join(f"{stack} {count}\n" for stack, count in stacks.most_common())
+
+
+class RequestProfile:
+    """
+    Profilo a campionamento di una singola richiesta: un thread legge gli stack
+    del thread della richiesta (e dei thread ausiliari) ogni `interval` secondi
+    e li accumula in formato collapsed (`frame;frame;frame conteggio`).
+    """
+    def __init__(self, label, thread_id, interval=0.005, helper_prefixes=HELPER_THREAD_PREFIXES):
+        self.id = uuid.uuid4().hex[:12]
+        self.label = label
+        self.pid = os.getpid()
+        self.thread_id = thread_id
+        self.interval = interval
+        self.helper_prefixes = helper_prefixes
+        self.stacks = Counter()
+        self.samples = 0
+        self.started_at = time.time()
+        self.duration = None
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='profiler-sampler', daemon=True)
+
+    def start(self):
+        self._start = time.perf_counter()
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        self.duration = time.perf_counter() - self._start
+
+    def _sample(self):
+        names = {t.ident: t.name for t in threading.enumerate()}
+        for thread_id, frame in sys._current_frames().items():
+            name = names.get(thread_id, 'unknown')
+            if thread_id == self.thread_id:
+                self.stacks[_collapse(frame, 'request')] += 1
+            elif name.startswith(self.helper_prefixes):
+                self.stacks[_collapse(frame, name.split('_')[0])] += 1
+        self.samples += 1
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self._sample()
+
+    def summary(self):
+        return {
+            'id': self.id,
+            'label': self.label,
+            'pid': self.pid,
+            'started_at': self.started_at,
+            'duration_seconds': round(self.duration, 4) if self.duration is not None else None,
+            'samples': self.samples
+        }
+
+    def collapsed(self):
+        return _format_collapsed(self.stacks)
+
+
+class Profiler:
+    """
+    Profilazione su richiesta: una richiesta viene profilata se lo chiede esplicitamente
+    (header con il token amministrativo) oppure con probabilità `sample_rate`.
+    Con `directory`, gli ultimi `capacity` profili e il sample rate sono file condivisi
+    da tutti i worker; altrimenti restano in memoria nel processo che li ha raccolti.
+    """
+    def __init__(self, sample_rate=0.0, interval_ms=5, capacity=50, directory=None):
+        self.interval = interval_ms / 1000.0
+        # Almeno un profilo: con 0 la potatura `[:-capacity]` non eliminerebbe nulla
+        self.capacity = max(1, capacity)
+        self.directory = directory
+        self._sample_rate = sample_rate
+        self._rate_read_at = float('-inf')
+        self._profiles = deque(maxlen=self.capacity)
+        self._lock = threading.Lock()
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    @property
+    def sample_rate(self):
+        # Il valore impostato da un altro worker viene riletto al più una volta al secondo
+        if self.directory and time.monotonic() - self._rate_read_at > 1.0:
+            self._rate_read_at = time.monotonic()
+            try:
+                with open(os.path.join(self.directory, 'sample_rate')) as f:
+                    self._sample_rate = float(f.read())
+            except (OSError, ValueError):
+                pass
+        return self._sample_rate
+
+    @sample_rate.setter
+    def sample_rate(self, rate):
+        self._sample_rate = rate
+        if self.directory:
+            self._write(os.path.join(self.directory, 'sample_rate'), str(rate))
+            self._rate_read_at = time.monotonic()
+
+    def should_profile(self, requested=False):
+        return requested or (self.sample_rate > 0 and random.random() < self.sample_rate)
+
+    def start(self, label):
+        return RequestProfile(label, threading.get_ident(), interval=self.interval).start()
+
+    def finish(self, profile):
+        profile.stop()
+        if not self.directory:
+            with self._lock:
+                self._profiles.append(profile)
+            return
+        # Il nome inizia con l'istante di avvio: l'ordine dei file è quello cronologico
+        name = f"{int(profile.started_at * 1000):013d}-{profile.id}.json"
+        self._write(os.path.join(self.directory, name),
+                    json.dumps({**profile.summary(), 'stacks': dict(profile.stacks)}))
+        for old in self._files()[:-self.capacity]:
+            try:
+                os.remove(os.path.join(self.directory, old))
+            except FileNotFoundError:
+                pass
+
+    @staticmethod
+    def _write(path, data):
+        # Scrittura atomica: gli altri worker non leggono mai un file a metà
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, 'w') as f:
+            f.write(data)
+        os.replace(tmp, path)
+
+    def _files(self):
+        try:
+            return sorted(n for n in os.listdir(self.directory) if n.endswith('.json'))
+        except FileNotFoundError:
+            return []
+
+    def _stored(self):
+        """Profili salvati nella cartella condivisa, dal più recente."""
+        profiles = []
+        for name in reversed(self._files()):
+            try:
+                with open(os.path.join(self.directory, name)) as f:
+                    profiles.append(json.load(f))
+            except (OSError, ValueError):
+                continue
+        return profiles
+
+    def list(self):
+        if self.directory:
+            return [{k: v for k, v in p.items() if k != 'stacks'} for p in self._stored()]
+        with self._lock:
+            return [p.summary() for p in reversed(self._profiles)]
+
+    def collapsed(self, profile_id):
+        """Stack del profilo in formato collapsed, oppure None se non è (più) disponibile."""
+        if self.directory:
+            name = next((n for n in self._files() if n.endswith(f'-{profile_id}.json')), None)
+            if name is None:
+                return None
+            try:
+                with open(os.path.join(self.directory, name)) as f:
+                    return _format_collapsed(Counter(json.load(f)['stacks']))
+            except (OSError, ValueError):
+                return None
+        with self._lock:
+            profile = next((p for p in self._profiles if p.id == profile_id), None)
+        return profile.collapsed() if profile is not None else None
+
+    def merged(self):
+        """Tutti i profili disponibili sommati, per un flame graph complessivo."""
+        total = Counter()
+        if self.directory:
+            for profile in self._stored():
+                total.update(profile['stacks'])
+        else:
+            with self._lock:
+                for profile in self._profiles:
+                    total.update(profile.stacks)
+        return _format_collapsed(total)
+
+
+_profiler_instance = None
+_profiler_lock = threading.Lock()
+
+def get_profiler():
+    global _profiler_instance
+    if _profiler_instance is None:
+        with _profiler_lock:
+            if _profiler_instance is None:
+                _profiler_instance = Profiler(
+                    sample_rate=Config.PROFILER_SAMPLE_RATE,
+                    interval_ms=Config.PROFILER_INTERVAL_MS,
+                    capacity=Config.PROFILER_BUFFER_SIZE,
+                    directory=Config.PROFILER_DIR or None
+                )
+    return _profiler_instance
@@ -0,0 +1,26 @@
+import threading
+
+_clients = {}
+_lock = threading.Lock()
+
+
+def get_redis(url):
+    """
+    Restituisce un client Redis condiviso per l'URL indicato, oppure None se
+    l'URL non è configurato, il pacchetto non è installato o il server non risponde.
+    """
+    if not url:
+        return None
+    with _lock:
+        if url in _clients:
+            return _clients[url]
+        client = None
+        try:
+            import redis
+            client = redis.Redis.from_url(url, socket_timeout=0.5, socket_connect_timeout=0.5)
+            client.ping()
+        except Exception as e:
+            print(f"Redis non disponibile ({url}), uso solo la memoria locale: {e}")
+            client = None
+        _clients[url] = client
+        return client
@@ -0,0 +1,59 @@
+import os
+import sqlite3
+import threading
+
+from app.utils.prefork import close_before_fork, start_background
+
+
+class ProcessLocalConnection:
+    """
+    Connessione SQLite aperta pigramente e per processo: SQLite vieta di usare una
+    connessione ereditata con fork(), quindi viene chiusa nel padre prima di ogni fork
+    e riaperta nel figlio (subito dopo il fork se il master sta precaricando).
+    `setup(conn)` crea lo schema alla prima apertura in ogni processo.
+
+    Uso: `with db as conn: conn.execute(...)` (accesso serializzato tra i thread).
+    """
+    def __init__(self, path, setup=None):
+        self.path = path
+        self.setup = setup
+        self._lock = threading.RLock()
+        self._lock_pid = os.getpid()
+        self._conn = None
+        self._pid = None
+        close_before_fork(self.close)
+        start_background(self._warm)
+
+    def _process_lock(self):
+        # Un lock ereditato dal padre potrebbe risultare acquisito da un thread che nel figlio non esiste
+        if self._lock_pid != os.getpid():
+            self._lock = threading.RLock()
+            self._lock_pid = os.getpid()
+        return self._lock
+
+    def __enter__(self):
+        self._process_lock().acquire()
+        try:
+            if self._conn is None or self._pid != os.getpid():
+                self._conn = sqlite3.connect(self.path, check_same_thread=False)
+                self._pid = os.getpid()
+                if self.setup is not None:
+                    self.setup(self._conn)
+            return self._conn
+        except BaseException:
+            self._lock.release()
+            raise
+
+    def __exit__(self, *exc_info):
+        self._lock.release()
+
+    def _warm(self):
+        with self:
+            pass
+
+    def close(self):
+        with self._process_lock():
+            if self._conn is not None and self._pid == os.getpid():
+                self._conn.close()
+            self._conn = None
+            self._pid = None
@@ -0,0 +1,184 @@
+import json
+import os
+import threading
+
+import numpy as np
+from app.config import Config
+
+# Colonne numeriche dell'archivio: le dimensioni dell'indice dei candidati più la popolarità
+STORE_FEATURES = ('valence', 'energy', 'danceability', 'acousticness', 'tempo', 'instrumentalness', 'liveness', 'popularity')
+ID_DTYPE = 'S22'
+_META_FILE = 'meta.json'
+_VERSION = 1
+
+
+class TrackStoreWriter:
+    """
+    Scrive l'archivio colonnare a blocchi, con memoria limitata al blocco corrente:
+    le colonne a larghezza fissa sono file binari grezzi aperti poi con np.memmap.
+    """
+    def __init__(self, path, features=STORE_FEATURES):
+        self.path = path
+        self.features = tuple(features)
+        os.makedirs(path, exist_ok=True)
+        self.rows = 0
+        self.artist_total = 0
+        self.genre_total = 0
+        self.genre_vocab = {}
+        self._files = {
+            name: open(os.path.join(path, f'{name}.bin'), 'wb')
+            for name in ('ids', 'features', 'artist_offsets', 'artist_ids', 'genre_offsets', 'genre_codes')
+        }
+        # Gli offset hanno N+1 elementi: il primo è sempre 0
+        np.zeros(1, dtype=np.int64).tofile(self._files['artist_offsets'])
+        np.zeros(1, dtype=np.int64).tofile(self._files['genre_offsets'])
+
+    def write_chunk(self, ids, features, artist_ids, genres):
+        """
+        `ids`: lista di ID traccia, `features`: matrice (righe x len(features)),
+        `artist_ids` e `genres`: liste (una per riga) di ID artista e generi.
+        """
+        n = len(ids)
+        if n == 0:
+            return
+        np.asarray(ids, dtype=ID_DTYPE).tofile(self._files['ids'])
+        np.asarray(features, dtype=np.float32).reshape(n, len(self.features)).tofile(self._files['features'])
+
+        artist_lens = np.fromiter((len(a) for a in artist_ids), dtype=np.int64, count=n)
+        (self.artist_total + np.cumsum(artist_lens)).tofile(self._files['artist_offsets'])
+        self.artist_total += int(artist_lens.sum())
+        flat_artists = [a for row in artist_ids for a in row]
+        np.asarray(flat_artists, dtype=ID_DTYPE).tofile(self._files['artist_ids'])
+
+        genre_lens = np.fromiter((len(g) for g in genres), dtype=np.int64, count=n)
+        (self.genre_total + np.cumsum(genre_lens)).tofile(self._files['genre_offsets'])
+        self.genre_total += int(genre_lens.sum())
+        codes = [self.genre_vocab.setdefault(g, len(self.genre_vocab)) for row in genres for g in row]
+        np.asarray(codes, dtype=np.int32).tofile(self._files['genre_codes'])
+
+        self.rows += n
+
+    def close(self):
+        for f in self._files.values():
+            f.close()
+        # Indice ID -> riga: permutazione che ordina gli ID, interrogata con searchsorted
+        ids = np.memmap(os.path.join(self.path, 'ids.bin'), dtype=ID_DTYPE, mode='r', shape=(self.rows,)) \
+            if self.rows else np.empty(0, dtype=ID_DTYPE)
+        order = np.argsort(ids, kind='stable').astype(np.int64)
+        order.tofile(os.path.join(self.path, 'id_order.bin'))
+        ids[order].tofile(os.path.join(self.path, 'sorted_ids.bin'))
+        del ids, order
+        genres = sorted(self.genre_vocab, key=self.genre_vocab.get)
+        with open(os.path.join(self.path, _META_FILE), 'w') as f:
+            json.dump({
+                'version': _VERSION,
+                'rows': self.rows,
+                'features': list(self.features),
+                'artist_total': self.artist_total,
+                'genre_total': self.genre_total,
+                'genres': genres
+            }, f)
+
+
+class TrackStore:
+    """
+    Archivio di tracce aperto in sola lettura tramite np.memmap: nessuna copia in memoria,
+    le pagine sono condivise (page cache) tra tutti i processi worker.
+    """
+    def __init__(self, path):
+        self.path = path
+        with open(os.path.join(path, _META_FILE)) as f:
+            meta = json.load(f)
+        self.rows = meta['rows']
+        self.feature_names = tuple(meta['features'])
+        self.genre_names = meta['genres']
+        self._genre_codes_by_name = {g: i for i, g in enumerate(self.genre_names)}
+        self.ids = self._map('ids', ID_DTYPE, (self.rows,))
+        self.features = self._map('features', np.float32, (self.rows, len(self.feature_names)))
+        self.id_order = self._map('id_order', np.int64, (self.rows,))
+        self.sorted_ids = self._map('sorted_ids', ID_DTYPE, (self.rows,))
+        self.artist_offsets = self._map('artist_offsets', np.int64, (self.rows + 1,))
+        self.artist_ids = self._map('artist_ids', ID_DTYPE, (meta['artist_total'],))
+        self.genre_offsets = self._map('genre_offsets', np.int64, (self.rows + 1,))
+        self.genre_codes = self._map('genre_codes', np.int32, (meta['genre_total'],))
+
+    @classmethod
+    def open(cls, path):
+        return cls(path)
+
+    def _map(self, name, dtype, shape):
+        if shape[0] == 0:
+            return np.empty(shape, dtype=dtype)
+        return np.memmap(os.path.join(self.path, f'{name}.bin'), dtype=dtype, mode='r', shape=shape)
+
+    def __len__(self):
+        return self.rows
+
+    def rows_of(self, track_ids):
+        """Righe degli ID richiesti (-1 se assenti)."""
+        keys = np.asarray(track_ids, dtype=ID_DTYPE)
+        if self.rows == 0:
+            return np.full(len(keys), -1, dtype=np.int64)
+        # Ricerca binaria sugli ID ordinati: vengono lette solo poche pagine del file
+        pos = np.minimum(np.searchsorted(self.sorted_ids, keys), self.rows - 1)
+        found = self.sorted_ids[pos] == keys
+        return np.where(found, self.id_order[pos], -1)
+
+    def feature_columns(self, names):
+        return [self.feature_names.index(name) for name in names]
+
+    def get_matrix(self, track_ids, columns=STORE_FEATURES):
+        rows = self.rows_of(track_ids)
+        present = rows >= 0
+        ids = [tid for tid, ok in zip(track_ids, present) if ok]
+        return ids, np.asarray(self.features[rows[present]][:, self.feature_columns(columns)], dtype=np.float32)
+
+    def track_id(self, row):
+        return self.ids[row].decode('ascii')
+
+    def artists(self, row):
+        start, end = self.artist_offsets[row], self.artist_offsets[row + 1]
+        return [a.decode('ascii') for a in self.artist_ids[start:end]]
+
+    def genres(self, row):
+        start, end = self.genre_offsets[row], self.genre_offsets[row + 1]
+        return [self.genre_names[c] for c in self.genre_codes[start:end]]
+
+    def _gather(self, offsets, values, rows):
+        starts = offsets[rows]
+        lens = offsets[rows + 1] - starts
+        total = int(lens.sum())
+        owner = np.repeat(np.arange(len(rows)), lens)
+        flat = np.arange(total) - np.repeat(np.cumsum(lens) - lens, lens) + np.repeat(starts, lens)
+        return owner, values[flat]
+
+    def matches(self, rows, seed_artists, seed_genres):
+        """Per ogni riga, True se condivide almeno un artista o un genere con i seed."""
+        rows = np.asarray(rows, dtype=np.int64)
+        matched = np.zeros(len(rows), dtype=bool)
+        if seed_artists:
+            owner, values = self._gather(self.artist_offsets, self.artist_ids, rows)
+            hit = np.isin(values, np.asarray(list(seed_artists), dtype=ID_DTYPE))
+            matched[owner[hit]] = True
+        codes = [self._genre_codes_by_name[g] for g in (seed_genres or ()) if g in self._genre_codes_by_name]
+        if codes:
+            owner, values = self._gather(self.genre_offsets, self.genre_codes, rows)
+            hit = np.isin(values, np.asarray(codes, dtype=np.int32))
+            matched[owner[hit]] = True
+        return matched
+
+
+_track_store_instance = None
+_track_store_lock = threading.Lock()
+
+def get_track_store():
+    """Archivio configurato in TRACK_STORE_PATH, oppure None se assente."""
+    global _track_store_instance
+    if _track_store_instance is None and Config.TRACK_STORE_PATH:
+        with _track_store_lock:
+            if _track_store_instance is None:
+                if os.path.exists(os.path.join(Config.TRACK_STORE_PATH, _META_FILE)):
+                    _track_store_instance = TrackStore.open(Config.TRACK_STORE_PATH)
+                else:
+                    print(f"Archivio tracce non trovato in {Config.TRACK_STORE_PATH}")
+    return _track_store_instance
@@ -1,8 +1,160 @@
-from deep_translator import GoogleTranslator
+import hashlib
+import re
+import threading
+from app.config import Config
+from app.utils.metrics import record_cache
+from app.utils.sqlite_connection import ProcessLocalConnection
 
-def translate_to_english(text):
-    try:
+# Parole funzionali frequenti per una identificazione locale della lingua
+# Niente parole comuni ad altre lingue nell'elenco inglese ('a', 'in', 'me', 'i', 'so', 'am', 'was', ...):
+# un testo riconosciuto per errore come inglese non verrebbe tradotto
+_STOPWORDS = {
+    'en': {'the', 'and', 'is', 'are', "i'm", 'im', 'you', 'my', 'it', 'to', 'of',
+           'feel', 'feeling', 'this', 'that', 'with', 'for', 'not', "don't", 'today', 'very', 'have'},
+    'it': {'il', 'lo', 'la', 'e', 'è', 'sono', 'mi', 'che', 'non', 'di', 'un', 'una', 'per', 'con', 'ho',
+           'oggi', 'molto', 'sento', 'sto', 'del', 'della', 'ma', 'anche', 'perché', 'io', 'ti'},
+    'es': {'el', 'los', 'las', 'es', 'estoy', 'que', 'de', 'y', 'en', 'un', 'una', 'por', 'con', 'muy',
+           'hoy', 'siento', 'pero', 'yo', 'tengo', 'mi', 'no'},
+    'fr': {'le', 'les', 'est', 'suis', 'je', 'que', 'de', 'et', 'un', 'une', 'pour', 'avec', 'très',
+           "aujourd'hui", 'mais', 'pas', 'ne', 'me', 'sens', 'des'},
+    'de': {'der', 'die', 'das', 'ist', 'bin', 'ich', 'und', 'nicht', 'ein', 'eine', 'mit', 'für', 'sehr',
+           'heute', 'aber', 'mir', 'mich', 'fühle'},
+    'pt': {'o', 'os', 'as', 'é', 'estou', 'que', 'de', 'e', 'um', 'uma', 'por', 'com', 'muito',
+           'hoje', 'mas', 'eu', 'não', 'me', 'sinto'},
+}
+_WORD_RE = re.compile(r"[^\W\d_]+(?:'[^\W\d_]+)?", re.UNICODE)
+
+
+def detect_language(text, min_confidence=0.6, min_distinct=2):
+    """
+    Identificazione locale della lingua basata sulle parole funzionali.
+    Restituisce il codice della lingua o None se il testo è ambiguo
+    o contiene meno di `min_distinct` parole funzionali diverse della lingua.
+    """
+    words = [w.lower() for w in _WORD_RE.findall(text)]
+    if not words:
+        return None
+    scores = {lang: sum(1 for w in words if w in stopwords) for lang, stopwords in _STOPWORDS.items()}
+    best = max(scores, key=scores.get)
+    total = sum(scores.values())
+    if scores[best] == 0 or scores[best] / total < min_confidence:
+        return None
+    if len(_STOPWORDS[best].intersection(words)) < min_distinct:
+        return None
+    return best
+
+
+class TranslationCache:
+    """Cache persistente (SQLite) delle traduzioni già eseguite."""
+    def __init__(self, path):
+        self._db = ProcessLocalConnection(path, setup=self._create_schema)
+
+    @staticmethod
+    def _create_schema(conn):
+        conn.execute("CREATE TABLE IF NOT EXISTS translations (key TEXT PRIMARY KEY, translated TEXT NOT NULL)")
+        conn.commit()
+
+    @staticmethod
+    def _key(text, backend):
+        normalized = ' '.join(text.split())
+        return f"{backend}:{hashlib.sha1(normalized.encode('utf-8')).hexdigest()}"
+
+    def get(self, text, backend):
+        with self._db as conn:
+            row = conn.execute(
+                "SELECT translated FROM translations WHERE key = ?", (self._key(text, backend),)
+            ).fetchone()
+        return row[0] if row else None
+
+    def set(self, text, backend, translated):
+        with self._db as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO translations (key, translated) VALUES (?, ?)",
+                (self._key(text, backend), translated)
+            )
+            conn.commit()
+
+
+class GoogleBackend:
+    name = 'google'
+
+    def translate(self, text):
+        from deep_translator import GoogleTranslator
         return GoogleTranslator(source='auto', target='en').translate(text)
-    except Exception as e:
-        print(f"Errore nella traduzione: {e}")
-        return text
\ No newline at end of file
+
+
+class MarianBackend:
+    """Traduzione offline con un modello MarianMT (nessuna chiamata esterna)."""
+    name = 'marian'
+
+    def __init__(self, model_name):
+        self.model_name = model_name
+        self._translator = None
+        self._lock = threading.Lock()
+
+    def translate(self, text):
+        if self._translator is None:
+            with self._lock:
+                if self._translator is None:
+                    from transformers import pipeline
+                    self._translator = pipeline("translation", model=self.model_name)
+        return self._translator(text, truncation=True)[0]['translation_text']
+
+
+class IdentityBackend:
+    """Nessuna traduzione: restituisce il testo originale."""
+    name = 'none'
+
+    def translate(self, text):
+        return text
+
+
+def create_translation_backend(name=None):
+    name = (name or Config.TRANSLATION_BACKEND).lower()
+    if name == 'google':
+        return GoogleBackend()
+    if name == 'marian':
+        return MarianBackend(Config.TRANSLATION_MODEL)
+    if name == 'none':
+        return IdentityBackend()
+    raise ValueError(f"Backend di traduzione sconosciuto: {name}")
+
+
+class Translator:
+    def __init__(self, backend=None, cache=None):
+        self.backend = backend or create_translation_backend()
+        self.cache = cache
+
+    def translate(self, text):
+        # Il testo già in inglese non richiede traduzione
+        if detect_language(text) == 'en':
+            return text
+        if self.cache is not None:
+            cached = self.cache.get(text, self.backend.name)
+            record_cache('translation', cached is not None)
+            if cached is not None:
+                return cached
+        try:
+            translated = self.backend.translate(text)
+        except Exception as e:
+            print(f"Errore nella traduzione: {e}")
+            return text
+        if translated and self.cache is not None:
+            self.cache.set(text, self.backend.name, translated)
+        return translated or text
+
+
+_translator_instance = None
+_translator_lock = threading.Lock()
+
+def get_translator():
+    global _translator_instance
+    if _translator_instance is None:
+        with _translator_lock:
+            if _translator_instance is None:
+                cache = TranslationCache(Config.TRANSLATION_CACHE_PATH) if Config.TRANSLATION_CACHE_PATH else None
+                _translator_instance = Translator(cache=cache)
+    return _translator_instance
+
+def translate_to_english(text):
+    return get_translator().translate(text)
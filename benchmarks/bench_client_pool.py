@@ -0,0 +1,122 @@
+"""
+Risparmio di handshake TCP/TLS riutilizzando i client Spotify del pool.
+
+Avvia un server locale che imita l'endpoint /v1/me e confronta un client
+spotipy nuovo per ogni richiesta (comportamento storico) con i client del
+SpotifyClientPool che condividono connessioni keep-alive.
+
+Uso:
+    python -m benchmarks.bench_client_pool --requests 500 --concurrency 8 [--tls]
+"""
+import argparse
+import json
+import os
+import ssl
+import subprocess
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import spotipy
+
+from app.services.spotify_client_pool import SpotifyClientPool
+from benchmarks.common import percentile
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    # Evita il ritardo Nagle/delayed-ACK tra header e body sulle connessioni keep-alive
+    disable_nagle_algorithm = True
+    connections = 0
+    _lock = threading.Lock()
+
+    def setup(self):
+        super().setup()
+        with _Handler._lock:
+            _Handler.connections += 1
+
+    def do_GET(self):
+        body = json.dumps({'id': 'bench-user', 'display_name': 'Bench'}).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def start_server(tls_dir=None):
+    server = ThreadingHTTPServer(('127.0.0.1', 0), _Handler)
+    scheme, cert = 'http', None
+    if tls_dir:
+        cert, key = os.path.join(tls_dir, 'cert.pem'), os.path.join(tls_dir, 'key.pem')
+        subprocess.run(['openssl', 'req', '-x509', '-newkey', 'rsa:2048', '-nodes', '-days', '1',
+                        '-subj', '/CN=127.0.0.1', '-addext', 'subjectAltName=IP:127.0.0.1',
+                        '-keyout', key, '-out', cert],
+                       check=True, capture_output=True)
+        context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+        context.load_cert_chain(cert, key)
+        server.socket = context.wrap_socket(server.socket, server_side=True)
+        scheme = 'https'
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"{scheme}://127.0.0.1:{server.server_address[1]}/v1/", cert
+
+
+def run(make_client, total, concurrency, tokens):
+    latencies = []
+    lock = threading.Lock()
+
+    def one(i):
+        start = time.perf_counter()
+        make_client(tokens[i % len(tokens)]).current_user()
+        elapsed = time.perf_counter() - start
+        with lock:
+            latencies.append(elapsed)
+
+    _Handler.connections = 0
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        list(executor.map(one, range(total)))
+    elapsed = time.perf_counter() - start
+    return total / elapsed, percentile(latencies, 50) * 1000, percentile(latencies, 99) * 1000, _Handler.connections
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--requests', type=int, default=500)
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--users', type=int, default=20, help='token distinti simulati')
+    parser.add_argument('--tls', action='store_true', help='usa HTTPS con un certificato autofirmato (richiede openssl)')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        server, prefix, cert = start_server(tmp if args.tls else None)
+        tokens = [f'token-{n}' for n in range(args.users)]
+
+        def trust_local_cert(session):
+            if cert:
+                session.verify = cert
+                session.trust_env = False
+
+        def fresh_client(token):
+            client = spotipy.Spotify(auth=token)
+            client.prefix = prefix
+            trust_local_cert(client._session)
+            return client
+
+        pool = SpotifyClientPool(pool_maxsize=args.concurrency, api_prefix=prefix)
+        trust_local_cert(pool.session)
+
+        print(f"{'modalità':<22} {'req/s':>8} {'p50 ms':>8} {'p99 ms':>8} {'connessioni':>12}")
+        for label, factory in (('client nuovo', fresh_client), ('pool condiviso', pool.client_for_token)):
+            rps, p50, p99, connections = run(factory, args.requests, args.concurrency, tokens)
+            print(f"{label:<22} {rps:>8.0f} {p50:>8.2f} {p99:>8.2f} {connections:>12}")
+        server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
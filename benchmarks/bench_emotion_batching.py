@@ -0,0 +1,73 @@
+"""
+Throughput vs latenza dell'inferenza emozioni al variare della dimensione del batch.
+
+Uso:
+    python -m benchmarks.bench_emotion_batching --batch-sizes 1 4 8 16 32 --concurrency 32
+"""
+import argparse
+import statistics
+import threading
+import time
+
+from app.services.emotion_batcher import EmotionBatcher
+from app.services.mood_analysis import MoodAnalysisService
+from benchmarks.common import SAMPLE_TEXTS, percentile
+
+
+def run_level(service, batch_size, window_ms, concurrency, requests_per_client):
+    if batch_size > 1:
+        batcher = EmotionBatcher(service._classify_batch, max_batch_size=batch_size, max_wait_ms=window_ms)
+        analyze = batcher.submit
+    else:
+        analyze = lambda text: service._classify_batch([text])[0]
+
+    latencies = []
+    lock = threading.Lock()
+
+    def client(offset):
+        local = []
+        for i in range(requests_per_client):
+            text = SAMPLE_TEXTS[(offset + i) % len(SAMPLE_TEXTS)]
+            start = time.perf_counter()
+            analyze(text)
+            local.append(time.perf_counter() - start)
+        with lock:
+            latencies.extend(local)
+
+    threads = [threading.Thread(target=client, args=(n,)) for n in range(concurrency)]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - start
+    return {
+        'throughput': len(latencies) / elapsed,
+        'p50_ms': percentile(latencies, 50) * 1000,
+        'p99_ms': percentile(latencies, 99) * 1000,
+        'mean_ms': statistics.mean(latencies) * 1000,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--batch-sizes', type=int, nargs='+', default=[1, 2, 4, 8, 16, 32])
+    parser.add_argument('--window-ms', type=float, default=10.0)
+    parser.add_argument('--concurrency', type=int, default=32)
+    parser.add_argument('--requests', type=int, default=8, help='richieste per client')
+    args = parser.parse_args()
+
+    service = MoodAnalysisService()
+    # Warm-up: il primo forward pass include l'allocazione dei buffer
+    service._classify_batch(SAMPLE_TEXTS)
+
+    print(f"concorrenza={args.concurrency} finestra={args.window_ms}ms richieste/client={args.requests}")
+    print(f"{'batch':>6} {'req/s':>9} {'p50 ms':>9} {'p99 ms':>9} {'media ms':>9}")
+    for batch_size in args.batch_sizes:
+        stats = run_level(service, batch_size, args.window_ms, args.concurrency, args.requests)
+        print(f"{batch_size:>6} {stats['throughput']:>9.1f} {stats['p50_ms']:>9.1f} "
+              f"{stats['p99_ms']:>9.1f} {stats['mean_ms']:>9.1f}")
+
+
+if __name__ == '__main__':
+    main()
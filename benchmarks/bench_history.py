@@ -0,0 +1,79 @@
+"""
+Storico delle raccomandazioni: set globale di ID vs filtri di Bloom a rotazione per utente.
+Misura la memoria per utente (tracemalloc), il tempo di filtro e il tasso di falsi positivi.
+
+Uso:
+    python -m benchmarks.bench_history --users 1000 --tracks-per-user 500
+"""
+import argparse
+import random
+import time
+import tracemalloc
+
+from app.models.track import Track
+from app.utils.cache_manager import RecommendationHistory
+
+
+def make_tracks(rng, n):
+    return [Track(''.join(rng.choices('0123456789abcdefABCDEF', k=22))) for _ in range(n)]
+
+
+def measure(build):
+    # Tempo e memoria in due passate: tracemalloc rallenta molto le allocazioni
+    start = time.perf_counter()
+    build()
+    elapsed = time.perf_counter() - start
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    obj = build()
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    used = sum(stat.size_diff for stat in after.compare_to(before, 'filename'))
+    return obj, used, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, default=1000)
+    parser.add_argument('--tracks-per-user', type=int, default=500)
+    parser.add_argument('--probe', type=int, default=10000, help='tracce mai consigliate per stimare i falsi positivi')
+    parser.add_argument('--fp-rate', type=float, default=0.01)
+    args = parser.parse_args()
+
+    rng = random.Random(42)
+    users = {f'user{u}': make_tracks(rng, args.tracks_per_user) for u in range(args.users)}
+    probe = make_tracks(rng, args.probe)
+
+    def build_sets():
+        history = {}
+        for user_id, tracks in users.items():
+            history[user_id] = {t.id for t in tracks}
+        return history
+
+    def build_bloom():
+        history = RecommendationHistory(tracks_per_bucket=args.tracks_per_user, false_positive_rate=args.fp_rate,
+                                        max_users=args.users)
+        for user_id, tracks in users.items():
+            history.filter_new(user_id, tracks)
+        return history
+
+    sets, set_bytes, set_s = measure(build_sets)
+    bloom, bloom_bytes, bloom_s = measure(build_bloom)
+
+    # Stessa sessione (stessa finestra): nessuna traccia già vista deve passare il filtro
+    sample = list(users)[:min(50, args.users)]
+    leaked = sum(len(bloom.filter_new(u, users[u])) for u in sample)
+    false_positives = args.probe - len(bloom.filter_new(sample[0], probe))
+
+    print(f"utenti: {args.users}, tracce per utente: {args.tracks_per_user}")
+    print(f"{'struttura':>12} {'KB/utente':>10} {'totale MB':>10} {'inserimento s':>14}")
+    print(f"{'set':>12} {set_bytes / args.users / 1024:>10.1f} {set_bytes / 2**20:>10.1f} {set_s:>14.2f}")
+    print(f"{'bloom':>12} {bloom_bytes / args.users / 1024:>10.1f} {bloom_bytes / 2**20:>10.1f} {bloom_s:>14.2f}")
+    print(f"bit per utente (nominali): {bloom.memory_per_user()} byte su {bloom.buckets} finestre, {bloom.hashes} hash")
+    print(f"falsi positivi: {false_positives}/{args.probe} ({false_positives / args.probe:.2%}, obiettivo {args.fp_rate:.2%})")
+    print(f"tracce già consigliate non filtrate: {leaked}")
+    return 1 if leaked else 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
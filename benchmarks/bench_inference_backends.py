@@ -0,0 +1,116 @@
+"""
+Confronto tra i backend di inferenza emozioni: parità dei punteggi, latenza e memoria.
+
+Ogni backend viene caricato in un sottoprocesso separato, così la RSS misurata
+riflette solo quel backend. Il processo termina con codice 1 se un backend
+diverge dalla pipeline transformers oltre la tolleranza indicata.
+
+Uso:
+    python -m benchmarks.bench_inference_backends --backends transformers onnx-fp32 onnx-int8
+"""
+import argparse
+import json
+import subprocess
+import sys
+import time
+
+from benchmarks.common import SAMPLE_TEXTS, current_rss_mb, peak_rss_mb, percentile
+
+
+def build_backend(variant):
+    from app.config import Config
+    from app.services.inference_backends import OnnxBackend, TransformersBackend
+
+    if variant == 'transformers':
+        return TransformersBackend(Config.EMOTION_MODEL)
+    if variant == 'onnx-fp32':
+        return OnnxBackend(Config.EMOTION_MODEL, Config.EMOTION_ONNX_DIR, quantize=False)
+    if variant == 'onnx-int8':
+        return OnnxBackend(Config.EMOTION_MODEL, Config.EMOTION_ONNX_DIR, quantize=True)
+    raise ValueError(f"Variante sconosciuta: {variant}")
+
+
+def run_worker(variant, iterations):
+    rss_before = current_rss_mb()
+    load_start = time.perf_counter()
+    backend = build_backend(variant)
+    load_s = time.perf_counter() - load_start
+    scores = backend.classify(SAMPLE_TEXTS)
+
+    single = []
+    for i in range(iterations):
+        start = time.perf_counter()
+        backend.classify([SAMPLE_TEXTS[i % len(SAMPLE_TEXTS)]])
+        single.append(time.perf_counter() - start)
+    batched = []
+    for _ in range(max(1, iterations // len(SAMPLE_TEXTS))):
+        start = time.perf_counter()
+        backend.classify(SAMPLE_TEXTS)
+        batched.append(time.perf_counter() - start)
+
+    print(json.dumps({
+        'variant': variant,
+        'load_s': load_s,
+        'rss_mb': current_rss_mb() - rss_before,
+        'peak_rss_mb': peak_rss_mb(),
+        'p50_ms': percentile(single, 50) * 1000,
+        'p99_ms': percentile(single, 99) * 1000,
+        'batch_ms': percentile(batched, 50) * 1000,
+        'scores': scores,
+    }))
+
+
+def compare(reference, candidate, tolerance):
+    max_diff = 0.0
+    label_mismatches = 0
+    for ref, cand in zip(reference, candidate):
+        if max(ref, key=ref.get) != max(cand, key=cand.get):
+            label_mismatches += 1
+        for label, score in ref.items():
+            max_diff = max(max_diff, abs(score - cand.get(label, 0.0)))
+    return max_diff, label_mismatches
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--backends', nargs='+', default=['transformers', 'onnx-fp32', 'onnx-int8'])
+    parser.add_argument('--iterations', type=int, default=64)
+    parser.add_argument('--tolerance', type=float, default=0.05,
+                        help='differenza massima ammessa per punteggio rispetto a transformers')
+    parser.add_argument('--worker', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        run_worker(args.worker, args.iterations)
+        return
+
+    results = {}
+    for variant in args.backends:
+        output = subprocess.run(
+            [sys.executable, '-m', 'benchmarks.bench_inference_backends',
+             '--worker', variant, '--iterations', str(args.iterations)],
+            check=True, capture_output=True, text=True
+        ).stdout
+        results[variant] = json.loads(output.strip().splitlines()[-1])
+
+    print(f"{'backend':>12} {'load s':>8} {'RSS MB':>8} {'peak MB':>8} {'p50 ms':>8} {'p99 ms':>8} {'batch8 ms':>10}")
+    for variant, res in results.items():
+        print(f"{variant:>12} {res['load_s']:>8.2f} {res['rss_mb']:>8.0f} {res['peak_rss_mb']:>8.0f} "
+              f"{res['p50_ms']:>8.1f} {res['p99_ms']:>8.1f} {res['batch_ms']:>10.1f}")
+
+    failed = False
+    reference = results.get('transformers')
+    if reference:
+        for variant, res in results.items():
+            if variant == 'transformers':
+                continue
+            max_diff, mismatches = compare(reference['scores'], res['scores'], args.tolerance)
+            ok = max_diff <= args.tolerance and mismatches == 0
+            failed = failed or not ok
+            print(f"parità {variant}: diff max {max_diff:.4f}, etichette dominanti diverse {mismatches} "
+                  f"-> {'OK' if ok else 'FALLITA'}")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
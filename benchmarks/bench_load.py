@@ -0,0 +1,170 @@
+"""
+Test di carico end-to-end di /recommend e /user_recap contro un fake Spotify locale.
+
+Avvia benchmarks.fake_spotify (latenza, errori 5xx e 429 configurabili) e l'app di
+produzione sotto gunicorn con TRANSLATION_BACKEND=none e SPOTIFY_API_PREFIX verso il
+fake; ogni client virtuale ha la propria sessione (utente diverso) e invia richieste
+per `--duration` secondi. Per ogni livello di concorrenza riporta throughput, percentili
+di latenza, errori e le chiamate ricevute dal fake Spotify.
+
+Uso:
+    python -m benchmarks.bench_load --concurrency 1 8 32 --duration 20 --latency-ms 40 --rate-limit-rate 0.01
+"""
+import argparse
+import itertools
+import os
+import signal
+import subprocess
+import sys
+import threading
+import time
+from collections import Counter
+
+import requests
+
+from benchmarks.bench_prefork import wait_ready
+from benchmarks.common import SAMPLE_TEXTS, percentile
+
+
+def _session():
+    session = requests.Session()
+    session.trust_env = False  # niente proxy di sistema verso localhost
+    return session
+
+
+def fake_stats(fake_url):
+    try:
+        return Counter(_session().get(f'{fake_url}/_stats', timeout=5).json())
+    except requests.RequestException:
+        return Counter()
+
+
+def start_fake(args):
+    command = [sys.executable, '-m', 'benchmarks.fake_spotify', '--port', str(args.fake_port),
+               '--latency-ms', str(args.latency_ms), '--jitter-ms', str(args.jitter_ms),
+               '--error-rate', str(args.error_rate), '--rate-limit-rate', str(args.rate_limit_rate),
+               '--retry-after', str(args.retry_after)]
+    process = subprocess.Popen(command, stdout=subprocess.DEVNULL)
+    fake_url = f'http://127.0.0.1:{args.fake_port}'
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        try:
+            _session().get(f'{fake_url}/_stats', timeout=1)
+            return process, fake_url
+        except requests.RequestException:
+            time.sleep(0.2)
+    process.terminate()
+    raise RuntimeError("Il fake Spotify non risponde")
+
+
+def start_app(args, fake_url):
+    env = dict(
+        os.environ,
+        WEB_WORKERS=str(args.workers), WEB_THREADS=str(args.threads), WEB_BIND=f'127.0.0.1:{args.port}',
+        SPOTIFY_API_PREFIX=f'{fake_url}/v1/', TRANSLATION_BACKEND='none', RECOMMEND_STREAMING='0',
+        SPOTIFY_CLIENT_ID=os.environ.get('SPOTIFY_CLIENT_ID', 'bench'),
+        SPOTIFY_CLIENT_SECRET=os.environ.get('SPOTIFY_CLIENT_SECRET', 'bench'),
+        SPOTIFY_REDIRECT_URI=os.environ.get('SPOTIFY_REDIRECT_URI', 'http://127.0.0.1/callback')
+    )
+    return subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py', '--access-logfile', os.devnull,
+         'benchmarks.loadtest_app:app'],
+        env=env, stdout=subprocess.DEVNULL, stderr=None if args.verbose else subprocess.DEVNULL
+    )
+
+
+def load(url, scenario, concurrency, duration, users, refresh):
+    latencies, errors = [], Counter()
+    counter = itertools.count()
+    lock = threading.Lock()
+    deadline = time.monotonic() + duration
+
+    def request(session, i):
+        if scenario == 'recommend':
+            # Testi unici: nessun hit della cache delle emozioni
+            text = f"{SAMPLE_TEXTS[i % len(SAMPLE_TEXTS)]} #{i}"
+            return session.post(f'{url}/recommend', data={'user_input': text}, timeout=60, allow_redirects=False)
+        params = {'refresh': '1'} if refresh else None
+        return session.get(f'{url}/user_recap', params=params, timeout=60, allow_redirects=False)
+
+    def client(index):
+        session = _session()
+        session.get(f'{url}/_bench/login/u{index % users}', timeout=10)
+        while time.monotonic() < deadline:
+            i = next(counter)
+            start = time.perf_counter()
+            try:
+                status = request(session, i).status_code
+            except requests.RequestException as e:
+                status = type(e).__name__
+            elapsed = time.perf_counter() - start
+            with lock:
+                if status == 200:
+                    latencies.append(elapsed)
+                else:
+                    errors[status] += 1
+
+    threads = [threading.Thread(target=client, args=(n,)) for n in range(concurrency)]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return latencies, errors, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--scenarios', nargs='+', choices=['recommend', 'user_recap'], default=['recommend', 'user_recap'])
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 8, 32])
+    parser.add_argument('--duration', type=float, default=20.0)
+    parser.add_argument('--users', type=int, default=50, help='utenti distinti simulati')
+    parser.add_argument('--refresh', action='store_true', help='/user_recap?refresh=1: salta la cache del profilo')
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--port', type=int, default=5098)
+    parser.add_argument('--fake-port', type=int, default=8900)
+    parser.add_argument('--latency-ms', type=float, default=40.0)
+    parser.add_argument('--jitter-ms', type=float, default=10.0)
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    parser.add_argument('--rate-limit-rate', type=float, default=0.0)
+    parser.add_argument('--retry-after', type=int, default=1)
+    parser.add_argument('--startup-timeout', type=float, default=300.0)
+    parser.add_argument('--verbose', action='store_true', help="mostra l'output di gunicorn")
+    args = parser.parse_args()
+
+    fake, fake_url = start_fake(args)
+    master = start_app(args, fake_url)
+    url = f'http://127.0.0.1:{args.port}'
+    try:
+        if not wait_ready(url, args.startup_timeout):
+            print(f"Server non pronto entro {args.startup_timeout}s")
+            return
+        print(f"worker={args.workers} thread={args.threads} latenza Spotify={args.latency_ms}±{args.jitter_ms} ms "
+              f"errori={args.error_rate} 429={args.rate_limit_rate}")
+        print(f"{'scenario':>11} {'conc':>5} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} "
+              f"{'errori':>7} {'chiamate API':>13} {'429':>5}")
+        for scenario in args.scenarios:
+            load(url, scenario, 1, min(2.0, args.duration), args.users, args.refresh)  # riscaldamento
+            for concurrency in args.concurrency:
+                before = fake_stats(fake_url)
+                latencies, errors, elapsed = load(url, scenario, concurrency, args.duration, args.users, args.refresh)
+                calls = fake_stats(fake_url) - before
+                p = [percentile(latencies, q) * 1000 if latencies else float('nan') for q in (50, 95, 99)]
+                rate_limited = sum(n for key, n in calls.items() if key.endswith(' 429'))
+                print(f"{scenario:>11} {concurrency:>5} {len(latencies) / elapsed:>8.1f} {p[0]:>8.1f} {p[1]:>8.1f} "
+                      f"{p[2]:>8.1f} {sum(errors.values()):>7} {sum(calls.values()):>13} {rate_limited:>5}")
+                if errors:
+                    print(f"{'':>11} errori: {dict(errors)}")
+    finally:
+        master.send_signal(signal.SIGTERM)
+        try:
+            master.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            master.kill()
+        fake.terminate()
+        fake.wait()
+
+
+if __name__ == '__main__':
+    main()
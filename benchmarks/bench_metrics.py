@@ -0,0 +1,55 @@
+"""
+Costo della strumentazione: tempo per osservazione di istogrammi e contatori,
+per fase misurata con stage_timer e per la generazione di /metrics.
+
+Uso:
+    python -m benchmarks.bench_metrics --iterations 200000
+"""
+import argparse
+import time
+
+from app.utils.metrics import MetricsRegistry, record_cache, stage_timer
+
+
+def per_call_ns(fn, iterations):
+    start = time.perf_counter()
+    for _ in range(iterations):
+        fn()
+    return (time.perf_counter() - start) / iterations * 1e9
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--iterations', type=int, default=200000)
+    parser.add_argument('--series', type=int, default=200, help='serie per la misura di render()')
+    args = parser.parse_args()
+
+    registry = MetricsRegistry()
+    histogram = registry.histogram('bench_seconds', 'bench', ('endpoint',))
+    counter = registry.counter('bench_total', 'bench', ('endpoint', 'status'))
+
+    def timed_stage():
+        with stage_timer('bench'):
+            pass
+
+    baseline = per_call_ns(lambda: None, args.iterations)
+    print(f"{'operazione':>22} {'ns/chiamata':>12}")
+    for name, fn in (
+        ('Histogram.observe', lambda: histogram.observe(0.012, 'search')),
+        ('Counter.inc', lambda: counter.inc('search', 'ok')),
+        ('record_cache', lambda: record_cache('bench', True)),
+        ('stage_timer', timed_stage),
+    ):
+        print(f"{name:>22} {per_call_ns(fn, args.iterations) - baseline:>12.0f}")
+
+    for i in range(args.series):
+        histogram.observe(0.01 * (i % 50), f'endpoint_{i}')
+        counter.inc(f'endpoint_{i}', 'ok')
+    start = time.perf_counter()
+    text = registry.render()
+    elapsed = time.perf_counter() - start
+    print(f"render() con {args.series} serie: {elapsed * 1000:.2f} ms, {len(text) / 1024:.0f} KB")
+
+
+if __name__ == '__main__':
+    main()
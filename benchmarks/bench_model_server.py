@@ -0,0 +1,155 @@
+"""
+Inferenza in-process vs model server dedicato su socket Unix.
+
+Simula `--web-workers` processi web, ciascuno con `concurrency / web-workers` thread
+che analizzano testi tramite EmotionBatcher (come MoodAnalysisService). In-process ogni
+worker carica il proprio modello; in remoto i worker usano RemoteBackend e il modello
+vive solo nei processi del model server. La RSS totale somma worker e server.
+
+Uso:
+    python -m benchmarks.bench_model_server --concurrency 4 16 64 --web-workers 2 --server-processes 1
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+from app.config import Config
+from app.services.emotion_batcher import EmotionBatcher
+from app.services.inference_backends import RemoteBackend, create_backend, server_socket_paths
+from benchmarks.common import SAMPLE_TEXTS, current_rss_mb, percentile
+
+
+def worker(mode, threads, requests_per_thread, socket_path, server_processes):
+    """Processo web simulato: stampa 'ready', attende 'go' su stdin e poi le latenze in JSON."""
+    if mode == 'remote':
+        backend = RemoteBackend(socket_path, processes=server_processes, timeout=60)
+    else:
+        backend = create_backend(Config.MODEL_SERVER_BACKEND)
+    batcher = EmotionBatcher(backend.classify, max_batch_size=Config.EMOTION_BATCH_SIZE,
+                             max_wait_ms=Config.EMOTION_BATCH_WINDOW_MS)
+    batcher.submit(SAMPLE_TEXTS[0])
+    print('ready', flush=True)
+    sys.stdin.readline()
+
+    latencies = []
+    lock = threading.Lock()
+
+    def client(offset):
+        local = []
+        for i in range(requests_per_thread):
+            start = time.perf_counter()
+            batcher.submit(SAMPLE_TEXTS[(offset + i) % len(SAMPLE_TEXTS)])
+            local.append(time.perf_counter() - start)
+        with lock:
+            latencies.extend(local)
+
+    pool = [threading.Thread(target=client, args=(n,)) for n in range(threads)]
+    for t in pool:
+        t.start()
+    for t in pool:
+        t.join()
+    print(json.dumps({'latencies': latencies, 'rss_mb': current_rss_mb()}), flush=True)
+
+
+def _children(pid):
+    found = []
+    for entry in os.listdir('/proc'):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f'/proc/{entry}/stat') as f:
+                ppid = int(f.read().rsplit(')', 1)[1].split()[1])
+        except (OSError, IndexError, ValueError):
+            continue
+        if ppid == pid:
+            found.append(int(entry))
+    return found
+
+
+def start_server(socket_path, processes, threads, cpus):
+    command = [sys.executable, '-m', 'app.services.model_server', '--socket', socket_path,
+               '--processes', str(processes), '--threads', str(threads), '--cpus', cpus]
+    server = subprocess.Popen(command, stdout=subprocess.DEVNULL)
+    deadline = time.time() + 300
+    while time.time() < deadline and server.poll() is None:
+        try:
+            for path in server_socket_paths(socket_path, processes):
+                RemoteBackend(path, processes=1, timeout=5)
+            return server
+        except OSError:
+            time.sleep(0.2)
+    server.terminate()
+    raise RuntimeError("Il model server non risponde")
+
+
+def run(mode, concurrency, web_workers, requests_per_thread, socket_path, server_processes):
+    threads = max(1, concurrency // web_workers)
+    command = [sys.executable, '-m', 'benchmarks.bench_model_server', '--worker', mode,
+               '--threads', str(threads), '--requests', str(requests_per_thread),
+               '--socket', socket_path, '--server-processes', str(server_processes)]
+    procs = [subprocess.Popen(command, stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True)
+             for _ in range(web_workers)]
+    for proc in procs:
+        if proc.stdout.readline().strip() != 'ready':
+            raise RuntimeError(f"Worker {mode} non avviato")
+    start = time.perf_counter()
+    for proc in procs:
+        proc.stdin.write('go\n')
+        proc.stdin.flush()
+    reports = [json.loads(proc.stdout.readline()) for proc in procs]
+    elapsed = time.perf_counter() - start
+    for proc in procs:
+        proc.wait()
+    latencies = [value for report in reports for value in report['latencies']]
+    return {
+        'throughput': len(latencies) / elapsed,
+        'p50_ms': percentile(latencies, 50) * 1000,
+        'p99_ms': percentile(latencies, 99) * 1000,
+        'workers_rss_mb': sum(report['rss_mb'] for report in reports),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 4, 16, 64])
+    parser.add_argument('--web-workers', type=int, default=2)
+    parser.add_argument('--server-processes', type=int, default=1)
+    parser.add_argument('--server-threads', type=int, default=Config.MODEL_SERVER_THREADS)
+    parser.add_argument('--server-cpus', default=Config.MODEL_SERVER_CPUS)
+    parser.add_argument('--requests', type=int, default=20, help='richieste per thread')
+    parser.add_argument('--worker', choices=['inprocess', 'remote'], help=argparse.SUPPRESS)
+    parser.add_argument('--threads', type=int, default=1, help=argparse.SUPPRESS)
+    parser.add_argument('--socket', default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        worker(args.worker, args.threads, args.requests, args.socket, args.server_processes)
+        return
+
+    socket_path = os.path.join(tempfile.mkdtemp(prefix='model-server-'), 'emotion.sock')
+    server = start_server(socket_path, args.server_processes, args.server_threads, args.server_cpus)
+    try:
+        print(f"web worker={args.web_workers} processi server={args.server_processes} "
+              f"backend={Config.MODEL_SERVER_BACKEND} richieste/thread={args.requests}")
+        print(f"{'modalità':>10} {'conc':>5} {'req/s':>8} {'p50 ms':>8} {'p99 ms':>8} {'RSS tot MB':>11}")
+        for concurrency in args.concurrency:
+            for mode in ('inprocess', 'remote'):
+                stats = run(mode, concurrency, args.web_workers, args.requests, socket_path, args.server_processes)
+                total_rss = stats['workers_rss_mb']
+                if mode == 'remote':
+                    pids = [server.pid] + _children(server.pid)
+                    total_rss += sum(current_rss_mb(pid) for pid in pids)
+                print(f"{mode:>10} {concurrency:>5} {stats['throughput']:>8.1f} {stats['p50_ms']:>8.1f} "
+                      f"{stats['p99_ms']:>8.1f} {total_rss:>11.0f}")
+    finally:
+        server.terminate()
+        server.wait()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,151 @@
+"""
+Serving prefork: memoria per worker e richieste/s con N worker gunicorn.
+
+Avvia `gunicorn -c gunicorn.conf.py benchmarks.prefork_app:app` per ogni N,
+misura RSS, PSS e USS di ogni worker (/proc/<pid>/smaps_rollup: PSS e USS mostrano
+quanto del modello è condiviso copy-on-write) e poi genera carico sulla route di
+inferenza con testi unici (nessun hit della cache delle emozioni).
+
+Uso:
+    python -m benchmarks.bench_prefork --workers 1 2 4 8 --threads 4 --duration 20
+"""
+import argparse
+import itertools
+import os
+import signal
+import subprocess
+import sys
+import threading
+import time
+
+import requests
+
+from benchmarks.common import SAMPLE_TEXTS, current_rss_mb, percentile
+
+
+def children_of(pid):
+    pids = []
+    for entry in os.listdir('/proc'):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f'/proc/{entry}/stat') as f:
+                # Il nome del processo può contenere spazi: i campi seguono l'ultima ')'
+                ppid = int(f.read().rsplit(')', 1)[1].split()[1])
+        except (OSError, IndexError, ValueError):
+            continue
+        if ppid == pid:
+            pids.append(int(entry))
+    return pids
+
+
+def memory_mb(pid):
+    values = {}
+    with open(f'/proc/{pid}/smaps_rollup') as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) >= 2 and parts[1].isdigit():
+                values[parts[0].rstrip(':')] = int(parts[1]) / 1024
+    uss = values.get('Private_Clean', 0) + values.get('Private_Dirty', 0)
+    return current_rss_mb(pid), values.get('Pss', 0), uss
+
+
+def _session():
+    session = requests.Session()
+    session.trust_env = False  # niente proxy di sistema verso localhost
+    return session
+
+
+def wait_ready(url, timeout):
+    session = _session()
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if session.get(f'{url}/readyz', timeout=1).status_code == 200:
+                return True
+        except requests.RequestException:
+            pass
+        time.sleep(0.5)
+    return False
+
+
+def load(url, concurrency, duration):
+    latencies, errors = [], []
+    counter = itertools.count()
+    lock = threading.Lock()
+    deadline = time.monotonic() + duration
+
+    def client():
+        session = _session()
+        while time.monotonic() < deadline:
+            i = next(counter)
+            text = f"{SAMPLE_TEXTS[i % len(SAMPLE_TEXTS)]} #{i}"
+            start = time.perf_counter()
+            try:
+                response = session.post(f'{url}/_bench/analyze', data=text.encode('utf-8'), timeout=30)
+                ok = response.status_code == 200
+            except requests.RequestException:
+                ok = False
+            elapsed = time.perf_counter() - start
+            with lock:
+                (latencies if ok else errors).append(elapsed)
+
+    threads = [threading.Thread(target=client) for _ in range(concurrency)]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return latencies, errors, time.perf_counter() - start
+
+
+def run(n_workers, args):
+    port = args.port
+    url = f'http://127.0.0.1:{port}'
+    env = dict(os.environ, WEB_WORKERS=str(n_workers), WEB_THREADS=str(args.threads),
+               WEB_BIND=f'127.0.0.1:{port}', TRANSLATION_BACKEND='none')
+    master = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py', '--access-logfile', os.devnull, 'benchmarks.prefork_app:app'],
+        env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    try:
+        if not wait_ready(url, args.startup_timeout):
+            print(f"{n_workers:>3}  server non pronto entro {args.startup_timeout}s")
+            return
+        load(url, args.concurrency, min(2.0, args.duration))  # riscaldamento
+        latencies, errors, elapsed = load(url, args.concurrency, args.duration)
+        workers = children_of(master.pid)
+        mem = [memory_mb(pid) for pid in workers]
+        master_rss = current_rss_mb(master.pid)
+        avg = [sum(m[i] for m in mem) / max(1, len(mem)) for i in range(3)]
+        total_pss = sum(m[1] for m in mem) + memory_mb(master.pid)[1]
+        p50 = percentile(latencies, 50) * 1000 if latencies else float('nan')
+        p99 = percentile(latencies, 99) * 1000 if latencies else float('nan')
+        print(f"{n_workers:>3} {len(latencies) / elapsed:>8.1f} {p50:>8.1f} {p99:>8.1f} {len(errors):>6} "
+              f"{avg[0]:>9.0f} {avg[1]:>9.0f} {avg[2]:>9.0f} {master_rss:>10.0f} {total_pss:>10.0f}")
+    finally:
+        master.send_signal(signal.SIGTERM)
+        try:
+            master.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            master.kill()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4, 8])
+    parser.add_argument('--threads', type=int, default=4)
+    parser.add_argument('--concurrency', type=int, default=32)
+    parser.add_argument('--duration', type=float, default=20.0)
+    parser.add_argument('--port', type=int, default=5099)
+    parser.add_argument('--startup-timeout', type=float, default=300.0)
+    args = parser.parse_args()
+
+    print(f"{'N':>3} {'req/s':>8} {'p50 ms':>8} {'p99 ms':>8} {'errori':>6} "
+          f"{'RSS/w MB':>9} {'PSS/w MB':>9} {'USS/w MB':>9} {'master MB':>10} {'PSS tot':>10}")
+    for n in args.workers:
+        run(n, args)
+
+
+if __name__ == '__main__':
+    main()
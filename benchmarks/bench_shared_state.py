@@ -0,0 +1,130 @@
+"""
+Verifica multi-worker dello stato condiviso senza Redis: token di sessione e job delle playlist.
+
+Avvia benchmarks.fake_spotify e l'app di produzione sotto gunicorn con più worker,
+senza REDIS_URL e con HOST_STORE_PATH in una cartella temporanea. Dopo un solo login
+invia richieste con `Connection: close`, così ogni richiesta può arrivare a un worker
+diverso: /user_recap, il polling di /playlist_status (dal proprietario e da un altro
+utente) devono dare lo stesso esito su tutti i worker.
+
+Uso:
+    python -m benchmarks.bench_shared_state --workers 2 --requests 20
+"""
+import argparse
+import os
+import re
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter
+
+from benchmarks.bench_load import _session, start_app, start_fake
+from benchmarks.bench_prefork import wait_ready
+
+_JOB_RE = re.compile(r"pollPlaylist\('([0-9a-f]{32})'\)")
+_PID_RE = re.compile(r'pid="(\d+)"')
+
+
+def login(url, user):
+    session = _session()
+    # Nessuna connessione keep-alive: il bilanciamento tra i worker avviene a ogni richiesta
+    session.headers['Connection'] = 'close'
+    session.get(f'{url}/_bench/login/{user}', timeout=10)
+    return session
+
+
+def worker_pids(session, url, requests_count):
+    pids = set()
+    for _ in range(requests_count):
+        match = _PID_RE.search(session.get(f'{url}/metrics', timeout=10).text)
+        if match:
+            pids.add(match.group(1))
+    return pids
+
+
+def check(url, requests_count):
+    failures = []
+    owner = login(url, 'owner')
+    other = login(url, 'other')
+
+    pids = worker_pids(owner, url, requests_count)
+    print(f"worker distinti raggiunti: {len(pids)}")
+    if len(pids) < 2:
+        failures.append("le richieste non hanno raggiunto più di un worker")
+
+    recap = Counter(owner.get(f'{url}/user_recap', timeout=60, allow_redirects=False).status_code
+                    for _ in range(requests_count))
+    print(f"/user_recap dopo un solo login: {dict(recap)}")
+    if set(recap) != {200}:
+        failures.append("sessione non riconosciuta da tutti i worker")
+
+    page = owner.post(f'{url}/recommend', data={'user_input': 'I feel happy today'}, timeout=120)
+    match = _JOB_RE.search(page.text)
+    if match is None:
+        failures.append(f"nessun job di playlist nella pagina (stato {page.status_code})")
+        return failures
+    job_id = match.group(1)
+
+    polls, final = Counter(), None
+    for _ in range(requests_count):
+        response = owner.get(f'{url}/playlist_status/{job_id}', timeout=10)
+        polls[response.status_code] += 1
+        if response.status_code == 200:
+            final = response.json().get('status')
+        time.sleep(0.05)
+    print(f"/playlist_status dal proprietario: {dict(polls)}, ultimo stato: {final}")
+    if set(polls) != {200}:
+        failures.append("job non visibile da tutti i worker")
+
+    foreign = Counter(other.get(f'{url}/playlist_status/{job_id}', timeout=10).status_code
+                      for _ in range(requests_count))
+    print(f"/playlist_status da un altro utente: {dict(foreign)}")
+    if set(foreign) != {404}:
+        failures.append("job visibile a un utente diverso dal proprietario")
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--threads', type=int, default=4)
+    parser.add_argument('--requests', type=int, default=20)
+    parser.add_argument('--port', type=int, default=5097)
+    parser.add_argument('--fake-port', type=int, default=8901)
+    parser.add_argument('--startup-timeout', type=float, default=300.0)
+    parser.add_argument('--verbose', action='store_true', help="mostra l'output di gunicorn")
+    args = parser.parse_args()
+    # Parametri del fake Spotify attesi da start_fake: nessun errore iniettato
+    args.latency_ms, args.jitter_ms, args.error_rate, args.rate_limit_rate, args.retry_after = 5.0, 0.0, 0.0, 0.0, 1
+
+    tmp = tempfile.TemporaryDirectory()
+    os.environ.pop('REDIS_URL', None)
+    os.environ['HOST_STORE_PATH'] = os.path.join(tmp.name, 'shared_state.sqlite3')
+    fake, fake_url = start_fake(args)
+    master = start_app(args, fake_url)
+    url = f'http://127.0.0.1:{args.port}'
+    try:
+        if not wait_ready(url, args.startup_timeout):
+            print(f"Server non pronto entro {args.startup_timeout}s")
+            sys.exit(1)
+        failures = check(url, args.requests)
+    finally:
+        master.send_signal(signal.SIGTERM)
+        try:
+            master.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            master.kill()
+        fake.terminate()
+        fake.wait()
+        tmp.cleanup()
+
+    for failure in failures:
+        print(f"ERRORE: {failure}")
+    print('OK' if not failures else 'FALLITO')
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,72 @@
+"""
+Punteggio di similarità: ciclo Python con sorted() vs NumPy con argpartition,
+e RecommendationService._rank_by_mood (l'ordinamento delle tracce familiari di ogni richiesta).
+
+Uso:
+    python -m benchmarks.bench_similarity --sizes 50 1000 10000 50000 --k 30
+"""
+import argparse
+import random
+import time
+
+from app.models.track import Track
+from app.services.recommendation import RecommendationService
+from app.services.similarity import features_matrix, score_matrix, top_k_indices
+
+TARGET = {'target_valence': 0.25, 'target_energy': 0.3, 'target_danceability': 0.3, 'target_tempo': 90.0}
+
+
+def make_tracks(n):
+    rng = random.Random(42)
+    return [{
+        'id': f'track{i}',
+        'audio_features': {
+            'valence': rng.random(), 'energy': rng.random(), 'danceability': rng.random(),
+            'acousticness': rng.random(), 'tempo': rng.uniform(60, 200)
+        }
+    } for i in range(n)]
+
+
+def best_of(fn, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[50, 1000, 10000, 50000])
+    parser.add_argument('--k', type=int, default=30)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    service = RecommendationService.__new__(RecommendationService)
+    print(f"{'tracce':>8} {'ciclo ms':>10} {'numpy ms':>10} {'solo score ms':>14} {'speedup':>8} {'top-k uguale':>13} {'rank_by_mood ms':>16}")
+    for n in args.sizes:
+        tracks = make_tracks(n)
+
+        def loop():
+            return sorted(tracks, key=lambda t: service._track_similarity(t, TARGET), reverse=True)[:args.k]
+
+        def vectorized():
+            scores = score_matrix(features_matrix([t['audio_features'] for t in tracks]), TARGET)
+            return [tracks[i] for i in top_k_indices(scores, args.k)]
+
+        matrix = features_matrix([t['audio_features'] for t in tracks])
+        loop_s, loop_top = best_of(loop, args.repeat)
+        vec_s, vec_top = best_of(vectorized, args.repeat)
+        score_s, _ = best_of(lambda: top_k_indices(score_matrix(matrix, TARGET), args.k), args.repeat)
+        same = {t['id'] for t in loop_top} == {t['id'] for t in vec_top}
+        # Percorso delle richieste: oggetti Track e caratteristiche lette dall'archivio per ID
+        track_objects = [Track(t['id']) for t in tracks]
+        features = {t['id']: t['audio_features'] for t in tracks}
+        rank_s, _ = best_of(lambda: service._rank_by_mood(track_objects, features, TARGET), args.repeat)
+        print(f"{n:>8} {loop_s * 1000:>10.2f} {vec_s * 1000:>10.2f} {score_s * 1000:>14.3f} "
+              f"{loop_s / vec_s:>7.1f}x {str(same):>13} {rank_s * 1000:>16.2f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,63 @@
+"""
+Budget di cold start: tempo di import + create_app() e moduli pesanti caricati.
+
+Misura in un processo pulito quanto impiega l'app a essere pronta a servire
+richieste (senza attendere il modello) e verifica che torch/transformers/pandas
+non vengano importati sul percorso di avvio. Termina con codice 1 se il budget
+viene superato, così può essere usato come controllo di regressione.
+
+Uso:
+    python -m benchmarks.bench_startup --budget-ms 1500 [--wait-ready]
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+HEAVY_MODULES = ('torch', 'transformers', 'pandas', 'onnxruntime')
+
+PROBE = r"""
+import json, sys, time
+start = time.perf_counter()
+from app import create_app
+app = create_app()
+create_app_ms = (time.perf_counter() - start) * 1000
+heavy = [m for m in %(heavy)r if m in sys.modules]
+ready_ms = None
+if %(wait_ready)r:
+    from app.controllers.music_controller import mood_analysis_service
+    mood_analysis_service.warm_up(background=False)
+    ready_ms = (time.perf_counter() - start) * 1000
+print(json.dumps({'create_app_ms': create_app_ms, 'heavy_modules': heavy, 'ready_ms': ready_ms}))
+"""
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--budget-ms', type=float, default=1500.0)
+    parser.add_argument('--runs', type=int, default=3)
+    parser.add_argument('--wait-ready', action='store_true', help='misura anche il tempo fino al modello caricato')
+    args = parser.parse_args()
+
+    env = dict(os.environ, MODEL_LOADING='lazy')
+    probe = PROBE % {'heavy': HEAVY_MODULES, 'wait_ready': args.wait_ready}
+    samples = []
+    for _ in range(args.runs):
+        output = subprocess.run([sys.executable, '-c', probe], check=True, capture_output=True, text=True, env=env).stdout
+        samples.append(json.loads(output.strip().splitlines()[-1]))
+
+    best = min(s['create_app_ms'] for s in samples)
+    heavy = sorted({m for s in samples for m in s['heavy_modules']})
+    print(f"create_app(): migliore {best:.0f} ms su {args.runs} esecuzioni (budget {args.budget_ms:.0f} ms)")
+    if args.wait_ready:
+        print(f"modello pronto dopo: {min(s['ready_ms'] for s in samples):.0f} ms")
+    print(f"moduli pesanti importati all'avvio: {', '.join(heavy) or 'nessuno'}")
+
+    failed = best > args.budget_ms or bool(heavy)
+    print('OK' if not failed else 'BUDGET SUPERATO')
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,139 @@
+"""
+Memoria di un pool di tracce: JSON completo della Web API vs modello Track compatto.
+Le tracce sintetiche hanno la stessa forma delle risposte reali (available_markets,
+tre immagini per album, artisti annidati) e vengono decodificate da JSON come in spotipy.
+
+Uso:
+    python -m benchmarks.bench_track_memory --tracks 500
+"""
+import argparse
+import contextlib
+import io
+import json
+import random
+import time
+import tracemalloc
+
+from app.models.track import tracks_from_spotify
+from app.services.recommendation import RecommendationService
+
+MARKETS = [f'{a}{b}' for a in 'ABCDEFGHIJKLMNOPQRSTUVWXYZ' for b in 'ABCDEFG'][:180]
+
+
+def _id(rng):
+    return ''.join(rng.choices('0123456789abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ', k=22))
+
+
+def _artist(rng):
+    artist_id = _id(rng)
+    return {
+        'external_urls': {'spotify': f'https://open.spotify.com/artist/{artist_id}'},
+        'href': f'https://api.spotify.com/v1/artists/{artist_id}',
+        'id': artist_id,
+        'name': f'Artist {artist_id[:6]}',
+        'type': 'artist',
+        'uri': f'spotify:artist:{artist_id}'
+    }
+
+
+def make_track_json(rng):
+    track_id, album_id = _id(rng), _id(rng)
+    artists = [_artist(rng) for _ in range(rng.randint(1, 3))]
+    return {
+        'album': {
+            'album_type': 'album',
+            'artists': artists[:1],
+            'available_markets': MARKETS,
+            'external_urls': {'spotify': f'https://open.spotify.com/album/{album_id}'},
+            'href': f'https://api.spotify.com/v1/albums/{album_id}',
+            'id': album_id,
+            'images': [
+                {'height': size, 'url': f'https://i.scdn.co/image/{_id(rng)}{size}', 'width': size}
+                for size in (640, 300, 64)
+            ],
+            'name': f'Album {album_id[:6]}',
+            'release_date': '2020-01-01',
+            'release_date_precision': 'day',
+            'total_tracks': 12,
+            'type': 'album',
+            'uri': f'spotify:album:{album_id}'
+        },
+        'artists': artists,
+        'available_markets': MARKETS,
+        'disc_number': 1,
+        'duration_ms': rng.randint(120000, 300000),
+        'explicit': False,
+        'external_ids': {'isrc': f'IT{_id(rng)[:10]}'},
+        'external_urls': {'spotify': f'https://open.spotify.com/track/{track_id}'},
+        'href': f'https://api.spotify.com/v1/tracks/{track_id}',
+        'id': track_id,
+        'is_local': False,
+        'name': f'Track {track_id[:6]}',
+        'popularity': rng.randint(0, 100),
+        'preview_url': None,
+        'track_number': rng.randint(1, 12),
+        'type': 'track',
+        'uri': f'spotify:track:{track_id}'
+    }
+
+
+def measure(build):
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    obj = build()
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    return obj, sum(stat.size_diff for stat in after.compare_to(before, 'filename'))
+
+
+def best_of(fn, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def balance_by_equality(familiar, new, target_count=30):
+    """Ricerca `t not in result` per uguaglianza di dict, come prima del modello Track."""
+    result = familiar[:6] + new[:6]
+    remaining = target_count - len(result)
+    remaining_familiar = [t for t in familiar if t not in result]
+    remaining_new = [t for t in new if t not in result]
+    return result + (remaining_familiar + remaining_new)[:remaining]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--tracks', type=int, default=500)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    rng = random.Random(42)
+    payload = json.dumps([make_track_json(rng) for _ in range(args.tracks)])
+
+    raw, raw_bytes = measure(lambda: json.loads(payload))
+    # Il JSON temporaneo viene liberato: si misura solo ciò che il pool trattiene
+    compact, compact_bytes = measure(lambda: tracks_from_spotify(json.loads(payload)))
+    convert_s = best_of(lambda: tracks_from_spotify(raw), args.repeat)
+
+    print(f"pool di {args.tracks} tracce ({len(payload) / 1024:.0f} KB di JSON)")
+    print(f"{'rappresentazione':>18} {'KB totali':>10} {'byte/traccia':>13}")
+    print(f"{'JSON Web API':>18} {raw_bytes / 1024:>10.1f} {raw_bytes / args.tracks:>13.0f}")
+    print(f"{'Track':>18} {compact_bytes / 1024:>10.1f} {compact_bytes / args.tracks:>13.0f}")
+    print(f"riduzione: {raw_bytes / max(1, compact_bytes):.1f}x, conversione: {convert_s * 1000:.2f} ms")
+
+    # Bilanciamento: scansioni per uguaglianza di dict vs insiemi di ID
+    half = args.tracks // 2
+    service = RecommendationService.__new__(RecommendationService)
+    service.familiar_proportion = 0.2
+    dict_s = best_of(lambda: balance_by_equality(raw[:half], raw[half:], target_count=args.tracks), args.repeat)
+    with contextlib.redirect_stdout(io.StringIO()):
+        id_s = best_of(lambda: service._balance_recommendations(compact[:half], compact[half:], target_count=args.tracks),
+                       args.repeat)
+    print(f"bilanciamento su {args.tracks} tracce: dict {dict_s * 1000:.2f} ms, ID {id_s * 1000:.2f} ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,66 @@
+"""
+Latenza per fase della traduzione: identificazione lingua, lookup in cache,
+traduzione tramite backend e percorso completo (miss e hit).
+
+Uso:
+    python -m benchmarks.bench_translation --backends google marian
+"""
+import argparse
+import os
+import tempfile
+import time
+
+from app.utils.translator import TranslationCache, Translator, create_translation_backend, detect_language
+from benchmarks.common import SAMPLE_TEXTS, percentile
+
+NON_ENGLISH_TEXTS = [
+    "Oggi mi sento davvero felice, tutto va per il meglio!",
+    "Sono stanco e triste, niente sembra andare bene.",
+    "Non ci posso credere che hanno annullato il concerto, sono furioso.",
+    "Ho un po' paura per l'esame di domani.",
+    "Estoy muy feliz hoy con mis amigos.",
+    "Je suis très fatigué ce soir.",
+]
+
+
+def timed(fn, values, repeat=1):
+    samples = []
+    for _ in range(repeat):
+        for value in values:
+            start = time.perf_counter()
+            fn(value)
+            samples.append(time.perf_counter() - start)
+    return samples
+
+
+def report(stage, samples):
+    print(f"{stage:<34} p50 {percentile(samples, 50) * 1000:>9.3f} ms   p99 {percentile(samples, 99) * 1000:>9.3f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--backends', nargs='+', default=['google', 'marian'])
+    parser.add_argument('--repeat', type=int, default=20, help='ripetizioni per le fasi locali')
+    args = parser.parse_args()
+
+    report('rilevamento lingua (en)', timed(detect_language, SAMPLE_TEXTS, args.repeat))
+    report('rilevamento lingua (non en)', timed(detect_language, NON_ENGLISH_TEXTS, args.repeat))
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for name in args.backends:
+            backend = create_translation_backend(name)
+            cache = TranslationCache(os.path.join(tmp, f'{name}.sqlite3'))
+            translator = Translator(backend=backend, cache=cache)
+            print(f"\n[{name}]")
+            # Il primo miss include l'eventuale caricamento del modello offline
+            start = time.perf_counter()
+            translator.translate(NON_ENGLISH_TEXTS[0])
+            print(f"{'primo utilizzo (warm-up)':<34} {(time.perf_counter() - start) * 1000:>13.1f} ms")
+            report('backend.translate', timed(backend.translate, NON_ENGLISH_TEXTS[1:]))
+            report('cache lookup (hit)', timed(lambda t: cache.get(t, name), NON_ENGLISH_TEXTS[:1], args.repeat))
+            report('percorso completo (hit)', timed(translator.translate, NON_ENGLISH_TEXTS, args.repeat))
+            report('percorso completo (testo en)', timed(translator.translate, SAMPLE_TEXTS, args.repeat))
+
+
+if __name__ == '__main__':
+    main()
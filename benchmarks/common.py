@@ -0,0 +1,29 @@
+import resource
+
+SAMPLE_TEXTS = [
+    "Today I feel amazing, everything is going great!",
+    "I am so tired and sad, nothing seems to work out.",
+    "I can't believe they cancelled the concert, I'm furious.",
+    "I'm a bit scared about the exam tomorrow.",
+    "Missing you so much, I love you.",
+    "Wow, I did not expect that at all!",
+    "Things will get better, I'm sure of it.",
+    "Just a normal rainy day at the office, listening to some music.",
+]
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100.0 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def current_rss_mb(pid='self'):
+    with open(f'/proc/{pid}/statm') as f:
+        resident_pages = int(f.read().split()[1])
+    return resident_pages * resource.getpagesize() / (1024 * 1024)
+
+
+def peak_rss_mb():
+    # ru_maxrss è in KB su Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
@@ -0,0 +1,279 @@
+"""
+Stand-in locale della Web API di Spotify (e dell'endpoint token di accounts) per i
+test di carico: catalogo sintetico deterministico, latenza configurabile e
+iniezione di errori 5xx e di 429 con Retry-After.
+
+L'app lo usa con SPOTIFY_API_PREFIX=http://127.0.0.1:<porta>/v1/.
+
+Uso:
+    python -m benchmarks.fake_spotify --port 8900 --latency-ms 40 --error-rate 0.01 --rate-limit-rate 0.01
+"""
+import argparse
+import json
+import random
+import re
+import threading
+import time
+import uuid
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from benchmarks.bench_track_memory import make_track_json
+
+GENRES = ['pop', 'rock', 'dance', 'edm', 'acoustic', 'ambient', 'classical', 'jazz', 'soul', 'r-n-b', 'hip-hop',
+          'indie', 'folk', 'metal', 'punk', 'blues', 'chill', 'happy', 'sad', 'romance', 'party', 'study']
+
+
+class FakeCatalog:
+    def __init__(self, tracks=1000, seed=42):
+        rng = random.Random(seed)
+        self.tracks = [make_track_json(rng) for _ in range(tracks)]
+        self.by_id = {t['id']: t for t in self.tracks}
+        self.artists = {}
+        for track in self.tracks:
+            for artist in track['artists']:
+                self.artists.setdefault(artist['id'], dict(
+                    artist, genres=rng.sample(GENRES, 2), popularity=rng.randint(0, 100),
+                    images=[{'url': f"https://i.scdn.co/image/{artist['id']}", 'height': 640, 'width': 640}]
+                ))
+        self.artist_list = list(self.artists.values())
+        self.playlists = [self._playlist(f'pl{i:04d}', rng) for i in range(200)]
+
+    def _playlist(self, playlist_id, rng):
+        return {'id': playlist_id, 'name': f'Playlist {playlist_id}', 'tracks': {'total': rng.randint(20, 100)},
+                'uri': f'spotify:playlist:{playlist_id}', 'owner': {'id': 'spotify'}}
+
+    def sample(self, key, count, population=None):
+        # Campione stabile per chiave: stessa richiesta, stessa risposta
+        population = population if population is not None else self.tracks
+        return random.Random(key).sample(population, min(count, len(population)))
+
+    def features(self, track_id):
+        rng = random.Random(track_id)
+        return {
+            'id': track_id, 'danceability': rng.random(), 'energy': rng.random(), 'valence': rng.random(),
+            'acousticness': rng.random(), 'instrumentalness': rng.random(), 'liveness': rng.random(),
+            'speechiness': rng.random(), 'loudness': -rng.uniform(2, 20), 'tempo': rng.uniform(60, 180),
+            'key': rng.randint(0, 11), 'mode': rng.randint(0, 1), 'duration_ms': 200000, 'time_signature': 4
+        }
+
+
+class FakeSpotifyServer:
+    """Server HTTP in un thread; `stats` conta le chiamate per endpoint ed esito."""
+    def __init__(self, host='127.0.0.1', port=0, latency_ms=0.0, jitter_ms=0.0, error_rate=0.0,
+                 rate_limit_rate=0.0, retry_after=1, catalog=None):
+        self.latency = latency_ms / 1000.0
+        self.jitter = jitter_ms / 1000.0
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.retry_after = retry_after
+        self.catalog = catalog or FakeCatalog()
+        self.stats = Counter()
+        self._lock = threading.Lock()
+        self.httpd = ThreadingHTTPServer((host, port), self._handler_class())
+        self.httpd.daemon_threads = True
+
+    @property
+    def url(self):
+        host, port = self.httpd.server_address[:2]
+        return f'http://{host}:{port}'
+
+    @property
+    def api_prefix(self):
+        return f'{self.url}/v1/'
+
+    @property
+    def token_url(self):
+        return f'{self.url}/api/token'
+
+    def start(self):
+        threading.Thread(target=self.httpd.serve_forever, name='fake-spotify', daemon=True).start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def record(self, endpoint, status):
+        with self._lock:
+            self.stats[(endpoint, status)] += 1
+
+    def _handler_class(self):
+        server = self
+
+        class Handler(_FakeSpotifyHandler):
+            fake = server
+        return Handler
+
+
+def _user_from(headers):
+    auth = headers.get('Authorization', '')
+    token = auth.split(' ', 1)[1] if ' ' in auth else 'anonymous'
+    # I token emessi dal driver hanno la forma "user-<id>"
+    return token[len('user-'):] if token.startswith('user-') else 'bench-user'
+
+
+class _FakeSpotifyHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+    fake = None
+
+    ROUTES = [
+        ('GET', re.compile(r'^/v1/me/?$'), 'me'),
+        ('GET', re.compile(r'^/v1/me/top/tracks/?$'), 'top_tracks'),
+        ('GET', re.compile(r'^/v1/me/top/artists/?$'), 'top_artists'),
+        ('GET', re.compile(r'^/v1/me/player/recently-played/?$'), 'recently_played'),
+        ('GET', re.compile(r'^/v1/me/tracks/?$'), 'saved_tracks'),
+        ('GET', re.compile(r'^/v1/recommendations/available-genre-seeds/?$'), 'genre_seeds'),
+        ('GET', re.compile(r'^/v1/recommendations/?$'), 'recommendations'),
+        ('GET', re.compile(r'^/v1/audio-features/?$'), 'audio_features'),
+        ('GET', re.compile(r'^/v1/tracks/?$'), 'tracks'),
+        ('GET', re.compile(r'^/v1/search/?$'), 'search'),
+        ('GET', re.compile(r'^/v1/playlists/(?P<playlist_id>[^/]+)/tracks/?$'), 'playlist_items'),
+        ('POST', re.compile(r'^/v1/playlists/(?P<playlist_id>[^/]+)/tracks/?$'), 'playlist_add_items'),
+        ('POST', re.compile(r'^/v1/users/(?P<user_id>[^/]+)/playlists/?$'), 'playlist_create'),
+        ('POST', re.compile(r'^/api/token/?$'), 'token'),
+    ]
+
+    def do_GET(self):
+        self._dispatch('GET')
+
+    def do_POST(self):
+        self._dispatch('POST')
+
+    def _dispatch(self, method):
+        parsed = urlparse(self.path)
+        query = {k: v[-1] for k, v in parse_qs(parsed.query).items()}
+        length = int(self.headers.get('Content-Length') or 0)
+        body = self.rfile.read(length) if length else b''
+        if parsed.path == '/_stats':
+            with self.fake._lock:
+                return self._send(200, {f'{name} {status}': n for (name, status), n in self.fake.stats.items()})
+        for route_method, pattern, name in self.ROUTES:
+            match = pattern.match(parsed.path) if route_method == method else None
+            if match:
+                break
+        else:
+            self.fake.record('unknown', 404)
+            return self._send(404, {'error': {'status': 404, 'message': 'Not found'}})
+
+        fake = self.fake
+        if fake.latency or fake.jitter:
+            time.sleep(max(0.0, fake.latency + random.uniform(-fake.jitter, fake.jitter)))
+        if name != 'token':
+            roll = random.random()
+            if roll < fake.rate_limit_rate:
+                fake.record(name, 429)
+                return self._send(429, {'error': {'status': 429, 'message': 'API rate limit exceeded'}},
+                                  {'Retry-After': str(fake.retry_after)})
+            if roll < fake.rate_limit_rate + fake.error_rate:
+                fake.record(name, 503)
+                return self._send(503, {'error': {'status': 503, 'message': 'Service unavailable'}})
+
+        payload = getattr(self, f'_{name}')(query, body, **match.groupdict())
+        fake.record(name, 200 if name not in ('playlist_create', 'playlist_add_items') else 201)
+        self._send(201 if name in ('playlist_create', 'playlist_add_items') else 200, payload)
+
+    def _send(self, status, payload, headers=None):
+        data = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args):
+        pass
+
+    # --- endpoint ---
+
+    def _token(self, query, body):
+        return {'access_token': f'app-{uuid.uuid4().hex[:8]}', 'token_type': 'Bearer', 'expires_in': 3600,
+                'scope': ''}
+
+    def _me(self, query, body):
+        user = _user_from(self.headers)
+        return {'id': user, 'display_name': f'Bench {user}', 'country': 'IT', 'product': 'premium',
+                'images': [], 'followers': {'total': 0},
+                'external_urls': {'spotify': f'https://open.spotify.com/user/{user}'}}
+
+    def _paging(self, items, query):
+        limit = int(query.get('limit', 20))
+        return {'items': items[:limit], 'limit': limit, 'offset': int(query.get('offset', 0)),
+                'total': len(items), 'next': None, 'previous': None}
+
+    def _top_tracks(self, query, body):
+        key = f"{_user_from(self.headers)}:top:{query.get('time_range')}"
+        return self._paging(self.fake.catalog.sample(key, 50), query)
+
+    def _top_artists(self, query, body):
+        key = f"{_user_from(self.headers)}:artists:{query.get('time_range')}"
+        return self._paging(self.fake.catalog.sample(key, 50, self.fake.catalog.artist_list), query)
+
+    def _recently_played(self, query, body):
+        tracks = self.fake.catalog.sample(f'{_user_from(self.headers)}:recent', 50)
+        return self._paging([{'track': t, 'played_at': '2024-01-01T00:00:00Z'} for t in tracks], query)
+
+    def _saved_tracks(self, query, body):
+        tracks = self.fake.catalog.sample(f'{_user_from(self.headers)}:saved', 50)
+        return self._paging([{'track': t, 'added_at': '2024-01-01T00:00:00Z'} for t in tracks], query)
+
+    def _genre_seeds(self, query, body):
+        return {'genres': GENRES}
+
+    def _recommendations(self, query, body):
+        key = json.dumps(sorted(query.items()))
+        return {'tracks': self.fake.catalog.sample(key, int(query.get('limit', 20))), 'seeds': []}
+
+    def _audio_features(self, query, body):
+        ids = [i for i in query.get('ids', '').split(',') if i]
+        return {'audio_features': [self.fake.catalog.features(i) for i in ids]}
+
+    def _tracks(self, query, body):
+        ids = [i for i in query.get('ids', '').split(',') if i]
+        return {'tracks': [self.fake.catalog.by_id.get(i) for i in ids]}
+
+    def _search(self, query, body):
+        playlists = self.fake.catalog.sample(f"search:{query.get('q')}", int(query.get('limit', 10)),
+                                             self.fake.catalog.playlists)
+        return {'playlists': self._paging(playlists, query)}
+
+    def _playlist_items(self, query, body, playlist_id):
+        tracks = self.fake.catalog.sample(f'playlist:{playlist_id}', 100)
+        offset = int(query.get('offset', 0))
+        return self._paging([{'track': t} for t in tracks[offset:]], query)
+
+    def _playlist_add_items(self, query, body, playlist_id):
+        return {'snapshot_id': uuid.uuid4().hex}
+
+    def _playlist_create(self, query, body, user_id):
+        playlist_id = uuid.uuid4().hex[:22]
+        return {'id': playlist_id, 'name': json.loads(body or b'{}').get('name'),
+                'external_urls': {'spotify': f'https://open.spotify.com/playlist/{playlist_id}'}}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8900)
+    parser.add_argument('--latency-ms', type=float, default=0.0)
+    parser.add_argument('--jitter-ms', type=float, default=0.0)
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    parser.add_argument('--rate-limit-rate', type=float, default=0.0)
+    parser.add_argument('--retry-after', type=int, default=1)
+    args = parser.parse_args()
+
+    server = FakeSpotifyServer(args.host, args.port, args.latency_ms, args.jitter_ms, args.error_rate,
+                               args.rate_limit_rate, args.retry_after)
+    print(f"Fake Spotify su {server.api_prefix}")
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,35 @@
+"""
+App di produzione (wsgi.py) collegata al fake Spotify di benchmarks.fake_spotify,
+usata da bench_load: `SPOTIFY_API_PREFIX=http://127.0.0.1:8900/v1/ gunicorn -c gunicorn.conf.py benchmarks.loadtest_app:app`.
+La route /_bench/login/<utente> apre una sessione con un token fittizio, senza il flusso OAuth.
+"""
+import time
+import uuid
+
+from flask import jsonify, session
+from spotipy.oauth2 import SpotifyClientCredentials, SpotifyOAuth
+
+from app.config import Config
+
+# L'endpoint token di accounts.spotify.com non passa da SPOTIFY_API_PREFIX
+_TOKEN_URL = Config.SPOTIFY_API_PREFIX.rstrip('/').rsplit('/v1', 1)[0] + '/api/token'
+SpotifyClientCredentials.OAUTH_TOKEN_URL = _TOKEN_URL
+SpotifyOAuth.OAUTH_TOKEN_URL = _TOKEN_URL
+
+from wsgi import app
+from app.controllers.auth_controller import SESSION_TOKEN_KEY
+from app.controllers.music_controller import spotify_service
+
+
+@app.route('/_bench/login/<user_id>')
+def bench_login(user_id):
+    session_key = uuid.uuid4().hex
+    spotify_service.tokens.save(session_key, {
+        'access_token': f'user-{user_id}',
+        'refresh_token': f'refresh-{user_id}',
+        'token_type': 'Bearer',
+        'expires_in': 3600,
+        'expires_at': int(time.time()) + 3600
+    })
+    session[SESSION_TOKEN_KEY] = session_key
+    return jsonify({'user': user_id})
@@ -0,0 +1,13 @@
+"""
+App di produzione (wsgi.py) con una route di sola inferenza, usata da bench_prefork:
+`gunicorn -c gunicorn.conf.py benchmarks.prefork_app:app`.
+"""
+from flask import jsonify, request
+
+from wsgi import app
+from app.controllers.music_controller import mood_analysis_service
+
+
+@app.route('/_bench/analyze', methods=['POST'])
+def bench_analyze():
+    return jsonify(mood_analysis_service.analyze_text(request.get_data(as_text=True)).emotions)
@@ -0,0 +1,18 @@
+# Configurazione di produzione: `gunicorn -c gunicorn.conf.py wsgi:app`
+#
+# preload_app carica l'applicazione (modello delle emozioni, archivi memory-mapped)
+# nel master prima del fork: i worker ne condividono le pagine copy-on-write.
+# Reload graceful: `kill -HUP <master>` riavvia i worker (nuova configurazione),
+# `kill -USR2 <master>` seguito da `kill -QUIT <vecchio master>` carica nuovo codice.
+from app.config import Config
+
+bind = Config.WEB_BIND
+workers = Config.WEB_WORKERS
+threads = Config.WEB_THREADS
+worker_class = 'gthread'
+preload_app = True
+timeout = Config.WEB_TIMEOUT
+graceful_timeout = Config.WEB_GRACEFUL_TIMEOUT
+max_requests = Config.WEB_MAX_REQUESTS
+max_requests_jitter = Config.WEB_MAX_REQUESTS // 10
+accesslog = '-'
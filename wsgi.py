@@ -0,0 +1,27 @@
+"""
+Entry point di produzione: `gunicorn -c gunicorn.conf.py wsgi:app`.
+Con preload_app il master importa questo modulo una sola volta, carica modello,
+archivi e indice dei candidati, poi crea i worker con fork (pagine copy-on-write).
+"""
+import os
+
+from app import create_app
+from app.utils.prefork import freeze_shared_state, preloading, start_background
+
+
+def _limit_torch_threads():
+    # Ogni worker usa una quota dei core, senza sovrascrivere i thread del processo
+    import sys
+    if 'torch' in sys.modules:
+        from app.config import Config
+        sys.modules['torch'].set_num_threads(max(1, (os.cpu_count() or 1) // max(1, Config.WEB_WORKERS)))
+
+
+with preloading():
+    app = create_app()
+    from app.controllers.music_controller import rec_service
+    if rec_service.candidate_engine is not None:
+        rec_service.candidate_engine.warm_up()
+    start_background(_limit_torch_threads)
+
+freeze_shared_state()